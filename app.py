@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from cli import SylvaApp
+from cli import COPY, COPY_MODES, FINGERPRINTS, FULL, SylvaApp
 import imp
 from gooey import Gooey, GooeyParser
 try:
@@ -46,13 +46,142 @@ def main():
     parser.add_argument("--batch-size",
                         default=500,
                         type=int,
-                        help='Batch size used to dump the data into SylvaDB')
+                        help='Batch size used to dump the data into '
+                             'SylvaDB. With a target latency, it is the size '
+                             'of the first batches')
+    parser.add_argument("--node-batch-limit",
+                        type=int,
+                        help='Maximum size of the batches of nodes when they '
+                             'are adjusted')
+    parser.add_argument("--relationship-batch-limit",
+                        type=int,
+                        help='Maximum size of the batches of relationships '
+                             'when they are adjusted')
+    parser.add_argument("--target-latency",
+                        help='Adjust the size of the batches so each request '
+                             'takes about these seconds')
+    parser.add_argument("--target-bytes",
+                        help='Maximum bytes sent to the server in each '
+                             'request')
+    parser.add_argument("--index-limit",
+                        default=1000000,
+                        type=int,
+                        help='Number of nodes kept in memory to detect '
+                             'duplicates and to map their remote ids before '
+                             'using the disk')
+    parser.add_argument("--workers",
+                        default=1,
+                        type=int,
+                        help='Number of batches of nodes sent to SylvaDB at '
+                             'the same time')
+    parser.add_argument("--no-checkpoint",
+                        action="store_true",
+                        help='Do not record checkpoints to resume an '
+                             'interrupted load')
+    parser.add_argument("--stream",
+                        action="store_true",
+                        help='Read the CSV file once and send the data '
+                             'without intermediate files. The checkpoints '
+                             'are not recorded')
+    parser.add_argument("--validation-sampling",
+                        default=1,
+                        type=int,
+                        help='Validate one of each N GeoJSON geometries. 0 '
+                             'skips the validation')
+    parser.add_argument("--jobs",
+                        default=1,
+                        type=int,
+                        help='Number of processes used to cast the rows of '
+                             'the CSV file. From the first value with line '
+                             'breaks, the rows are cast by a single process')
+    parser.add_argument("--fingerprint",
+                        default=FULL,
+                        choices=FINGERPRINTS,
+                        help='Hash the whole CSV file or only its size, '
+                             'modification time and some blocks to find the '
+                             'history of the file')
+    parser.add_argument("--copy",
+                        default=COPY,
+                        choices=COPY_MODES,
+                        help='Copy the CSV file into its history, clone it '
+                             'if the filesystem supports it, or read it '
+                             'where it is. In the last case, the file can '
+                             'not change until the load is completed')
+    parser.add_argument("--timeout",
+                        help='Seconds to wait for the server to answer each '
+                             'request')
+    parser.add_argument("--gzip",
+                        action="store_true",
+                        help='Compress the large requests to the server '
+                             'with gzip')
+    parser.add_argument("--retries",
+                        default=4,
+                        type=int,
+                        help='Number of times a failed request is repeated '
+                             'before splitting its batch to reject the rows '
+                             'that fail')
+    parser.add_argument("--backoff",
+                        default=1.0,
+                        type=float,
+                        help='Seconds to wait before repeating a failed '
+                             'request. It doubles with every retry')
+    parser.add_argument("--metrics-json",
+                        widget="FileSaver",
+                        help='File to append the measures of the load as '
+                             'JSON lines')
+    parser.add_argument("--metrics-prometheus",
+                        widget="FileSaver",
+                        help='Textfile to write the measures of the load for '
+                             'Prometheus')
+    parser.add_argument("--delta",
+                        action="store_true",
+                        help='Only load the rows that were not loaded into '
+                             'the graph by previous executions with '
+                             '--delta. The rows with a node or a '
+                             'relationship rejected by the server are '
+                             'loaded again in full, so their relationships '
+                             'created for every row are repeated')
+    parser.add_argument("--metadata-ttl",
+                        default=3600,
+                        type=float,
+                        help='Seconds the types of the graph are cached '
+                             'between loads. Meanwhile, the schema of the '
+                             'server is not downloaded if the rules did not '
+                             'change. 0 disables the cache')
+    parser.add_argument("--refresh-metadata",
+                        action="store_true",
+                        help='Ask the server for the types of the graph '
+                             'again')
+    parser.add_argument("--dedup-relationships",
+                        action="store_true",
+                        help='Drop the repeated relationships of the types '
+                             'that are created without checking them. Those '
+                             'of the types got or created are always '
+                             'dropped')
+    parser.add_argument("--overlap",
+                        action="store_true",
+                        help='Send the relationships while the nodes are '
+                             'dumped, as soon as their nodes have remote ids')
+    parser.add_argument("--profile",
+                        type=int,
+                        help='Profile every phase into the history of the '
+                             'file and print the N functions where most time '
+                             'is spent')
 
     args = parser.parse_args()
 
     file_path = args.FileChooser.encode('utf-8')
 
-    app = SylvaApp(file_path)
+    app = SylvaApp(file_path, args.batch_size, args.index_limit,
+                   args.workers, not args.no_checkpoint, args.stream,
+                   args.validation_sampling, args.jobs,
+                   args.delta, args.fingerprint, args.copy,
+                   args.timeout, args.gzip, args.node_batch_limit,
+                   args.relationship_batch_limit, args.target_latency,
+                   args.target_bytes, args.retries, args.backoff,
+                   args.metrics_json, args.metrics_prometheus,
+                   args.profile, args.overlap, args.metadata_ttl,
+                   args.refresh_metadata, args.dedup_relationships)
     app.populate_data()
 
 if __name__ == '__main__':
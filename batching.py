@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+# Maximum size of the batches when they are adjusted
+MAX_BATCH_SIZE = 5000
+MIN_BATCH_SIZE = 10
+# Weight of the last request in the estimations
+SMOOTHING = 0.5
+# A batch grows or shrinks at most by this factor after each request
+GROWTH_LIMIT = 2.0
+
+
+def payload_size(columns, row):
+    """
+    Approximate bytes of the JSON of a row once it is sent as a dict
+    """
+    size = 2
+    for column, value in zip(columns, row):
+        size += len(column) + len(value) + 6
+    return size
+
+
+class Batcher(object):
+    """
+    Size of the batches sent to the server. Without targets it's a fixed
+    size. With a target latency, the size is adjusted after every request,
+    up to the limit, so the requests take about that time. With a target of
+    bytes, the batches are also cut before their payload grows over it.
+    """
+
+    def __init__(self, size, limit=None, target_latency=None,
+                 target_bytes=None):
+        self._size = int(size)
+        self._limit = max(MAX_BATCH_SIZE, self._size)
+        if limit:
+            self._limit = int(limit)
+            self._size = min(self._size, self._limit)
+        self._target_latency = None
+        if target_latency:
+            self._target_latency = float(target_latency)
+        self._target_bytes = None
+        if target_bytes:
+            self._target_bytes = int(target_bytes)
+        self._item_latency = None
+        self._item_bytes = None
+        self._lock = threading.Lock()
+
+    def size(self):
+        return self._size
+
+    def is_full(self, items, size_bytes):
+        """
+        Check if a batch with this number of items and bytes must be sent
+        """
+        if items >= self._size:
+            return True
+        return (self._target_bytes is not None and
+                size_bytes >= self._target_bytes)
+
+    def _smooth(self, estimation, value):
+        if estimation is None:
+            return value
+        return (1 - SMOOTHING) * estimation + SMOOTHING * value
+
+    def record_payload(self, items, size_bytes):
+        """
+        Record the bytes of a batch about to be sent
+        """
+        if items:
+            with self._lock:
+                self._item_bytes = self._smooth(self._item_bytes,
+                                                float(size_bytes) / items)
+
+    def observe(self, items, latency):
+        """
+        Adjust the size of the batches with the latency of a request
+        """
+        if self._target_latency is None or not items:
+            return
+        with self._lock:
+            self._item_latency = self._smooth(self._item_latency,
+                                              float(latency) / items)
+            size = self._target_latency / max(self._item_latency, 1e-6)
+            if self._target_bytes is not None and self._item_bytes:
+                size = min(size, self._target_bytes / self._item_bytes)
+            size = max(self._size / GROWTH_LIMIT,
+                       min(self._size * GROWTH_LIMIT, size))
+            self._size = int(min(self._limit, max(MIN_BATCH_SIZE, size)))
+
+    def timed(self, func, items_index):
+        """
+        Wrap the function that sends a batch to observe its latency. The
+        items of the batch are the argument at items_index.
+        """
+        def timed_func(*batch):
+            start = time.time()
+            result = func(*batch)
+            self.observe(len(batch[items_index]), time.time() - start)
+            return result
+        return timed_func
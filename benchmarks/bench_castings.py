@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the casting functions applied cell by cell against the column
+casting functions of the casting plans.
+
+    python -m benchmarks.bench_castings [rows]
+"""
+import random
+import sys
+import time
+
+import castings
+import plans
+
+BENCHMARKS = [
+    ("number", castings.number, plans.number_column,
+     lambda: unicode(random.randint(-10 ** 6, 10 ** 6))),
+    ("number (mixed)", castings.number, plans.number_column,
+     lambda: random.choice([unicode(random.randint(0, 99)),
+                            unicode(random.random()), u"unknown"])),
+    ("float_func", castings.float_func, plans.float_column,
+     lambda: unicode(random.random() * 1000)),
+    ("boolean", castings.boolean, plans.boolean_column,
+     lambda: random.choice([u"True", u"False"])),
+    ("string", castings.string, plans.text_column,
+     lambda: u"value{}".format(random.randint(0, 1000))),
+]
+
+
+def run(rows):
+    random.seed(0)
+    print("Rows: {}".format(rows))
+    for name, cast_func, column_func, generate_value in BENCHMARKS:
+        values = [generate_value() for i in xrange(rows)]
+        start = time.time()
+        per_cell = [cast_func(value) for value in values]
+        per_cell_time = time.time() - start
+        start = time.time()
+        per_column = column_func(values)
+        per_column_time = time.time() - start
+        assert per_cell == per_column
+        assert map(type, per_cell) == map(type, per_column)
+        print("{:<16} per cell: {:.3f}s  column: {:.3f}s  speedup: "
+              "{:.2f}x".format(name, per_cell_time, per_column_time,
+                               per_cell_time / per_column_time))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
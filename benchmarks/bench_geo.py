@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the point, path and area castings against their previous
+implementation, based on ast.literal_eval, geojson objects and
+geojson.dumps.
+
+    python -m benchmarks.bench_geo [rows]
+"""
+import ast
+import random
+import sys
+import time
+
+import geojson
+
+import castings
+
+
+def legacy_coordinates(coordinates):
+    coordinates = [ast.literal_eval(coordinate) for coordinate in coordinates]
+    if len(coordinates) == 1:
+        coordinates = coordinates[0]
+    return coordinates
+
+
+def legacy_dumps(geometry):
+    castings.check_geojson_validity(geometry)
+    return geojson.dumps(geometry)
+
+
+def legacy_point(latitude):
+    latitude, longitude = ast.literal_eval(latitude)
+    return legacy_dumps(geojson.Point((float(longitude), float(latitude))))
+
+
+def legacy_path(*coordinates):
+    coordinates = legacy_coordinates(coordinates)
+    return legacy_dumps(geojson.LineString(
+        [coors[::-1] for coors in coordinates]))
+
+
+def legacy_area(*coordinates):
+    coordinates = legacy_coordinates(coordinates)
+    if not isinstance(coordinates[0][0], (list, tuple)):
+        coordinates = [coordinates]
+    for polygon in coordinates:
+        if polygon[0] != polygon[-1]:
+            polygon.append(polygon[0])
+    coordinates = [[coors[::-1] for polygon in coordinates
+                    for coors in polygon]]
+    return legacy_dumps(geojson.Polygon(coordinates))
+
+
+def random_position():
+    return u"[{}, {}]".format(round(random.uniform(-90, 90), 6),
+                              round(random.uniform(-180, 180), 6))
+
+
+def generate_values(rows):
+    random.seed(0)
+    return [(random_position(),
+             u"[{}]".format(u", ".join(random_position() for i in xrange(5))),
+             u"[{}]".format(u", ".join(random_position() for i in xrange(6))))
+            for i in xrange(rows)]
+
+
+def cast_rows(values, point, path, area):
+    return [(point(latitude), path(coordinates), area(polygon))
+            for latitude, coordinates, polygon in values]
+
+
+def run(rows):
+    values = generate_values(rows)
+    castings.REVERSE_COORDINATES = True
+    start = time.time()
+    expected = cast_rows(values, legacy_point, legacy_path, legacy_area)
+    legacy_time = time.time() - start
+    print("Rows: {}".format(rows))
+    print("ast.literal_eval + geojson:  {:.3f}s ({:.0f} rows/s)".format(
+        legacy_time, rows / legacy_time))
+    for sampling, name in [(1, "all"), (100, "1 of 100"), (0, "none")]:
+        castings.VALIDATION_SAMPLING = sampling
+        start = time.time()
+        result = cast_rows(values, castings.point, castings.path,
+                           castings.area)
+        cast_time = time.time() - start
+        assert result == expected
+        print("Validating {:<10}        {:.3f}s ({:.0f} rows/s, "
+              "{:.2f}x)".format(name + ":", cast_time, rows / cast_time,
+                                legacy_time / cast_time))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
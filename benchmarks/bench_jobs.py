@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the casting of a CSV file by byte ranges in a pool of
+processes, as done with the --jobs option, against the same ranges casted
+in a single process.
+
+    python -m benchmarks.bench_jobs [rows] [jobs]
+"""
+from multiprocessing import Pool, cpu_count
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import castings
+from plans import cast_chunk, file_ranges
+
+CHUNK_SIZE = 4 * 1024 * 1024
+HEADERS = [u"name", u"age", u"score", u"alive", u"city", u"position"]
+TYPES_CASTING = [
+    [(u"name", "string", [u"name"]), (u"age", "number", [u"age"]),
+     (u"score", "float_func", [u"score"]), (u"alive", "boolean", [u"alive"])],
+    [(u"name", "string", [u"city"]), (u"position", "point", [u"position"])],
+]
+
+
+def generate_file(path, rows):
+    random.seed(0)
+    with open(path, 'w') as csv_file:
+        csv_file.write(",".join(HEADERS) + "\n")
+        for i in xrange(rows):
+            csv_file.write('P{},{},{},{},C{},"[{}, {}]"\n'.format(
+                i, random.randint(0, 99), random.uniform(0, 10),
+                random.choice(["True", "False"]), random.randint(0, 500),
+                round(random.uniform(-90, 90), 6),
+                round(random.uniform(-180, 180), 6)))
+
+
+def run(rows, jobs):
+    temp_path = tempfile.mkdtemp()
+    try:
+        file_path = os.path.join(temp_path, "bench.csv")
+        generate_file(file_path, rows)
+        columns_indexes = dict((header, index)
+                               for index, header in enumerate(HEADERS))
+        tasks = [(file_path, start, end, len(HEADERS), TYPES_CASTING,
+                  columns_indexes, castings.VALIDATION_SAMPLING, None)
+                 for start, end in file_ranges(file_path, CHUNK_SIZE)]
+        print("Rows: {}, ranges: {}, jobs: {}".format(rows, len(tasks), jobs))
+        start = time.time()
+        # The timings of the casting functions are left out
+        expected = [result[:-1] for result in map(cast_chunk, tasks)]
+        serial_time = time.time() - start
+        print("Single process:  {:.3f}s ({:.0f} rows/s)".format(
+            serial_time, rows / serial_time))
+        pool = Pool(jobs)
+        start = time.time()
+        result = [result[:-1] for result in pool.map(cast_chunk, tasks)]
+        parallel_time = time.time() - start
+        pool.close()
+        pool.join()
+        assert result == expected
+        print("Pool of {:<3}     {:.3f}s ({:.0f} rows/s, {:.2f}x)".format(
+            str(jobs) + ":", parallel_time, rows / parallel_time,
+            serial_time / parallel_time))
+    finally:
+        shutil.rmtree(temp_path)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 500000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else cpu_count())
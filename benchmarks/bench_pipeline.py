@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the whole pipeline of the app against the in-process mock of
+SylvaDB, with a synthetic CSV file. It reports the throughput of every
+phase, and it can save the results to compare later runs with them and
+catch performance regressions.
+
+    python -m benchmarks.bench_pipeline [--rows N] [--types N] [--dedup R]
+        [--no-geo] [--latency S] [--item-latency S] [--repeat N]
+        [--save results.json] [--baseline results.json] [--tolerance R]
+        [app options: --batch-size, --workers, --jobs, --stream, ...]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from benchmarks import mock_sylvadb
+from benchmarks.generate_csv import generate
+
+# Status codes of the app to names of the phases reported
+PHASES = [
+    ("DATA_NODES_FORMATTING", "format_data_nodes"),
+    ("DATA_NODES_DUMPING", "populate_nodes"),
+    ("DATA_RELATIONSHIPS_FORMATTING", "format_data_relationships"),
+    ("DATA_RELATIONSHIPS_DUMPING", "populate_relationships"),
+    ("DATA_STREAMING", "stream_data"),
+]
+# A phase is a regression when its throughput falls under the baseline by
+# more than this fraction
+TOLERANCE = 0.2
+
+
+def import_cli(rules_path):
+    """
+    Import cli with the generated rules and the mock instead of the real
+    client of SylvaDB
+    """
+    os.environ['RULES_PATH'] = rules_path
+    sys.modules['sylvadbclient'] = mock_sylvadb
+    import cli
+    return cli
+
+
+def run_once(cli, csv_path, app_args, verbose=False):
+    history_path = tempfile.mkdtemp()
+    cli.HISTORY_PATH = history_path
+    stdout = sys.stdout
+    try:
+        if not verbose:
+            sys.stdout = open(os.devnull, 'w')
+        app = cli.SylvaApp(csv_path, **app_args)
+        app.populate_data()
+    finally:
+        if not verbose:
+            sys.stdout.close()
+            sys.stdout = stdout
+        shutil.rmtree(history_path)
+    api = mock_sylvadb.INSTANCES[-1]
+    phases = dict((entry['phase'], entry) for entry in app._metrics.phases)
+    # The app prints its errors instead of raising them
+    if cli.STATUS.EXECUTION_COMPLETED not in phases:
+        raise RuntimeError("The load did not complete, run it with "
+                           "--verbose to see why")
+    results = {'nodes': api.count_nodes(),
+               'relationships': api.count_relationships(), 'phases': {}}
+    for code, name in PHASES:
+        if code in phases:
+            results['phases'][name] = {
+                'seconds': phases[code]['seconds'],
+                'rows': phases[code]['rows'],
+                'rows_per_second': phases[code]['rows_per_second']}
+    return results
+
+
+def best(runs):
+    """
+    The fastest time of every phase among the runs, the least disturbed
+    """
+    results = dict(runs[0], phases={})
+    for name in runs[0]['phases']:
+        results['phases'][name] = min(
+            (run['phases'][name] for run in runs),
+            key=lambda phase: phase['seconds'])
+    return results
+
+
+def report(results, baseline=None, tolerance=TOLERANCE):
+    """
+    Print the throughput of every phase, compared with the baseline if
+    given. It returns the names of the phases that regressed.
+    """
+    print("Nodes created: {}, relationships created: {}".format(
+        results['nodes'], results['relationships']))
+    regressions = []
+    for code, name in PHASES:
+        if name not in results['phases']:
+            continue
+        phase = results['phases'][name]
+        line = "{:<28}{:8.3f}s {:9} rows {:12.0f} rows/s".format(
+            name + ":", phase['seconds'], phase['rows'],
+            phase['rows_per_second'])
+        if baseline and name in baseline['phases']:
+            base_speed = baseline['phases'][name]['rows_per_second']
+            if base_speed:
+                ratio = phase['rows_per_second'] / base_speed
+                line += " ({:.2f}x)".format(ratio)
+                if ratio < 1 - tolerance:
+                    line += " REGRESSION"
+                    regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark of the pipeline against a mock of SylvaDB")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--types", type=int, default=3,
+                        help="Node types, related in a chain")
+    parser.add_argument("--dedup", type=float, default=0.5,
+                        help="Fraction of repeated nodes of every type")
+    parser.add_argument("--no-geo", dest="geo", action="store_false",
+                        help="Leave out the point and path columns")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds waited by every request")
+    parser.add_argument("--item-latency", type=float, default=0.0,
+                        help="Seconds waited by every item of a request")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Runs of the pipeline, the best one is kept")
+    parser.add_argument("--save", help="JSON file to save the results")
+    parser.add_argument("--baseline",
+                        help="JSON file with results to compare with")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="Slowdown allowed before failing")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Show the messages of the app")
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--jobs", type=int)
+    parser.add_argument("--index-limit", type=int)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--overlap", action="store_true")
+    parser.add_argument("--dedup-relationships", action="store_true")
+    parser.add_argument("--no-checkpoint", dest="checkpoint",
+                        action="store_false")
+    args = parser.parse_args()
+    app_args = {'batch_size': args.batch_size, 'workers': args.workers,
+                'jobs': args.jobs, 'index_limit': args.index_limit,
+                'stream': args.stream, 'overlap': args.overlap,
+                'dedup_relationships': args.dedup_relationships,
+                # The rows are only streamed without checkpoints
+                'checkpoint': args.checkpoint and not args.stream}
+    temp_path = tempfile.mkdtemp()
+    try:
+        csv_path = os.path.join(temp_path, "bench.csv")
+        rules_path = os.path.join(temp_path, "bench_rules.py")
+        schema = generate(csv_path, rules_path, args.rows, args.types,
+                          args.dedup, args.geo)
+        mock_sylvadb.configure(schema, args.latency, args.item_latency)
+        cli = import_cli(rules_path)
+        print("Rows: {}, node types: {}, dedup ratio: {}, geo: {}, "
+              "latency: {}s + {}s/item".format(
+                  args.rows, args.types, args.dedup, args.geo, args.latency,
+                  args.item_latency))
+        runs = [run_once(cli, csv_path, app_args, args.verbose)
+                for _ in xrange(args.repeat)]
+    finally:
+        shutil.rmtree(temp_path)
+    results = best(runs)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    regressions = report(results, baseline, args.tolerance)
+    if args.save:
+        with open(args.save, 'w') as results_file:
+            json.dump(results, results_file, indent=2, sort_keys=True)
+    if regressions:
+        sys.exit("Performance regressions in: {}".format(
+            ", ".join(regressions)))
+
+
+if __name__ == '__main__':
+    main()
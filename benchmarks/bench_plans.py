@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of the casting of the rows: the per-cell lookup and
+dispatch of the casting functions against the compiled casting plan.
+
+    python -m benchmarks.bench_plans [rows]
+"""
+import random
+import sys
+import time
+
+import castings
+from plans import CastingPlan
+
+COLUMNS = [u"name", u"age", u"height", u"alive", u"city", u"country"]
+CASTING_FUNCTIONS = [
+    (u"name", "default", [u"name"]),
+    (u"age", "number", [u"age"]),
+    (u"height", "float_func", [u"height"]),
+    (u"alive", "boolean", [u"alive"]),
+    (u"city", "string", [u"city"]),
+    (u"place", "combine_lon_lat", [u"city", u"country"]),
+]
+
+
+def legacy_cast(casting_functions, columns_indexes, csv_row):
+    """
+    Casting of a row as it was done before the casting plans
+    """
+    temp_node = []
+    for casting_function in casting_functions:
+        func = casting_function[1]
+        params = casting_function[2]
+        params_values = []
+        for param in params:
+            param_index = columns_indexes[param]
+            params_values.append(csv_row[param_index])
+        cast_func = getattr(castings, func,
+                            lambda *x: u",".join(map(repr, x)))
+        temp_node.append(cast_func(*params_values))
+    return temp_node
+
+
+def generate_rows(rows):
+    random.seed(0)
+    return [[u"name{}".format(i),
+             unicode(random.randint(0, 99)),
+             unicode(random.random() * 2),
+             random.choice([u"True", u"False"]),
+             u"city{}".format(random.randint(0, 50)),
+             u"country{}".format(random.randint(0, 5))]
+            for i in xrange(rows)]
+
+
+def run(rows):
+    csv_rows = generate_rows(rows)
+    columns_indexes = dict((column, index)
+                           for index, column in enumerate(COLUMNS))
+    start = time.time()
+    legacy = [legacy_cast(CASTING_FUNCTIONS, columns_indexes, csv_row)
+              for csv_row in csv_rows]
+    legacy_time = time.time() - start
+    start = time.time()
+    casting_plan = CastingPlan(CASTING_FUNCTIONS, columns_indexes)
+    planned = [casting_plan(csv_row) for csv_row in csv_rows]
+    plan_time = time.time() - start
+    assert legacy == planned
+    print("Rows: {}".format(rows))
+    print("Per-cell casting: {:.3f}s ({:.0f} rows/s)".format(
+        legacy_time, rows / legacy_time))
+    print("Casting plan:     {:.3f}s ({:.0f} rows/s)".format(
+        plan_time, rows / plan_time))
+    print("Speedup: {:.2f}x".format(legacy_time / plan_time))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
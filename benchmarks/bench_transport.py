@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the transport against a local mock server: a new connection
+for every request, as done without a session, against the pooled
+keep-alive connections, with and without gzip.
+
+    python -m benchmarks.bench_transport [requests] [batch size]
+"""
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+import json
+import random
+import threading
+import time
+import zlib
+
+import requests
+
+import transport
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # The response is sent at once, as real servers do, to avoid the
+    # delayed acknowledgements of small writes
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    received = [0]
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.received[0] += len(body)
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        nodes = json.loads(body)
+        response = json.dumps(range(len(nodes)))
+        self.send_response(201)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def generate_batch(size):
+    random.seed(0)
+    return [{'id': unicode(index), 'type': u'Person',
+             'name': u'Person {}'.format(random.randint(0, 100000)),
+             'position': json.dumps({'type': 'Point', 'coordinates': [
+                 random.uniform(-180, 180), random.uniform(-90, 90)]})}
+            for index in xrange(size)]
+
+
+def send(post, url, body, count):
+    MockHandler.received[0] = 0
+    start = time.time()
+    for index in xrange(count):
+        response = post(url, data=body,
+                        headers={'Content-Type': 'application/json'})
+        response.json()
+    return time.time() - start, MockHandler.received[0]
+
+
+def run(count, batch_size):
+    server = MockServer(('127.0.0.1', 0), MockHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = 'http://127.0.0.1:{}/nodes/'.format(server.server_address[1])
+    body = json.dumps(generate_batch(batch_size))
+    print("Requests: {}, batch size: {}, body: {} bytes".format(
+        count, batch_size, len(body)))
+    results = [("New connection per request",) + send(
+        requests.post, url, body, count)]
+    for name, gzip in [("Keep-alive pool", False),
+                       ("Keep-alive pool + gzip", True)]:
+        session = requests.Session()
+        transport.install(session, gzip=gzip)
+        results.append((name,) + send(session.post, url, body, count))
+        session.close()
+    base_time = results[0][1]
+    for name, total_time, received in results:
+        print("{:<28}{:.3f}s ({:.2f}ms/request, {:.2f}x), {} bytes "
+              "sent".format(name + ":", total_time, 1000 * total_time / count,
+                            base_time / total_time, received))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    import sys
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 50)
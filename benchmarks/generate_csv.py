@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Generator of synthetic CSV files, and of the rules to load them, for the
+benchmarks of the pipeline. Every row has the columns of a node of each
+type, and each type is related with the next one.
+
+    python -m benchmarks.generate_csv csv_path rules_path [rows] [types]
+        [dedup ratio] [geo]
+"""
+import json
+import pprint
+import random
+import sys
+
+CREATE = 'create'
+GET_OR_CREATE = 'get_or_create'
+RULES_TEMPLATE = '''# -*- coding: utf-8 -*-
+# Rules generated for the benchmarks
+
+CONFIG_SETTINGS = {{
+    "settings_msg": "SylvaDB Benchmark",
+    "file_help_msg": "Name of the file you want to process"
+}}
+
+GRAPH_SETTINGS = {{
+    "graph": "benchmark",
+    "token": "benchmark"
+}}
+
+SCHEMA = {schema!r}
+
+NODES = {nodes}
+
+RELATIONSHIPS = {relationships}
+'''
+
+
+def type_columns(index, geo):
+    columns = [u"t{}_name".format(index), u"t{}_value".format(index),
+               u"t{}_score".format(index), u"t{}_flag".format(index)]
+    if geo:
+        columns += [u"t{}_lat".format(index), u"t{}_lon".format(index),
+                    u"t{}_path".format(index)]
+    return columns
+
+
+def generate_rules(types, geo):
+    """
+    The nodes, the relationships and the schema of the rules. The first type
+    is created for every row and the others are got or created, so they
+    are deduplicated. Their relationships alternate both modes too.
+    """
+    nodes = []
+    schema = {'nodeTypes': {}, 'allowedEdges': []}
+    for index in xrange(types):
+        columns = type_columns(index, geo)
+        properties = {'name': columns[0],
+                      'value': ('number', columns[1]),
+                      'score': ('float_func', columns[2]),
+                      'flag': ('boolean', columns[3])}
+        if geo:
+            properties['location'] = ('point', columns[4], columns[5])
+            properties['path'] = ('path', columns[6])
+        name = "Type{}".format(index)
+        slug = "type{}".format(index)
+        nodes.append({'type': name, 'slug': slug,
+                      'mode': CREATE if index == 0 else GET_OR_CREATE,
+                      'id': ['name'], 'properties': properties})
+        # The properties of the schema, with the type of their values
+        schema['nodeTypes'][name] = dict(
+            (key, value[0] if isinstance(value, tuple) else 'string')
+            for key, value in properties.iteritems())
+    relationships = []
+    for index in xrange(types - 1):
+        name = "relates{}".format(index)
+        relationships.append({
+            'type': name, 'slug': name,
+            'source': "Type{}".format(index),
+            'target': "Type{}".format(index + 1),
+            'id': CREATE if index % 2 == 0 else GET_OR_CREATE})
+        schema['allowedEdges'].append({
+            'label': name, 'source': "Type{}".format(index),
+            'target': "Type{}".format(index + 1)})
+    return nodes, relationships, schema
+
+
+def type_values(index, key, geo):
+    """
+    The values of the columns of a node. They only depend on the key of the
+    node, so the duplicated nodes have the same values.
+    """
+    node_random = random.Random(key * 31 + index)
+    values = [u"T{}-{}".format(index, key),
+              unicode(node_random.randint(0, 1000)),
+              unicode(round(node_random.uniform(0, 100), 3)),
+              node_random.choice([u"True", u"False"])]
+    if geo:
+        latitude = round(node_random.uniform(-80, 80), 6)
+        longitude = round(node_random.uniform(-170, 170), 6)
+        values += [unicode(latitude), unicode(longitude),
+                   u"[[{}, {}], [{}, {}]]".format(
+                       longitude, latitude, longitude + 1, latitude + 1)]
+    return values
+
+
+def quoted(value):
+    if u"," in value or u'"' in value:
+        return u'"{}"'.format(value.replace(u'"', u'""'))
+    return value
+
+
+def generate(csv_path, rules_path, rows, types=3, dedup_ratio=0.5,
+             geo=True, seed=0):
+    """
+    Write a CSV file with the rows and its rules. The dedup ratio is the
+    fraction of the nodes of every type that repeat an earlier node.
+    It returns the schema of the rules.
+    """
+    if types < 1:
+        raise ValueError("There must be at least one node type")
+    if not 0 <= dedup_ratio < 1:
+        raise ValueError("The dedup ratio must be between 0 and 1")
+    rows_random = random.Random(seed)
+    distinct = max(1, int(rows * (1 - dedup_ratio)))
+    with open(csv_path, 'w') as csv_file:
+        headers = []
+        for index in xrange(types):
+            headers += type_columns(index, geo)
+        csv_file.write(u",".join(headers).encode('utf-8') + "\n")
+        for row in xrange(rows):
+            values = []
+            for index in xrange(types):
+                # The first nodes are all new, to reach every distinct node
+                if row < distinct:
+                    key = row
+                else:
+                    key = rows_random.randint(0, distinct - 1)
+                values += type_values(index, key, geo)
+            csv_file.write(u",".join(quoted(value) for value in values)
+                           .encode('utf-8') + "\n")
+    nodes, relationships, schema = generate_rules(types, geo)
+    with open(rules_path, 'w') as rules_file:
+        rules_file.write(RULES_TEMPLATE.format(
+            schema=json.dumps(schema, sort_keys=True),
+            nodes=pprint.pformat(nodes),
+            relationships=pprint.pformat(relationships)))
+    return schema
+
+
+if __name__ == '__main__':
+    generate(sys.argv[1], sys.argv[2],
+             int(sys.argv[3]) if len(sys.argv) > 3 else 100000,
+             int(sys.argv[4]) if len(sys.argv) > 4 else 3,
+             float(sys.argv[5]) if len(sys.argv) > 5 else 0.5,
+             sys.argv[6].lower() not in ('0', 'false', 'no')
+             if len(sys.argv) > 6 else True)
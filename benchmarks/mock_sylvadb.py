@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+In-process stand-in for the sylvadbclient module. It answers the methods of
+the API used by the app from memory, after waiting the configured latency,
+so the whole pipeline can be measured without a SylvaDB server.
+
+The benchmarks put it in sys.modules as 'sylvadbclient' before importing
+cli, and call configure with the schema of the generated rules.
+"""
+import json
+import threading
+import time
+try:
+    from requests import Session
+except ImportError:
+    Session = None
+
+SCHEMA_ID = 1
+SETTINGS = {
+    'schema': {'nodeTypes': {}, 'allowedEdges': []},
+    # Seconds waited by every request, and by every item sent in it
+    'latency': 0.0,
+    'item_latency': 0.0,
+}
+# Clients created, to count what they received
+INSTANCES = []
+
+
+def configure(schema, latency=0.0, item_latency=0.0):
+    """
+    Set the schema of the mock graph and the latency of its requests. The
+    schema has the format of the SCHEMA of the generated rules, and the
+    slugs of the types are their names in lower case.
+    """
+    SETTINGS['schema'] = schema
+    SETTINGS['latency'] = float(latency)
+    SETTINGS['item_latency'] = float(item_latency)
+
+
+class API(object):
+
+    def __init__(self, token=None, graph_slug=None):
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._nodes = {}
+        self._relationships = {}
+        # The session of the client, where the transport is mounted, though
+        # the requests are answered from memory
+        self.session = Session() if Session is not None else None
+        INSTANCES.append(self)
+
+    def _wait(self, items=0):
+        time.sleep(SETTINGS['latency'] + SETTINGS['item_latency'] * items)
+
+    def _node_types(self):
+        return sorted(SETTINGS['schema']['nodeTypes'])
+
+    def get_graph(self):
+        self._wait()
+        return {'schema': SCHEMA_ID}
+
+    def export_schema(self):
+        self._wait()
+        # A copy, as it comes decoded from the server
+        return json.loads(json.dumps(SETTINGS['schema']))
+
+    def get_nodetypes(self):
+        self._wait()
+        return [{'name': nodetype, 'slug': nodetype.lower()}
+                for nodetype in self._node_types()]
+
+    def get_nodetype_schema(self, slug):
+        self._wait()
+        for index, nodetype in enumerate(self._node_types()):
+            if nodetype.lower() == slug:
+                return {'id': index + 1}
+        raise ValueError("There is no node type {}".format(slug))
+
+    def get_relationshiptypes(self):
+        self._wait()
+        ids = dict((nodetype, index + 1)
+                   for index, nodetype in enumerate(self._node_types()))
+        return [{'name': edge['label'], 'slug': edge['label'].lower(),
+                 'schema': SCHEMA_ID, 'source': ids[edge['source']],
+                 'target': ids[edge['target']]}
+                for edge in SETTINGS['schema']['allowedEdges']]
+
+    def post_nodes(self, slug, params):
+        self._wait(len(params))
+        with self._lock:
+            nodes = self._nodes.setdefault(slug, [])
+            ids = range(self._next_id + 1, self._next_id + len(params) + 1)
+            self._next_id += len(params)
+            nodes.extend(zip(ids, params))
+        return ids
+
+    def filter_nodes(self, slug, params):
+        self._wait()
+        with self._lock:
+            nodes = list(self._nodes.get(slug, []))
+        return {'nodes': [
+            {'id': node_id, 'properties': properties}
+            for node_id, properties in nodes
+            if all(properties.get(key) == value
+                   for key, value in params.iteritems())]}
+
+    def _page(self, items, params):
+        """
+        The page of the items asked in the params, or all of them
+        """
+        if not params or 'page' not in params:
+            return items
+        page_size = int(params['page_size'])
+        start = (int(params['page']) - 1) * page_size
+        return items[start:start + page_size]
+
+    def get_nodes(self, slug, params=None):
+        self._wait()
+        with self._lock:
+            nodes = self._page(list(self._nodes.get(slug, [])), params)
+        return {'nodes': [{'id': node_id, 'properties': properties}
+                          for node_id, properties in nodes]}
+
+    def post_relationships(self, slug, params):
+        self._wait(len(params))
+        with self._lock:
+            self._relationships.setdefault(slug, []).extend(params)
+        return [None] * len(params)
+
+    def filter_relationships(self, slug, params):
+        self._wait()
+        source_id = unicode(params['source_id'])
+        target_id = unicode(params['target_id'])
+        with self._lock:
+            relationships = list(self._relationships.get(slug, []))
+        # The relationships are identified by their position
+        return {'relationships': [
+            dict(relationship, id=index + 1)
+            for index, relationship in enumerate(relationships)
+            if unicode(relationship['source_id']) == source_id and
+            unicode(relationship['target_id']) == target_id]}
+
+    def get_relationships(self, slug, params=None):
+        self._wait()
+        with self._lock:
+            relationships = self._page(
+                list(self._relationships.get(slug, [])), params)
+        return {'relationships': relationships}
+
+    def count_nodes(self):
+        return sum(len(nodes) for nodes in self._nodes.itervalues())
+
+    def count_relationships(self):
+        return sum(len(relationships)
+                   for relationships in self._relationships.itervalues())
@@ -1,11 +1,19 @@
 import ast
 import geojson
+import itertools
+import json
+import re
 
 # If the coordinates come in (Latitude, Longitude) format, setting
 # "REVERSE_COORDINATES" to "True" it will reverse them for be in
 # "GeoJSON format", but only when they are coming inside list(s).
 REVERSE_COORDINATES = True
 
+# The GeoJSON geometries are validated one of each "VALIDATION_SAMPLING"
+# casted values. Setting it to "1" validates all of them and "0" skips the
+# validation.
+VALIDATION_SAMPLING = 1
+
 
 # Datatypes to apply the default casting
 DATATYPE = {
@@ -22,9 +30,75 @@ DATATYPE = {
 
 
 # Util functions
+NUMBER = r'-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?'
+JSON_COORDINATES = re.compile(r'[-+0-9.eE\[\],\s]*$')
+TUPLE_PAIR = re.compile(r'\(\s*{0}\s*,\s*{0}\s*\)'.format(NUMBER))
+LIST_OF_NUMBERS = re.compile(r'\[\s*[-0-9.]')
+
+
+def json_coordinates(string_input):
+    """
+    Parse coordinates made of numbers and lists with json. Elements
+    separated by commas outside of a list are a tuple, like in Python.
+    It returns None when the string is not valid.
+    """
+    if not JSON_COORDINATES.match(string_input):
+        return None
+    try:
+        return json.loads(string_input)
+    except ValueError:
+        pass
+    try:
+        return tuple(json.loads(u"[{}]".format(string_input)))
+    except ValueError:
+        return None
+
+
+def pairs_to_tuples(coordinates):
+    """
+    Turn the lists of two numbers into tuples
+    """
+    if not isinstance(coordinates, (list, tuple)):
+        return coordinates
+    is_pair = (len(coordinates) == 2 and
+               not isinstance(coordinates[0], (list, tuple)) and
+               not isinstance(coordinates[1], (list, tuple)))
+    if is_pair:
+        return tuple(coordinates)
+    items = [pairs_to_tuples(coordinate) for coordinate in coordinates]
+    if isinstance(coordinates, tuple):
+        return tuple(items)
+    return items
+
+
+def parse_coordinates(string_input):
+    """
+    Parse a string of coordinates. It returns the same than
+    ast.literal_eval, but the usual formats are parsed with json, that is
+    much faster.
+    """
+    # Leading spaces are a syntax error for ast.literal_eval
+    if string_input and not string_input[:1].isspace():
+        if '(' not in string_input:
+            coordinates = json_coordinates(string_input)
+            if coordinates is not None:
+                return coordinates
+        # The tuples are only parsed with json when all of them are pairs of
+        # numbers and there are not lists of numbers, so we know which lists
+        # were tuples
+        elif (string_input.count('(') == string_input.count(')') ==
+                len(TUPLE_PAIR.findall(string_input)) and
+                not LIST_OF_NUMBERS.search(string_input)):
+            coordinates = json_coordinates(
+                string_input.replace('(', '[').replace(')', ']'))
+            if coordinates is not None:
+                return pairs_to_tuples(coordinates)
+    return ast.literal_eval(string_input)
+
+
 def string_to_list_or_tuple(string_input):
     if isinstance(string_input, basestring):
-        string_input = ast.literal_eval(string_input)
+        string_input = parse_coordinates(string_input)
     return string_input
 
 
@@ -43,6 +117,32 @@ def check_geojson_validity(geojson_input):
         raise ValueError(validity['message'])
 
 
+geometries_count = itertools.count()
+
+
+def validate_geometry(geometry_class, coordinates):
+    """
+    Validate the geometry according to "VALIDATION_SAMPLING"
+    """
+    if not VALIDATION_SAMPLING:
+        return
+    if next(geometries_count) % VALIDATION_SAMPLING == 0:
+        check_geojson_validity(geometry_class(coordinates))
+
+
+def dumps_geometry(geometry_type, coordinates):
+    """
+    Serialize the geometry like geojson.dumps
+    """
+    coordinates = json.dumps(coordinates, allow_nan=False)
+    # GeoJSON only allows numbers inside the coordinates
+    if '"' in coordinates or 'null' in coordinates or '{' in coordinates:
+        raise ValueError("{} are not JSON compliant numbers".format(
+            coordinates))
+    return '{{"type": "{}", "coordinates": {}}}'.format(geometry_type,
+                                                      coordinates)
+
+
 # Casting functions
 def point(latitude, longitude=None):
     """
@@ -68,9 +168,9 @@ def point(latitude, longitude=None):
             latitude = latitude[1]
     latitude = float(latitude)
     longitude = float(longitude)
-    geojson_point = geojson.Point((longitude, latitude))
-    check_geojson_validity(geojson_point)
-    return geojson.dumps(geojson_point)
+    coordinates = (longitude, latitude)
+    validate_geometry(geojson.Point, coordinates)
+    return dumps_geometry("Point", coordinates)
 
 
 def path(*coordinates):
@@ -91,9 +191,8 @@ def path(*coordinates):
     coordinates = join_coordinates(coordinates)
     if REVERSE_COORDINATES:
         coordinates = [coors[::-1] for coors in coordinates]
-    geojson_path = geojson.LineString(coordinates)
-    check_geojson_validity(geojson_path)
-    return geojson.dumps(geojson_path)
+    validate_geometry(geojson.LineString, coordinates)
+    return dumps_geometry("LineString", coordinates)
 
 
 def area(*coordinates):
@@ -127,9 +226,8 @@ def area(*coordinates):
     if REVERSE_COORDINATES:
         coordinates = [[coors[::-1] for polygon in coordinates
                         for coors in polygon]]
-    geojson_area = geojson.Polygon(coordinates)
-    check_geojson_validity(geojson_area)
-    return geojson.dumps(geojson_area)
+    validate_geometry(geojson.Polygon, coordinates)
+    return dumps_geometry("Polygon", coordinates)
 
 
 def combine_lon_lat(*params):
@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
-from collections import namedtuple
+from collections import deque, namedtuple
 from datetime import datetime
+from itertools import islice
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from operator import itemgetter
 import argparse
 import castings
+import csv
 import hashlib
 import imp
 try:
@@ -11,8 +16,27 @@ except ImportError:
     import json  # NOQA
 import os
 import shutil
+import tempfile
+import threading
 import unicodecsv
+try:
+    from fcntl import ioctl
+except ImportError:
+    ioctl = None
 
+from batching import Batcher, payload_size
+from delta import DeltaStore, FINGERPRINT_SIZE
+from indexes import NodesIndex, PairsSet, RemoteIdsMap
+from journal import Journal
+from metadata import (METADATA_DIRNAME, METADATA_TTL, MetadataCache,
+                      schema_diff, schema_fingerprint)
+from metrics import Metrics
+from plans import CastingPlan, cast_chunk, file_ranges
+from profiling import PhaseProfiler, PROFILE_DIRNAME, TOP_FUNCTIONS
+from retries import post_bisecting
+from scheduling import OverlapStopped, Watermarks
+import retries
+import transport
 from sylvadbclient import API
 
 
@@ -25,6 +49,26 @@ RULES_PATH = os.environ.get("RULES_PATH",
                                          "rules.py"))
 rules = imp.load_source('rules', RULES_PATH)
 LOG_FILENAME = 'app.log'
+CHECKPOINT_FILENAME = 'checkpoint.log'
+# Entry of the journal that records if the repeated relationships of the
+# types created without checking are dropped
+DEDUP_CHECKPOINT = 'RELATIONSHIPS_DEDUP'
+# Folder of the history with the rows and nodes loaded in delta mode
+DELTA_DIRNAME = '_delta'
+
+# Fingerprint of the CSV file used to find its history
+FULL = 'full'
+SAMPLED = 'sampled'
+FINGERPRINTS = [FULL, SAMPLED]
+# Number of blocks of the file read for the sampled fingerprint
+SAMPLED_BLOCKS = 16
+# Ways to keep the CSV file in its history
+COPY = 'copy'
+LINK = 'link'
+REFERENCE = 'reference'
+COPY_MODES = [COPY, LINK, REFERENCE]
+# ioctl request to clone a file in Linux filesystems with copy on write
+FICLONE = 0x40049409
 
 # Rules constants
 CREATE = 'create'
@@ -38,39 +82,202 @@ _statuses = [
     "RULES_LOADING", "API_CONNECTING", "CHECKING_TOKEN", "CHECKING_SCHEMA",
     "CSV_COLUMNS_FORMATTING", "DATA_NODES_FORMATTING", "DATA_NODES_DUMPING",
     "RELATIONSHIPS_PREPARING", "DATA_RELATIONSHIPS_FORMATTING",
-    "DATA_RELATIONSHIPS_DUMPING", "EXECUTION_COMPLETED", "RESUMING_LOAD"
+    "DATA_RELATIONSHIPS_DUMPING", "EXECUTION_COMPLETED", "RESUMING_LOAD",
+    "DATA_STREAMING"
 ]
 STATUS = namedtuple("Status", _statuses)(**dict([(s, s) for s in _statuses]))
 
 # Batch size
 BATCH_SIZE = 500
+# Schemas of the node types asked to the server at the same time
+METADATA_WORKERS = 8
+# Number of rows casted at once
+CASTING_CHUNK_SIZE = 1000
+# Number of rows of relationships formatted at once
+RELATIONSHIPS_CHUNK_SIZE = 10000
+# Bytes of the CSV file casted by each task of the pool of processes
+JOBS_CHUNK_SIZE = 4 * 1024 * 1024
+# Nodes or relationships asked at once to index those existing in SylvaDB
+INDEX_PAGE_SIZE = 1000
+
+
+def _csv_text(value):
+    """
+    Text of a casted value as it would be read back from a csv file
+    """
+    if isinstance(value, unicode):
+        return value
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    if isinstance(value, float):
+        return unicode(repr(value))
+    if value is None:
+        return u""
+    return unicode(str(value))
 
 
 class SylvaApp(object):
 
-    def __init__(self, file_path, batch_size=None):
+    def __init__(self, file_path, batch_size=None, index_limit=None,
+                 workers=None, checkpoint=True, stream=False,
+                 validation_sampling=None, jobs=None, delta=False,
+                 fingerprint=FULL, copy_mode=COPY, timeout=None, gzip=False,
+                 node_batch_limit=None, relationship_batch_limit=None,
+                 target_latency=None, target_bytes=None, retries_number=None,
+                 backoff=None, metrics_json=None, metrics_prometheus=None,
+                 profile=None, overlap=False, metadata_ttl=None,
+                 refresh_metadata=False, dedup_relationships=False):
         """
         Loading the rules into data structures for an easily treatment
         """
+        # Measures of the phases, the castings, the requests and the batches
+        self._metrics = Metrics(metrics_json, metrics_prometheus)
         print("Hashing contents of CSV file...")  # This doesn't to to status
         self.batch_size = BATCH_SIZE
         if batch_size:
             self.batch_size = int(batch_size)
-        file_hash = self._hash(file_path)
+        # The batches of nodes and relationships are adjusted separately
+        self._nodes_batcher = Batcher(self.batch_size, node_batch_limit,
+                                      target_latency, target_bytes)
+        self._relationships_batcher = Batcher(
+            self.batch_size, relationship_batch_limit, target_latency,
+            target_bytes)
+        # Maximum number of treated nodes kept in memory
+        self._index_limit = index_limit
+        # Number of batches sent to the server at the same time
+        self._workers = 1
+        if workers:
+            self._workers = int(workers)
+        # Failed requests are repeated after waiting an exponential time
+        self._retries = retries.RETRIES
+        if retries_number is not None:
+            self._retries = int(retries_number)
+        self._backoff = retries.BACKOFF
+        if backoff is not None:
+            self._backoff = float(backoff)
+        # The rows that the server keeps rejecting are written apart
+        self._reject_files = {}
+        self._reject_lock = threading.Lock()
+        self._rejected = 0
+        self._skipped_relationships = 0
+        # The repeated relationships are dropped before sending them. Those
+        # of the types created without checking are only dropped if asked,
+        # because they could be intended
+        self._relationships_pairs = {}
+        self._duplicated_relationships = 0
+        # Number of processes used to cast the rows of the CSV file
+        self._jobs = 1
+        if jobs:
+            self._jobs = int(jobs)
+        # The relationships can be sent while the nodes are dumped, as soon
+        # as their nodes have remote ids
+        self._overlap = overlap
+        self._watermarks = None
+        self._overlap_thread = None
+        self._overlap_error = None
+        # The ids maps are read by the thread that sends the relationships
+        self._ids_lock = threading.Lock()
+        fingerprint = fingerprint or FULL
+        copy_mode = copy_mode or COPY
+        if fingerprint not in FINGERPRINTS or copy_mode not in COPY_MODES:
+            raise ValueError("Unknown fingerprint or copy mode")
+        # A full fingerprint of a file to copy is calculated while copying
+        # it, so the file is read once. If the file seems to be copied in a
+        # history already, it is only hashed to resume its load.
+        copy_path = None
+        if fingerprint == SAMPLED:
+            file_hash = self._sampled_hash(file_path)
+        elif copy_mode == COPY and not self._history_copies(file_path):
+            file_hash, copy_path = self._copy_and_hash(file_path)
+        else:
+            file_hash = self._hash(file_path)
         self._history_path = os.path.join(HISTORY_PATH, file_hash)
         self._log_file_path = os.path.join(self._history_path, LOG_FILENAME)
-        self._file_path = os.path.join(self._history_path,
-                                       os.path.basename(file_path))
-        if os.path.exists(self._file_path):
+        if copy_mode == REFERENCE:
+            # The CSV file is read where it is, so it can't change until the
+            # load is completed
+            self._file_path = os.path.abspath(file_path)
+            resuming = os.path.exists(self._history_path)
+        else:
+            self._file_path = os.path.join(self._history_path,
+                                           os.path.basename(file_path))
+            resuming = os.path.exists(self._file_path)
+        # The phases are profiled into the history of the file, and the top
+        # functions are printed at the end
+        self._profiler = None
+        if profile:
+            self._profiler = PhaseProfiler(
+                os.path.join(self._history_path, PROFILE_DIRNAME), profile)
+        if resuming:
+            if copy_path is not None:
+                os.remove(copy_path)
             self._status(STATUS.RESUMING_LOAD, "Resuming previous load...")
-            # TODO: Resume the loading using the log file
         else:
-            os.makedirs(self._history_path)
-            shutil.copy(file_path, self._file_path)
+            if not os.path.exists(self._history_path):
+                os.makedirs(self._history_path)
+            if copy_path is not None:
+                os.rename(copy_path, self._file_path)
+            elif copy_mode == LINK:
+                self._link(file_path, self._file_path)
+            elif copy_mode == COPY:
+                shutil.copy(file_path, self._file_path)
+        # Streaming skips the intermediate files, so there would be nothing
+        # to resume from the checkpoints
+        if stream and checkpoint:
+            print("The checkpoints are not recorded while streaming, so an "
+                  "interrupted load starts again")
+            checkpoint = False
+        # The checkpoints of the load let us resume it if it is interrupted
+        if checkpoint:
+            self._journal = Journal(
+                os.path.join(self._history_path, CHECKPOINT_FILENAME))
+        else:
+            self._journal = Journal()
+        # The relationships dumped are counted once the repeated ones are
+        # dropped, so a load is resumed with the same option
+        dedup_relationships = bool(dedup_relationships)
+        if not self._journal.is_resuming():
+            self._journal.complete(DEDUP_CHECKPOINT, dedup_relationships)
+        elif self._journal.is_complete(DEDUP_CHECKPOINT,
+                                       not dedup_relationships):
+            raise ValueError(
+                "The load was started {} --dedup-relationships. Please, "
+                "restart the execution with the same options.".format(
+                    "without" if dedup_relationships else "with"))
+        elif not self._journal.is_complete(DEDUP_CHECKPOINT,
+                                           dedup_relationships):
+            # A load started by a previous version sent every relationship
+            dedup_relationships = None
+        self._dedup_relationships = dedup_relationships
+        # One of each validation_sampling geometries is validated
+        if validation_sampling is not None:
+            castings.VALIDATION_SAMPLING = int(validation_sampling)
+        self._stream = stream
         # We load the config.json file to set up variables
         self._status(STATUS.RULES_LOADING, "Loading rules for the graph...")
         self._token = rules.GRAPH_SETTINGS['token']
         self._graph = rules.GRAPH_SETTINGS['graph']
+        # In delta mode, the rows and nodes loaded into the graph by previous
+        # executions are skipped
+        self._delta = None
+        self._delta_path = None
+        if delta:
+            delta_dir_path = os.path.join(HISTORY_PATH, DELTA_DIRNAME)
+            if not os.path.exists(delta_dir_path):
+                os.makedirs(delta_dir_path)
+            self._delta_path = os.path.join(
+                delta_dir_path, "{}.db".format(self._graph))
+            self._delta = DeltaStore(self._delta_path)
+        self._delta_nodes_writer = None
+        # The types of the graph and their ids are cached between loads
+        if metadata_ttl is None:
+            metadata_ttl = METADATA_TTL
+        self._metadata_cache = MetadataCache(
+            os.path.join(HISTORY_PATH, METADATA_DIRNAME), float(metadata_ttl))
+        if refresh_metadata:
+            self._metadata_cache.invalidate(self._graph)
+        self._metadata = None
+        self._metadata_cached = False
         # Variables to manage nodetypes
         self._nodetypes = []
         self._nodetypes_id_label = {}
@@ -81,8 +288,12 @@ class SylvaApp(object):
         self._nodetypes_mode = {}
         self._nodetypes_casting = {}
         self._nodes_ids_mapping = {}
+        self._nodes_remote_index = {}
         # Variables to manage reltypes
         self._reltypes_rules_slugs = {}
+        self._relationships_remote_index = {}
+        # The index of the relationships of a type is shared by the workers
+        self._relationships_index_lock = threading.Lock()
         # Variables to format the data
         # List to store the headers from the csv. Lists maintain the order.
         self._headers = []
@@ -91,10 +302,21 @@ class SylvaApp(object):
         try:
             self._status(STATUS.API_CONNECTING,
                          "Connecting to the API...")
-            self._api = API(token=self._token, graph_slug=self._graph)
+            api = API(token=self._token, graph_slug=self._graph)
+            # The connections to the server are kept alive and reused by
+            # the workers
+            sessions = transport.install(api, timeout, gzip,
+                                         max(self._workers, 10))
+            self._api = self._metrics.instrument(api)
+            if not sessions:
+                print("The session of the API client was not found, so the "
+                      "connections are not reused and the timeout and gzip "
+                      "options are ignored")
             # Settings
             self._schema = json.loads(rules.SCHEMA)
-            self._schema_id = self._api.get_graph()['schema']
+            self._schema_fingerprint = schema_fingerprint(self._schema)
+            # The id of the schema is got when the token is checked
+            self._schema_id = None
             self._csv_columns_indexes = {}
         except:
             raise ValueError(
@@ -108,7 +330,7 @@ class SylvaApp(object):
         # Let's extract the slug directly from the graph using the API
         graph_nodetypes_slugs = {}
         try:
-            graph_nodetypes = self._api.get_nodetypes()
+            graph_nodetypes = self._graph_metadata()['nodetypes']
             # We create the dictionary to map the correct slug
             for graph_nodetype in graph_nodetypes:
                 graph_nodetypes_slugs[graph_nodetype['name']] = (
@@ -122,7 +344,8 @@ class SylvaApp(object):
                 self._nodetypes_graph_names[type_slug] = type
                 self._nodetypes_graph_slugs[type] = type_slug
                 self._nodetypes_rules_slugs[type_slug] = nodetype['slug']
-                nodetype_id = self._api.get_nodetype_schema(type_slug)['id']
+                nodetype_id = (
+                    self._graph_metadata()['nodetype_ids'][type_slug])
                 self._nodetypes_graph_ids[type] = nodetype_id
                 mode = nodetype['mode']
                 self._nodetypes_mode[type_slug] = mode
@@ -171,7 +394,7 @@ class SylvaApp(object):
         # Let's extract the slug directly from the graph using the API
         graph_rels_slugs = {}
         try:
-            graph_reltypes = self._api.get_relationshiptypes()
+            graph_reltypes = self._graph_metadata()['relationshiptypes']
             # We create the dictionary to map the correct slug
             for graph_reltype in graph_reltypes:
                 rel_name = graph_reltype['name']
@@ -209,13 +432,90 @@ class SylvaApp(object):
                 _hash.update(block)
         return _hash.hexdigest()
 
+    def _history_copies(self, filename):
+        """
+        Histories with a copy of the file of its same size and modification
+        time, which are kept by the copies
+        """
+        if not os.path.exists(HISTORY_PATH):
+            return []
+        file_stat = os.stat(filename)
+        histories = []
+        for history in os.listdir(HISTORY_PATH):
+            copy_path = os.path.join(HISTORY_PATH, history,
+                                     os.path.basename(filename))
+            try:
+                copy_stat = os.stat(copy_path)
+            except OSError:
+                continue
+            if (copy_stat.st_size == file_stat.st_size and
+                    int(copy_stat.st_mtime) == int(file_stat.st_mtime)):
+                histories.append(history)
+        return histories
+
+    def _copy_and_hash(self, filename, blocksize=1048576):
+        """
+        Copy the file into the history folder while hashing it. It returns
+        the hash and the path of the copy, to be renamed once we know the
+        history of the file.
+        """
+        if not os.path.exists(HISTORY_PATH):
+            os.makedirs(HISTORY_PATH)
+        _hash = hashlib.sha256()
+        copy_fd, copy_path = tempfile.mkstemp(prefix="_copy_",
+                                              dir=HISTORY_PATH)
+        with os.fdopen(copy_fd, "wb") as copy_file:
+            with open(filename, "rb") as f:
+                for block in iter(lambda: f.read(blocksize), b""):
+                    _hash.update(block)
+                    copy_file.write(block)
+        shutil.copystat(filename, copy_path)
+        return _hash.hexdigest(), copy_path
+
+    def _sampled_hash(self, filename, blocksize=65536):
+        """
+        Hash the size, the modification time and some blocks spread over
+        the file, instead of all its contents
+        """
+        _hash = hashlib.sha256()
+        file_stat = os.stat(filename)
+        _hash.update("{}:{}".format(file_stat.st_size, file_stat.st_mtime))
+        with open(filename, "rb") as f:
+            if file_stat.st_size <= blocksize * SAMPLED_BLOCKS:
+                _hash.update(f.read())
+            else:
+                step = (file_stat.st_size - blocksize) // (SAMPLED_BLOCKS - 1)
+                for index in xrange(SAMPLED_BLOCKS):
+                    f.seek(index * step)
+                    _hash.update(f.read(blocksize))
+        return _hash.hexdigest()
+
+    def _link(self, filename, link_path):
+        """
+        Clone the file, sharing its blocks, when the filesystem supports it.
+        Otherwise, the file is copied.
+        """
+        if ioctl is not None:
+            with open(filename, "rb") as f:
+                with open(link_path, "wb") as link_file:
+                    try:
+                        ioctl(link_file.fileno(), FICLONE, f.fileno())
+                        return
+                    except (IOError, OSError):
+                        pass
+        shutil.copy(filename, link_path)
+
     def _status(self, code, msg):
         """
         Log function
         """
-        log_file = open(self._log_file_path, 'a+')
-        date_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        log_file.write(u"{}: {}\n".format(code, date_time))
+        with open(self._log_file_path, 'a+') as log_file:
+            date_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            log_file.write(u"{}: {}\n".format(code, date_time))
+        # Every status starts a new phase of the load
+        self._metrics.start_phase(code)
+        if self._profiler is not None:
+            self._profiler.start_phase(code)
         print(msg)
 
     def _check_correct_row(self, row, columns):
@@ -224,89 +524,435 @@ class SylvaApp(object):
         correct_row = csv_row_length and csv_row_not_empty
         return correct_row
 
-    def _dump_nodes(self, csv_writer, type, mode, nodetype, columns, nodes,
-                    nodes_list):
+    def _post_nodes(self, mode, nodetype, columns, nodes, nodes_list):
+        """
+        Send a batch of nodes to SylvaDB. It returns the rows of the batch
+        with the remote id appended.
+        """
         nodes_remote_id = []
         if mode == GET_OR_CREATE:
+            remote_nodes, complete = self._nodes_remote_index[nodetype]
+            # Nodes that we need to create, grouped by their filtering params
+            new_nodes = []
+            new_nodes_keys = {}
             node_index = 0
             for node in nodes_list:
-                filtering_params = {}
                 try:
-                    filtering_values = self._nodetypes_id_label[nodetype]
-                    # We use the filtering values or all the properties
-                    if filtering_values:
-                        for value in filtering_values:
-                            value_index = columns.index(value)
-                            param_value = node[value_index]
-                            filtering_params[value] = param_value
-                    else:
-                        # In case that we dont have defined values to filter,
-                        # we use all the values for the node.
-                        node_params = nodes[node_index]
-                        for prop, value in node_params.iteritems():
-                            # We need to remove the id and type props
-                            # and the props with empty values
-                            param_value = value
-                            correct_prop = (prop != 'id') and (prop != 'type')
-                            not_empty_value = (
-                                (value != '') and (value is not None))
-                            if correct_prop and not_empty_value:
-                                filtering_params[prop] = param_value
-                    results = self._api.filter_nodes(nodetype,
-                                                     params=filtering_params)
-                    remote_id = str(results['nodes'][0]['id'])
+                    filtering_params = self._filtering_params(
+                        nodetype, columns, nodes[node_index], node)
+                    key = tuple(sorted(
+                        (prop, unicode(value))
+                        for prop, value in filtering_params.iteritems()))
+                except ValueError:
+                    filtering_params = None
+                    key = None
+                remote_id = remote_nodes.get(key)
+                if (remote_id is None and key not in new_nodes_keys and
+                        filtering_params is not None and not complete):
+                    # The index is not complete so we ask the server
+                    try:
+                        results = self._api.filter_nodes(
+                            nodetype, params=filtering_params)
+                        remote_id = str(results['nodes'][0]['id'])
+                        remote_nodes[key] = remote_id
+                    except:
+                        pass
+                if remote_id is not None:
                     node.append(remote_id)
-                    nodes_remote_id.append(node)
-                except:
-                    remote_id = self._api.post_nodes(
-                        nodetype, params=[nodes[node_index]])
-                    node.extend(remote_id)
-                    nodes_remote_id.append(node)
+                elif key is not None and key in new_nodes_keys:
+                    new_nodes_keys[key].append(node)
+                else:
+                    new_nodes.append((key, nodes[node_index]))
+                    new_nodes_keys.setdefault(key, []).append(node)
+                nodes_remote_id.append(node)
                 node_index += 1
+            # We create all the missing nodes in a single request
+            if new_nodes:
+                temp_nodes_ids, errors = self._post_nodes_bisecting(
+                    nodetype, [new_node for key, new_node in new_nodes])
+                rejected_nodes = []
+                for index, (key, new_node) in enumerate(new_nodes):
+                    if key is not None:
+                        nodes_of_key = new_nodes_keys[key]
+                    else:
+                        nodes_of_key = [new_nodes_keys[key].pop(0)]
+                    remote_id = temp_nodes_ids[index]
+                    if remote_id is None:
+                        rejected_nodes.extend(
+                            node + [errors[index]] for node in nodes_of_key)
+                        continue
+                    if key is not None:
+                        remote_nodes[key] = str(remote_id)
+                    for node in nodes_of_key:
+                        node.append(remote_id)
+                self._reject(self._nodetypes_rules_slugs[nodetype],
+                             columns[:-1], rejected_nodes)
+                # The rejected nodes have no remote id
+                nodes_remote_id = [node for node in nodes_remote_id
+                                   if len(node) == len(columns)]
         if mode == CREATE:
-            try:
-                temp_nodes_ids = (
-                    self._api.post_nodes(nodetype, params=nodes))
-                node_index = 0
-                for node in nodes_list:
-                    remote_id = temp_nodes_ids[node_index]
+            temp_nodes_ids, errors = self._post_nodes_bisecting(nodetype,
+                                                                nodes)
+            rejected_nodes = []
+            node_index = 0
+            for node in nodes_list:
+                remote_id = temp_nodes_ids[node_index]
+                if remote_id is None:
+                    rejected_nodes.append(node + [errors[node_index]])
+                else:
                     node.append(remote_id)
                     nodes_remote_id.append(node)
-                    node_index += 1
-            except:
-                pass
-        # Once we have our ids, we write them into the new csv files
-        for new_node in nodes_remote_id:
-            # The remote id is the last element of the node
-            remote_id = str(new_node[-1])
-            local_id = str(new_node[0])
-            try:
-                self._nodes_ids_mapping[type][local_id] = remote_id
-            except KeyError:
-                self._nodes_ids_mapping[type] = {}
-                self._nodes_ids_mapping[type][local_id] = remote_id
-            csv_writer.writerow(new_node)
+                node_index += 1
+            self._reject(self._nodetypes_rules_slugs[nodetype],
+                         columns[:-1], rejected_nodes)
+        return nodes_remote_id
+
+    def _post_nodes_bisecting(self, nodetype, nodes):
+        """
+        Send the nodes, retrying the failed requests and splitting the batch
+        to find the nodes rejected by the server. It returns the remote ids,
+        None for the rejected nodes, and the errors of the rejected nodes.
+        """
+        sent, rejected = post_bisecting(
+            lambda params: self._api.post_nodes(nodetype, params=params),
+            nodes, self._retries, self._backoff)
+        nodes_ids = [None] * len(nodes)
+        for start, end, temp_nodes_ids in sent:
+            # Every id is matched to its node by position
+            if len(temp_nodes_ids) != end - start:
+                raise ValueError(
+                    "The server returned {} ids for {} nodes of {}. "
+                    "Please, restart the execution. If the problem "
+                    "persists, please contact us.".format(
+                        len(temp_nodes_ids), end - start, nodetype))
+            nodes_ids[start:end] = temp_nodes_ids
+        errors = dict((index, unicode(error)) for index, error in rejected)
+        return nodes_ids, errors
+
+    def _post_relationships_bisecting(self, reltype, relationships):
+        """
+        Send the relationships, retrying the failed requests and splitting
+        the batch to find and reject the relationships the server refuses.
+        It returns the indexes of the rejected relationships.
+        """
+        sent, rejected = post_bisecting(
+            lambda params: self._api.post_relationships(reltype,
+                                                        params=params),
+            relationships, self._retries, self._backoff)
+        columns = ['source_id', 'target_id', 'type']
+        self._reject(
+            self._reltypes_rules_slugs[reltype], columns,
+            [[unicode(relationships[index].get(column, ""))
+              for column in columns] + [unicode(error)]
+             for index, error in rejected])
+        return set(index for index, error in rejected)
+
+    def _reject(self, slug, columns, rows):
+        """
+        Write the rows rejected by the server, with their error, into the
+        rejected file of their type
+        """
+        if not rows:
+            return
+        print("The server rejected {} rows of {}...".format(len(rows), slug))
+        with self._reject_lock:
+            if slug not in self._reject_files:
+                reject_file_path = os.path.join(
+                    self._history_path, "{}_rejected.csv".format(slug))
+                new_file = not os.path.exists(reject_file_path)
+                reject_file = open(reject_file_path, 'a')
+                reject_writer = unicodecsv.writer(reject_file,
+                                                  encoding="utf-8")
+                if new_file:
+                    reject_writer.writerow(list(columns) + ['error'])
+                self._reject_files[slug] = (reject_file, reject_writer)
+            reject_file, reject_writer = self._reject_files[slug]
+            reject_writer.writerows(rows)
+            reject_file.flush()
+            self._rejected += len(rows)
+
+    def _report_rejected(self):
+        if self._rejected:
+            print("{} rows were rejected by the server. You can find them "
+                  "in the _rejected.csv files of {}".format(
+                      self._rejected, self._history_path))
+        if self._skipped_relationships:
+            print("{} relationships of rejected nodes were skipped".format(
+                self._skipped_relationships))
+        if self._duplicated_relationships:
+            print("{} duplicated relationships were dropped".format(
+                self._duplicated_relationships))
+
+    def _close_reject_files(self):
+        for reject_file, reject_writer in self._reject_files.values():
+            reject_file.close()
+        self._reject_files = {}
+
+    def _filtering_params(self, nodetype, columns, node_params, node):
+        """
+        Return the properties used to know if a node already exists
+        """
+        filtering_params = {}
+        filtering_values = self._nodetypes_id_label[nodetype]
+        # We use the filtering values or all the properties
+        if filtering_values:
+            for value in filtering_values:
+                value_index = columns.index(value)
+                param_value = node[value_index]
+                filtering_params[value] = param_value
+        else:
+            # In case that we dont have defined values to filter,
+            # we use all the values for the node.
+            for prop, value in node_params.iteritems():
+                # We need to remove the id and type props
+                # and the props with empty values
+                param_value = value
+                correct_prop = (prop != 'id') and (prop != 'type')
+                not_empty_value = (
+                    (value != '') and (value is not None))
+                if correct_prop and not_empty_value:
+                    filtering_params[prop] = param_value
+        return filtering_params
+
+    def _remote_pages(self, get, type, key):
+        """
+        Yield the pages of the nodes or relationships of the type that
+        exist in SylvaDB, until the server returns a page that is not full.
+        A server that doesn't page returns all of them for every page, so we
+        stop when a page is repeated.
+        """
+        page = 1
+        previous = None
+        while True:
+            items = get(type, params={'page': page,
+                                      'page_size': INDEX_PAGE_SIZE})[key]
+            if items == previous:
+                return
+            yield items
+            if len(items) < INDEX_PAGE_SIZE:
+                return
+            previous = items
+            page += 1
+
+    def _index_remote_nodes(self, nodetype):
+        """
+        Index the nodes of the type that already exist in SylvaDB by their
+        id properties. We only can do it when the type has id properties,
+        otherwise the nodes are looked up one by one. It returns the index and
+        if it is complete.
+        The index is complete once every page of nodes is in it, and then
+        the nodes not found are created without asking the server. If we
+        can't get every page, the nodes not found are still filtered.
+        """
+        remote_nodes = {}
+        filtering_values = self._nodetypes_id_label[nodetype]
+        if not filtering_values:
+            return remote_nodes, False
+        try:
+            for page in self._remote_pages(self._api.get_nodes, nodetype,
+                                           'nodes'):
+                for remote_node in page:
+                    properties = remote_node.get('properties', remote_node)
+                    if not all(value in properties
+                               for value in filtering_values):
+                        continue
+                    key = tuple(sorted(
+                        (value, unicode(properties[value]))
+                        for value in filtering_values))
+                    remote_nodes.setdefault(key, str(remote_node['id']))
+        except:
+            return remote_nodes, False
+        return remote_nodes, True
+
+    def _map_nodes(self, type, nodes_remote_id):
+        """
+        Store the remote ids of the nodes in the ids mapping. It returns the
+        pairs of local and remote ids.
+        """
+        ids = []
+        with self._ids_lock:
+            ids_map = self._ids_map(type)
+            for new_node in nodes_remote_id:
+                # The remote id is the last element of the node
+                remote_id = str(new_node[-1])
+                local_id = str(new_node[0])
+                ids_map[local_id] = remote_id
+                ids.append((local_id, remote_id))
+        return ids
+
+    def _ids_map(self, type):
+        """
+        Map of the local ids of the nodes of the type to their remote ids
+        """
+        ids_map = self._nodes_ids_mapping.get(type)
+        if ids_map is None:
+            ids_map = RemoteIdsMap(
+                os.path.join(self._history_path, "_{}_ids.map".format(
+                    self._nodetypes_rules_slugs[type])),
+                self._index_limit)
+            self._nodes_ids_mapping[type] = ids_map
+        return ids_map
+
+    def _close_ids_maps(self):
+        for ids_map in self._nodes_ids_mapping.values():
+            ids_map.close()
+        self._nodes_ids_mapping = {}
+
+    def _pairs_set(self, type):
+        """
+        Set of the pairs of remote ids of the relationships of the type
+        already treated, or None if the repeated ones are sent
+        """
+        if self._dedup_relationships is None:
+            return None
+        if self._rel_ids[type] != GET_OR_CREATE and (
+                not self._dedup_relationships):
+            return None
+        pairs_set = self._relationships_pairs.get(type)
+        if pairs_set is None:
+            pairs_set = PairsSet(
+                os.path.join(self._history_path, "_{}_pairs.db".format(
+                    self._reltypes_rules_slugs[type])),
+                self._index_limit)
+            self._relationships_pairs[type] = pairs_set
+        return pairs_set
+
+    def _close_pairs_sets(self):
+        for pairs_set in self._relationships_pairs.values():
+            pairs_set.close()
+        self._relationships_pairs = {}
+
+    def _write_nodes(self, csv_writer, type, nodes_remote_id):
+        """
+        Once we have our ids, we write them into the new csv files
+        """
+        ids = self._map_nodes(type, nodes_remote_id)
+        csv_writer.writerows(nodes_remote_id)
+        return ids
+
+    def _nodes_dumped(self, csv_writer, type, batch, nodes_remote_id):
+        """
+        Write the remote ids of a batch of nodes and record the checkpoint
+        """
+        ids = self._write_nodes(csv_writer, type, nodes_remote_id)
+        nodes_list = batch[-1]
+        self._metrics.add_rows(len(nodes_list))
+        self._journal.complete_batch(STATUS.DATA_NODES_DUMPING, type,
+                                     len(nodes_list), ids)
+        if self._watermarks is not None and nodes_list:
+            self._watermarks.resolve(type, nodes_list[-1][0])
+
+    def _dispatch(self, func, batches, callback, workers=1):
+        """
+        Call func for every batch, using a pool of threads when we have more
+        than one worker. The callback receives every batch with its result in
+        the same order than the batches, so the files, mappings and
+        checkpoints are written in order.
+        """
+        if workers <= 1:
+            for batch in batches:
+                callback(batch, func(*batch))
+            return
+        pool = ThreadPool(workers)
+        # We keep a limited number of batches in flight to bound the memory
+        pending = deque()
+        try:
+            for batch in batches:
+                pending.append((batch, pool.apply_async(func, batch)))
+                if len(pending) >= workers * 2:
+                    batch, result = pending.popleft()
+                    callback(batch, result.get())
+            while pending:
+                batch, result = pending.popleft()
+                callback(batch, result.get())
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _index_remote_relationships(self, reltype):
+        """
+        Index the (source_id, target_id) pairs of the relationships of the
+        type that already exist in SylvaDB. It returns the index and if it is
+        complete.
+        The index is complete once every page of relationships is in it,
+        and then the relationships not found are created without asking the
+        server. If we can't get every page, they are still filtered.
+        """
+        remote_relationships = self._relationships_remote_index.get(reltype)
+        if remote_relationships is not None:
+            remote_relationships[0].close()
+        # The pairs are moved to disk like the pairs of the dedup
+        remote_relationships = PairsSet(
+            os.path.join(self._history_path, "_{}_remote_pairs.db".format(
+                self._reltypes_rules_slugs[reltype])),
+            self._index_limit)
+        try:
+            for page in self._remote_pages(self._api.get_relationships,
+                                           reltype, 'relationships'):
+                remote_relationships.add_many(
+                    [(unicode(remote_relationship['source_id']),
+                      unicode(remote_relationship['target_id']))
+                     for remote_relationship in page])
+        except:
+            return remote_relationships, False
+        return remote_relationships, True
+
+    def _close_remote_indexes(self):
+        for remote_relationships, complete in (
+                self._relationships_remote_index.values()):
+            remote_relationships.close()
+        self._relationships_remote_index = {}
 
     def _dump_relationships(self, mode, reltype, relationships):
         if mode == GET_OR_CREATE:
-            rel_index = 0
-            for relationship in relationships:
-                filtering_params = {}
-                try:
-                    # We filter by source_id and target_id
-                    filtering_params['source_id'] = relationship['source_id']
-                    filtering_params['target_id'] = relationship['target_id']
-                    results = self._api.filter_relationships(
-                        reltype, params=filtering_params)
-                    # We access to the result to check if
-                    # everything is ok
-                    results['relationships'][0]['id']
-                except:
-                    self._api.post_relationships(
-                        reltype, params=[relationships[rel_index]])
-                rel_index += 1
+            remote_relationships, complete = (
+                self._relationships_remote_index[reltype])
+            keys = [(unicode(relationship['source_id']),
+                     unicode(relationship['target_id']))
+                    for relationship in relationships]
+            with self._relationships_index_lock:
+                known = [key in remote_relationships for key in keys]
+            new_relationships = []
+            new_keys = []
+            found_keys = []
+            # The keys are only added to the index once they are created
+            pending_keys = set()
+            for relationship, key, key_known in zip(relationships, keys,
+                                                    known):
+                if key_known or key in pending_keys:
+                    continue
+                pending_keys.add(key)
+                if not complete:
+                    filtering_params = {}
+                    try:
+                        # We filter by source_id and target_id
+                        filtering_params['source_id'] = (
+                            relationship['source_id'])
+                        filtering_params['target_id'] = (
+                            relationship['target_id'])
+                        results = self._api.filter_relationships(
+                            reltype, params=filtering_params)
+                        # We access to the result to check if
+                        # everything is ok
+                        results['relationships'][0]['id']
+                        found_keys.append(key)
+                        continue
+                    except:
+                        pass
+                new_keys.append(key)
+                new_relationships.append(relationship)
+            # We create all the missing relationships in a single request
+            if new_relationships:
+                rejected = self._post_relationships_bisecting(
+                    reltype, new_relationships)
+                # The relationships rejected by the server don't exist
+                found_keys.extend(
+                    key for index, key in enumerate(new_keys)
+                    if index not in rejected)
+            with self._relationships_index_lock:
+                remote_relationships.add_many(found_keys)
         if mode == CREATE:
-            self._api.post_relationships(reltype, params=relationships)
+            self._post_relationships_bisecting(reltype, relationships)
 
     def _check_token(self):
         """
@@ -315,7 +961,7 @@ class SylvaApp(object):
         self._status(STATUS.CHECKING_TOKEN,
                      "Verifying API token...")
         try:
-            self._api.get_graph()
+            self._schema_id = self._api.get_graph()['schema']
         except:
             raise ValueError(
                 "There are problems connecting to the API. "
@@ -330,15 +976,84 @@ class SylvaApp(object):
         """
         self._status(STATUS.CHECKING_SCHEMA,
                      "Verifying schema...")
-        api_schema_hash = self._api.export_schema()
-        app_schema_hash = self._schema
-        if api_schema_hash == app_schema_hash:
-            pass
-        else:
+        # The whole schema is only downloaded if the fingerprint of the
+        # rules is not the one verified before. A schema changed in the
+        # server under the same id is noticed once the cache expires, or
+        # when the types are not found in the cached ones.
+        cached = self._metadata_cache.get(self._graph, self._schema_id)
+        if cached is not None:
+            fingerprint, metadata = cached
+            if fingerprint == self._schema_fingerprint:
+                self._metadata = metadata
+                self._metadata_cached = True
+                print("Using the cached types of the graph")
+                return
+        api_schema = self._api.export_schema()
+        if schema_fingerprint(api_schema) != self._schema_fingerprint:
+            self._metadata_cache.invalidate(self._graph)
+            print("Differences between the schema of the rules and the "
+                  "schema of the server:")
+            for line in schema_diff(self._schema, api_schema):
+                print(u"    {}".format(line))
             raise ValueError(
                 "The schema is not valid. Please, check the schema "
                 "and restart the execution.")
 
+    def _setup_types(self):
+        """
+        Find the types of the rules in the graph. If they are not in the
+        cached types, the schema is verified and the types are asked to the
+        server again.
+        """
+        try:
+            self._setup_nodetypes()
+            self._setup_reltypes()
+        except ValueError:
+            if not self._metadata_cached:
+                raise
+            print("The cached types of the graph are out of date")
+            self._metadata_cache.invalidate(self._graph)
+            self._metadata = None
+            self._metadata_cached = False
+            self._nodetypes = []
+            self._check_schema()
+            self._setup_types()
+
+    def _graph_metadata(self):
+        """
+        The node types of the graph, the ids of their schemas and the
+        relationship types, from the cache or from the server
+        """
+        if self._metadata is not None:
+            return self._metadata
+        nodetypes = self._api.get_nodetypes()
+        # The schemas of all the types are asked at the same time, so the
+        # metadata is still valid if the rules change
+        slugs = [nodetype['slug'] for nodetype in nodetypes]
+        pool = ThreadPool(max(1, min(len(slugs), METADATA_WORKERS)))
+        try:
+            nodetype_ids = pool.map(
+                lambda slug: self._api.get_nodetype_schema(slug)['id'], slugs)
+        finally:
+            pool.terminate()
+            pool.join()
+        self._metadata = {
+            'nodetypes': nodetypes,
+            'nodetype_ids': dict(zip(slugs, nodetype_ids)),
+            'relationshiptypes': self._api.get_relationshiptypes()}
+        return self._metadata
+
+    def _cache_metadata(self):
+        """
+        Keep the metadata of the graph for the next loads, once the types
+        of the rules were found in it
+        """
+        if self._metadata is not None and not self._metadata_cached:
+            self._metadata_cache.set(self._graph, self._schema_id,
+                                     self._schema_fingerprint,
+                                     self._metadata)
+            self._metadata_cached = True
+
     def format_data_columns(self):
         """
         We format the headers of the CSV to get the index to treat for
@@ -388,148 +1103,449 @@ class SylvaApp(object):
                     )
         csv_file.close()
 
+    def _csv_rows(self, csv_reader, columns=None):
+        """
+        Yield the correct rows of the CSV file, headers excluded
+        """
+        # The first line are the headers/columns values
+        if columns is None:
+            columns = csv_reader.next()
+        # The rest of the lines are data. An empty row ends the data.
+        for csv_row in csv_reader:
+            if not csv_row:
+                break
+            if self._check_correct_row(csv_row, columns):
+                yield csv_row
+
+    def _casting_headers(self, type):
+        """
+        Return the properties of the type in the order of its casting
+        functions
+        """
+        casting_functions = self._nodetypes_casting.get(type, [])
+        return [casting_function[0] for casting_function in casting_functions]
+
+    def _casting_plans(self):
+        """
+        Compile the casting functions of every type for the CSV columns.
+        It returns a list of types and plans in the order of the types.
+        """
+        casting_plans = []
+        for type in self._nodetypes:
+            try:
+                casting_plans.append((type, CastingPlan(
+                    self._nodetypes_casting.get(type, []),
+                    self._csv_columns_indexes,
+                    self._metrics.cast_timings)))
+            except KeyError:
+                raise ValueError(
+                    "There is something wrong with the CSV "
+                    "file or the rules file. "
+                    "Please, check both and restart the "
+                    "execution. If the problem persists, "
+                    "please contact us."
+                )
+        return casting_plans
+
+    def _casted_chunks(self, start=None):
+        """
+        Read the CSV file and yield, for every chunk of rows, the number of
+        rows, the casted nodes of each type and, in delta mode, the
+        fingerprints of the rows. The rows loaded before are left out.
+        With start, the file is read from that position of a line after
+        the headers.
+        """
+        casting_plans = self._casting_plans()
+        csv_root_file = open(self._file_path, 'r')
+        csv_reader = unicodecsv.reader(csv_root_file, encoding="utf-8")
+        if start is None:
+            csv_rows = self._csv_rows(csv_reader)
+        else:
+            csv_root_file.seek(start)
+            csv_rows = self._csv_rows(csv_reader, self._headers)
+        try:
+            # The rows are casted by chunks, column by column
+            csv_rows_chunk = list(islice(csv_rows, CASTING_CHUNK_SIZE))
+            while csv_rows_chunk:
+                fingerprints = None
+                if self._delta is not None:
+                    csv_rows_chunk, fingerprints = self._delta.new_rows(
+                        csv_rows_chunk)
+                yield len(csv_rows_chunk), [
+                    (type, casting_plan.cast_rows(csv_rows_chunk))
+                    for type, casting_plan in casting_plans], fingerprints
+                csv_rows_chunk = list(islice(csv_rows, CASTING_CHUNK_SIZE))
+        finally:
+            csv_root_file.close()
+
+    def _casted_chunks_parallel(self):
+        """
+        Cast the byte ranges of the CSV file in a pool of processes and
+        yield their nodes in the order of the file, as _casted_chunks does
+        """
+        # We compile the plans here too, to check the rules and the columns
+        self._casting_plans()
+        types_casting = [self._nodetypes_casting.get(type, [])
+                         for type in self._nodetypes]
+        # The rows are checked against all the headers, repeated or not
+        tasks = [(self._file_path, start, end, len(self._headers),
+                  types_casting, self._csv_columns_indexes,
+                  castings.VALIDATION_SAMPLING, self._delta_path)
+                 for start, end in file_ranges(self._file_path,
+                                               JOBS_CHUNK_SIZE)]
+        pool = Pool(self._jobs)
+        try:
+            # We keep a few ranges in flight, so the casted nodes waiting to
+            # be treated don't fill the memory
+            pending = deque()
+            tasks = iter(tasks)
+            for task in islice(tasks, self._jobs * 2):
+                pending.append((task[1], pool.apply_async(cast_chunk,
+                                                          (task,))))
+            while pending:
+                start, result = pending.popleft()
+                result = result.get()
+                if result is None:
+                    # A value with line breaks crosses the end of the range,
+                    # so the ranges are not whole rows from here. The rest
+                    # of the file is read by this process.
+                    print("There are values with line breaks in the CSV "
+                          "file, casting the rest of it in a single "
+                          "process...")
+                    for casted_chunk in self._casted_chunks(start):
+                        yield casted_chunk
+                    break
+                rows, types_nodes, ended, fingerprints, timings = result
+                self._metrics.add_cast_timings(timings)
+                yield rows, zip(self._nodetypes, types_nodes), fingerprints
+                if ended:
+                    break
+                for task in islice(tasks, 1):
+                    pending.append((task[1], pool.apply_async(cast_chunk,
+                                                              (task,))))
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _treat_rows(self, nodes_index):
+        """
+        Cast the nodes of every row and yield, for each row, a list with the
+        type, the local id and the values of each node. The values are None
+        when the node was already treated in a previous row or, in delta
+        mode, loaded by a previous execution.
+        """
+        csv_file_node_id = dict((type, 1) for type in self._nodetypes)
+        if self._jobs > 1:
+            casted_chunks = self._casted_chunks_parallel()
+        else:
+            casted_chunks = self._casted_chunks()
+        delta_rows_file = None
+        delta_loaded_file = None
+        if self._delta is not None:
+            delta_rows_file = open(self._delta_rows_path(), 'wb')
+            delta_loaded_file = open(self._delta_loaded_path(), 'w')
+            delta_loaded_writer = unicodecsv.writer(delta_loaded_file,
+                                                    encoding="utf-8")
+        try:
+            # The local ids are given in the order of the rows, so they are
+            # the same whatever the number of jobs
+            for rows, types_nodes, fingerprints in casted_chunks:
+                self._metrics.add_rows(rows)
+                loaded_ids = dict((type, []) for type in self._nodetypes)
+                for row_index in xrange(rows):
+                    row_nodes = []
+                    for type, type_nodes in types_nodes:
+                        temp_node = type_nodes[row_index]
+                        # We check if the node already exists
+                        node_id = nodes_index.get(type, temp_node)
+                        if node_id is None:
+                            # Let's add our node
+                            node_id = csv_file_node_id[type]
+                            nodes_index.add(type, temp_node, node_id)
+                            csv_file_node_id[type] += 1
+                            remote_id = self._loaded_node(type, temp_node)
+                            if remote_id is None:
+                                row_nodes.append((type, node_id, temp_node))
+                                continue
+                            self._ids_map(type)[node_id] = remote_id
+                            loaded_ids[type].append((node_id, remote_id))
+                        row_nodes.append((type, node_id, None))
+                    yield row_nodes
+                # The nodes loaded before are not dumped again, so we record
+                # their remote ids for a resumed load
+                for type, ids in loaded_ids.iteritems():
+                    if ids:
+                        self._journal.complete_batch(
+                            STATUS.DATA_NODES_DUMPING, type, 0, ids)
+                if delta_rows_file is not None:
+                    delta_rows_file.write("".join(fingerprints))
+                    delta_loaded_writer.writerows(
+                        (type, local_id, remote_id)
+                        for type, ids in loaded_ids.iteritems()
+                        for local_id, remote_id in ids)
+        finally:
+            if delta_rows_file is not None:
+                delta_rows_file.close()
+                delta_loaded_file.close()
+
+    def _loaded_node(self, type, temp_node):
+        """
+        In delta mode, return the remote id of the node if a previous
+        execution loaded it
+        """
+        if self._delta is None:
+            return None
+        return self._delta.remote_id(
+            type, [_csv_text(value) for value in temp_node])
+
+    def _delta_rows_path(self):
+        return os.path.join(self._history_path, "_{}".format('delta_rows'))
+
+    def _delta_nodes_path(self):
+        return os.path.join(self._history_path,
+                            "_{}.csv".format('delta_nodes'))
+
+    def _delta_loaded_path(self):
+        return os.path.join(self._history_path,
+                            "_{}.csv".format('delta_loaded'))
+
+    def _rejected_rows(self, slug):
+        """
+        Iterate over the rows of the rejected file of a type, if any
+        """
+        reject_file_path = os.path.join(self._history_path,
+                                        "{}_rejected.csv".format(slug))
+        if not os.path.exists(reject_file_path):
+            return
+        with open(reject_file_path, 'r') as reject_file:
+            csv_reader = unicodecsv.reader(reject_file, encoding="utf-8")
+            csv_reader.next()
+            for row in csv_reader:
+                yield row
+
+    def _delta_remote_ids(self, remote_ids):
+        """
+        Map of the local ids of the nodes of every type to their remote ids,
+        only for the remote ids given by type
+        """
+        # The rows of the nodes are the local id, the type, the values and
+        # the remote id. The files of the types have headers.
+        if self._stream:
+            nodes_files = [(self._delta_nodes_path(), False)]
+        else:
+            nodes_files = [
+                (os.path.join(self._history_path, "{}.csv".format(
+                    self._nodetypes_rules_slugs[type])), True)
+                for type in self._nodetypes]
+        local_ids = dict((type, {}) for type in self._nodetypes)
+        for nodes_file_path, headers in nodes_files:
+            with open(nodes_file_path, 'r') as nodes_file:
+                csv_reader = unicodecsv.reader(nodes_file, encoding="utf-8")
+                if headers:
+                    csv_reader.next()
+                for row in csv_reader:
+                    if row[-1] in remote_ids.get(row[1], ()):
+                        local_ids[row[1]][row[0]] = row[-1]
+        # The nodes loaded by previous executions were not dumped
+        with open(self._delta_loaded_path(), 'r') as delta_loaded_file:
+            for type, local_id, remote_id in unicodecsv.reader(
+                    delta_loaded_file, encoding="utf-8"):
+                if remote_id in remote_ids.get(type, ()):
+                    local_ids[type][local_id] = remote_id
+        return local_ids
+
+    def _delta_failed_rows(self):
+        """
+        Indexes of the rows with a node or a relationship rejected by the
+        server, so they are tried again by the next execution
+        """
+        rejected_nodes = dict(
+            (type, set(row[0] for row in self._rejected_rows(
+                self._nodetypes_rules_slugs[type])))
+            for type in self._nodetypes)
+        # The rejected relationships are written with remote ids
+        rejected_relationships = {}
+        remote_ids = dict((type, set()) for type in self._nodetypes)
+        for key, val in self._reltypes.iteritems():
+            pairs = set((row[0], row[1]) for row in self._rejected_rows(
+                self._reltypes_rules_slugs[key]))
+            if not pairs:
+                continue
+            rejected_relationships[key] = pairs
+            for key_t, val_t in val.iteritems():
+                remote_ids[key_t].update(
+                    pair[0 if val_t == SOURCE else 1] for pair in pairs)
+        failed_rows = set()
+        if not any(rejected_nodes.values()) and not rejected_relationships:
+            return failed_rows
+        local_ids = self._delta_remote_ids(remote_ids)
+        csv_file_path = os.path.join(
+            self._history_path, "_{}.csv".format('relationships'))
+        with open(csv_file_path, 'r') as csv_file:
+            csv_reader = unicodecsv.reader(csv_file, encoding="utf-8")
+            columns = csv_reader.next()
+            for row_index, row in enumerate(csv_reader):
+                row_ids = dict(zip(columns, row))
+                if any(row_ids[type] in rejected_nodes[type]
+                       for type in self._nodetypes):
+                    failed_rows.add(row_index)
+                    continue
+                for key, pairs in rejected_relationships.iteritems():
+                    pair = [None, None]
+                    for key_t, val_t in self._reltypes[key].iteritems():
+                        pair[0 if val_t == SOURCE else 1] = (
+                            local_ids[key_t].get(row_ids[key_t]))
+                    if tuple(pair) in pairs:
+                        failed_rows.add(row_index)
+                        break
+        return failed_rows
+
+    def _record_delta(self):
+        """
+        Add the rows and the nodes of the load to the delta store, so the
+        next executions in delta mode skip them
+        """
+        # Only the rows fully loaded are skipped by the next executions.
+        # The others are sent again in full, with their relationships.
+        failed_rows = self._delta_failed_rows()
+        with open(self._delta_rows_path(), 'rb') as delta_rows_file:
+            fingerprints = iter(
+                lambda: delta_rows_file.read(FINGERPRINT_SIZE), "")
+            self._delta.add_rows(
+                fingerprint
+                for row_index, fingerprint in enumerate(fingerprints)
+                if row_index not in failed_rows)
+        if self._stream:
+            with open(self._delta_nodes_path(), 'r') as delta_nodes_file:
+                csv_reader = unicodecsv.reader(delta_nodes_file,
+                                               encoding="utf-8")
+                self._delta.add_nodes(
+                    (row[1], row[2:-1], row[-1]) for row in csv_reader)
+        else:
+            for type in self._nodetypes:
+                csv_file_path = os.path.join(
+                    self._history_path,
+                    "{}.csv".format(self._nodetypes_rules_slugs[type]))
+                with open(csv_file_path, 'r') as csv_file:
+                    csv_reader = unicodecsv.reader(csv_file, encoding="utf-8")
+                    # The nodes rows are the id, the type, the values and
+                    # the remote id
+                    csv_reader.next()
+                    self._delta.add_nodes(
+                        (type, row[2:-1], row[-1]) for row in csv_reader)
+        self._delta.commit()
+
+    def _nodes_index(self):
+        """
+        Index to control the nodes already treated
+        """
+        return NodesIndex(
+            os.path.join(self._history_path, "_{}.db".format('nodes_treated')),
+            self._index_limit)
+
     def format_data_nodes(self):
         """
         We format the nodes data into their respective csv files
         """
         self._status(STATUS.DATA_NODES_FORMATTING,
                      "Formatting nodes data...")
-        csv_root_file = open(self._file_path, 'r')
-        csv_reader = unicodecsv.reader(csv_root_file, encoding="utf-8")
         # We create the file to dump the relationships by row
         csv_relationships_path = os.path.join(
             self._history_path, "_{}.csv".format('relationships'))
         csv_relationships = open(csv_relationships_path, 'w+')
         csv_writer_rels = unicodecsv.writer(csv_relationships,
                                             encoding="utf-8")
-        # We create a temp file to control the nodes
-        csv_nodes_treated_path = os.path.join(
-            self._history_path, "_{}.csv".format('nodes_treated'))
-        csv_nodes_treated = open(csv_nodes_treated_path, 'a+', 0)
-        csv_nodes_treated.close()
-        csv_relationships_headers = []
-        csv_rels_headers_written = False
-        # The first line are the headers/columns values
-        columns = csv_reader.next()
-        # The rest of the lines are data
+        csv_writer_rels.writerow(self._nodetypes)
+        # We create the csv file for each type
         csv_files = {}
         csv_writers = {}
-        csv_file_node_id = {}
-        try:
-            csv_row = csv_reader.next()
-            correct_row = self._check_correct_row(csv_row, columns)
-            while csv_row:
-                if correct_row:
-                    relationships_node_ids = []
-                    for type in self._nodetypes:
-                        temp_node = []
-                        try:
-                            casting_functions = (self._nodetypes_casting[type])
-                        except KeyError:
-                            casting_functions = []
-                        csv_headers_castings = []
-                        for casting_function in casting_functions:
-                            # Let's extract the elements from the tuple
-                            csv_header = casting_function[0]
-                            func = casting_function[1]
-                            params = casting_function[2]
-                            # Let's get the index to get the values for params
-                            params_values = []
-                            try:
-                                for param in params:
-                                    param_index = self._csv_columns_indexes[
-                                        param]
-                                    param_value = csv_row[param_index]
-                                    params_values.append(param_value)
-                                cast_func = getattr(castings, func,
-                                                    lambda *x: u",".join(
-                                                        map(repr, x)))
-                                result = cast_func(*params_values)
-                                csv_headers_castings.append(csv_header)
-                                temp_node.append(result)
-                            except KeyError:
-                                raise ValueError(
-                                    "There is something wrong with the CSV "
-                                    "file or the rules file. "
-                                    "Please, check both and restart the "
-                                    "execution. If the problem persists, "
-                                    "please contact us."
-                                )
-                        # We write the node values in the right csv file
-                        try:
-                            csv_writer = csv_writers[type]
-                        except KeyError:
-                            csv_name = self._nodetypes_rules_slugs[type]
-                            csv_file_path = (os.path.join(
-                                self._history_path, "{}.csv".format(csv_name)))
-                            csv_file = open(csv_file_path, 'w+', 0)
-                            csv_writer = unicodecsv.writer(csv_file,
-                                                           encoding="utf-8")
-                            csv_files[type] = csv_file
-                            csv_writers[type] = csv_writer
-                            csv_file_node_id[type] = 1
-                            # Let's get the headers correctly
-                            csv_headers_basics = ['id', 'type']
-                            csv_headers_basics.extend(csv_headers_castings)
-                            csv_writer.writerow(csv_headers_basics)
-                        # We check if the node already exists
-                        exists_node = False
-                        try:
-                            node_id = csv_file_node_id[type]
-                            node_basics = [str(node_id), type]
-                            node_basics.extend(temp_node)
-                            # We use the temp file for the checking
-                            csv_nodes_treated = open(csv_nodes_treated_path,
-                                                     'r+')
-                            csv_reader_type = unicodecsv.reader(
-                                csv_nodes_treated, encoding="utf-8")
-                            csv_reader_row = csv_reader_type.next()
-                            while csv_reader_row:
-                                # We omit the first two elements (id, type)
-                                if csv_reader_row[2:] == temp_node:
-                                    exists_node = True
-                                    # The local id is in the 0 index
-                                    rel_node_id = csv_reader_row[0]
-                                    break
-                                csv_reader_row = csv_reader_type.next()
-                        except StopIteration:
-                            pass
-                        csv_nodes_treated.close()
-                        if not exists_node:
-                            # Let's add our node
-                            rel_node_id = node_id
-                            # We add the the node to our temp file
-                            csv_nodes_treated = open(csv_nodes_treated_path,
-                                                     'a+', 0)
-                            csv_writer_nodes = unicodecsv.writer(
-                                csv_nodes_treated, encoding="utf-8")
-                            csv_writer_nodes.writerow(node_basics)
-                            csv_nodes_treated.close()
-                            # We add the the node to the type csv file
-                            csv_writer.writerow(node_basics)
-                            csv_file_node_id[type] += 1
-                        relationships_node_ids.append(rel_node_id)
-                        # Let's update our structures for the relationships
-                        # file
-                        if type not in csv_relationships_headers:
-                            csv_relationships_headers.append(type)
-                    # We dump the values for our relationships
-                    if not csv_rels_headers_written:
-                        csv_writer_rels.writerow(csv_relationships_headers)
-                        csv_rels_headers_written = True
-                    csv_writer_rels.writerow(relationships_node_ids)
-                csv_row = csv_reader.next()
-                correct_row = self._check_correct_row(csv_row, columns)
-        except StopIteration:
-            pass
+        for type in self._nodetypes:
+            csv_name = self._nodetypes_rules_slugs[type]
+            csv_file_path = (os.path.join(
+                self._history_path, "{}.csv".format(csv_name)))
+            csv_file = open(csv_file_path, 'w+')
+            csv_writer = unicodecsv.writer(csv_file, encoding="utf-8")
+            csv_files[type] = csv_file
+            csv_writers[type] = csv_writer
+            # Let's get the headers correctly
+            csv_headers_basics = ['id', 'type']
+            csv_headers_basics.extend(self._casting_headers(type))
+            csv_writer.writerow(csv_headers_basics)
+        nodes_index = self._nodes_index()
+        for row_nodes in self._treat_rows(nodes_index):
+            relationships_node_ids = []
+            for type, node_id, temp_node in row_nodes:
+                if temp_node is not None:
+                    # We add the the node to the type csv file
+                    node_basics = [str(node_id), type]
+                    node_basics.extend(temp_node)
+                    csv_writers[type].writerow(node_basics)
+                relationships_node_ids.append(node_id)
+            # We dump the values for our relationships
+            csv_writer_rels.writerow(relationships_node_ids)
         # We close the files
-        csv_root_file.close()
         csv_relationships.close()
-        nodes_dumped_file_name = csv_nodes_treated.name
-        csv_nodes_treated.close()
-        os.remove(nodes_dumped_file_name)
+        nodes_index.close()
         for f in csv_files.values():
             f.close()
+        self._journal.complete(STATUS.DATA_NODES_FORMATTING)
+
+    def _resume_nodes_ids(self, type):
+        """
+        Fill the ids mapping of the type with the remote ids recorded in the
+        checkpoints of a previous execution. The pairs are read batch by
+        batch into the mapping, which moves them to disk past the limit.
+        """
+        remote_ids = self._journal.remote_ids(STATUS.DATA_NODES_DUMPING, type)
+        with self._ids_lock:
+            ids_map = self._ids_map(type)
+            for local_id, remote_id in remote_ids:
+                ids_map[local_id] = remote_id
+
+    def _replace_file(self, file_path, new_file_path):
+        """
+        Replace a file by its new version. It is also used to finish a
+        replacement interrupted in a previous execution.
+        """
+        if os.path.exists(new_file_path):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            os.rename(new_file_path, file_path)
+
+    def _nodes_batches(self, nodetype, mode, columns, csv_reader):
+        """
+        Read the nodes of a type csv file and yield them by batches
+        """
+        # We use a list of dicts to store the data nodes
+        nodes = []
+        nodes_list = []
+        nodes_bytes = 0
+        for csv_type_row in csv_reader:
+            temp_node = {}
+            column_index = 0
+            for elem in csv_type_row:
+                prop_name = columns[column_index]
+                temp_node[prop_name] = elem
+                column_index += 1
+            nodes.append(temp_node)
+            nodes_list.append(csv_type_row)
+            nodes_bytes += payload_size(columns, csv_type_row)
+            if self._nodes_batcher.is_full(len(nodes_list), nodes_bytes):
+                print("Dumping {} nodes...".format(len(nodes_list)))
+                self._nodes_batcher.record_payload(len(nodes_list),
+                                                   nodes_bytes)
+                self._metrics.observe_batch('nodes', len(nodes_list),
+                                            nodes_bytes)
+                yield (mode, nodetype, columns, nodes, nodes_list)
+                # We reset the structures
+                nodes = []
+                nodes_list = []
+                nodes_bytes = 0
+        if nodes_list:
+            print("Dumping {} nodes...".format(len(nodes_list)))
+            self._nodes_batcher.record_payload(len(nodes_list), nodes_bytes)
+            self._metrics.observe_batch('nodes', len(nodes_list), nodes_bytes)
+            yield (mode, nodetype, columns, nodes, nodes_list)
 
     def populate_nodes(self):
         """
@@ -539,12 +1555,21 @@ class SylvaApp(object):
                      "Writing nodes to the server. This may take a while, "
                      "please, be patient...")
         for type, mode in self._nodetypes_mode.iteritems():
-            # We open the files to read and write
             csv_name = self._nodetypes_rules_slugs[type]
             csv_file_path_type = os.path.join(
                 self._history_path, "{}.csv".format(csv_name))
             csv_file_path_type_new = os.path.join(
                 self._history_path, "{}_new_ids.csv".format(csv_name))
+            # We recover the remote ids already stored in the checkpoints
+            if not self._journal.is_complete(
+                    STATUS.DATA_RELATIONSHIPS_FORMATTING):
+                self._resume_nodes_ids(type)
+            if self._journal.is_complete(STATUS.DATA_NODES_DUMPING, type):
+                self._replace_file(csv_file_path_type, csv_file_path_type_new)
+                if self._watermarks is not None:
+                    self._watermarks.resolve(type)
+                continue
+            # We open the files to read and write
             csv_file_type = open(csv_file_path_type, 'r')
             csv_file_type_new = open(csv_file_path_type_new, 'w+')
             csv_reader = unicodecsv.reader(csv_file_type, encoding="utf-8")
@@ -552,91 +1577,41 @@ class SylvaApp(object):
             columns = csv_reader.next()
             columns.append("remote_id")
             csv_writer.writerow(columns)
-            try:
-                # We use a list of dicts to store the data nodes
-                nodes = []
-                nodes_list = []
-                nodes_batch_limit = 0
-                nodetype = type
-                csv_type_row = csv_reader.next()
-                while csv_type_row:
-                    column_index = 0
-                    temp_node = {}
-                    for elem in csv_type_row:
-                        prop_name = columns[column_index]
-                        temp_node[prop_name] = elem
-                        column_index += 1
-                    nodes.append(temp_node)
-                    nodes_list.append(csv_type_row)
-                    nodes_batch_limit += 1
-                    if nodes_batch_limit == self.batch_size:
-                        print("Dumping {} nodes...".format(len(nodes_list)))
-                        self._dump_nodes(csv_writer, type, mode,
-                                         nodetype, columns, nodes, nodes_list)
-                        # We reset the structures
-                        nodes = []
-                        nodes_list = []
-                        nodes_batch_limit = 0
-                    csv_type_row = csv_reader.next()
-            except StopIteration:
-                print("Dumping {} nodes...".format(len(nodes_list)))
-                self._dump_nodes(csv_writer, type, mode, nodetype, columns,
-                                 nodes, nodes_list)
-            # We get the names for the files
-            old_ids_file_name = csv_file_type.name
-            new_ids_file_name = csv_file_type_new.name
+            # We skip the nodes dumped before the load was interrupted
+            rows_done = self._journal.rows_done(STATUS.DATA_NODES_DUMPING,
+                                                type)
+            if rows_done:
+                print("Skipping {} nodes already dumped...".format(rows_done))
+            ids_map = self._ids_map(type)
+            for csv_type_row in islice(csv_reader, rows_done):
+                remote_id = ids_map.get(csv_type_row[0])
+                if remote_id is not None:
+                    csv_type_row.append(remote_id)
+                    csv_writer.writerow(csv_type_row)
+            if mode == GET_OR_CREATE:
+                self._nodes_remote_index[type] = (
+                    self._index_remote_nodes(type))
+            batches = self._nodes_batches(type, mode, columns, csv_reader)
+            # Batches in GET_OR_CREATE mode are sent one by one, otherwise
+            # two batches could create the same node at the same time
+            workers = self._workers if mode == CREATE else 1
+            self._dispatch(
+                self._nodes_batcher.timed(self._post_nodes, 3), batches,
+                lambda batch, nodes_remote_id: self._nodes_dumped(
+                    csv_writer, type, batch, nodes_remote_id), workers)
             # We close the files
             csv_file_type.close()
             csv_file_type_new.close()
+            self._journal.complete(STATUS.DATA_NODES_DUMPING, type)
+            if self._watermarks is not None:
+                self._watermarks.resolve(type)
             # We remove the old csv and rename the new
-            os.remove(old_ids_file_name)
-            os.rename(new_ids_file_name, old_ids_file_name)
-
-    def preparing_relationships(self):
-        """
-        Create the _relationships.csv files where we map all the relationships
-        neccesary ids.
-        """
-        self._status(STATUS.RELATIONSHIPS_PREPARING,
-                     "Preparing relationships...")
-        csv_file_path = os.path.join(
-            self._history_path, "_{}.csv".format('relationships'))
-        csv_file = open(csv_file_path, 'r')
-        csv_reader = unicodecsv.reader(csv_file, encoding="utf-8")
-        csv_file_new_path = (
-            os.path.join(
-                self._history_path, "_{}_new_ids.csv".format('relationships')))
-        csv_new_file = open(csv_file_new_path, 'w')
-        csv_writer_new = unicodecsv.writer(csv_new_file, encoding="utf-8")
-        headers = csv_reader.next()
-        csv_writer_new.writerow(headers)
-        try:
-            csv_row = csv_reader.next()
-            while csv_row:
-                column_index = 0
-                new_csv_row = []
-                for header in headers:
-                    type_row_id = csv_row[column_index]
-                    remote_id = self._nodes_ids_mapping[header][type_row_id]
-                    new_csv_row.append(remote_id)
-                    column_index += 1
-                csv_writer_new.writerow(new_csv_row)
-                csv_row = csv_reader.next()
-        except StopIteration:
-            pass
-        # We get the names for the files
-        old_ids_file_name = csv_file.name
-        new_ids_file_name = csv_new_file.name
-        # We close the files
-        csv_file.close()
-        csv_new_file.close()
-        # We remove the old csv and rename the new
-        os.remove(old_ids_file_name)
-        os.rename(new_ids_file_name, old_ids_file_name)
+            self._replace_file(csv_file_path_type, csv_file_path_type_new)
 
     def format_data_relationships(self):
         """
-        Using the _relationships_new_ids.csv file, we format the data for the
+        Using the _relationships.csv file, we translate the local ids of the
+        nodes into their remote ids and format the data for the
         relationships
         """
         self._status(STATUS.DATA_RELATIONSHIPS_FORMATTING,
@@ -644,50 +1619,114 @@ class SylvaApp(object):
         csv_file_path = os.path.join(
             self._history_path, "_{}.csv".format('relationships'))
         csv_file_root = open(csv_file_path, 'r')
-        csv_reader = unicodecsv.reader(csv_file_root, encoding="utf-8")
+        # The ids are only copied, so the rows are not decoded. The csv
+        # module reads and writes them in C, much faster than unicodecsv.
+        # The headers are the slugs of the node types, so they are decoded
+        # to find them.
+        csv_reader = csv.reader(csv_file_root)
+        columns = [column.decode('utf-8') for column in csv_reader.next()]
+        # A load started by a previous version could have translated the
+        # file already
+        translate = not self._journal.is_complete(
+            STATUS.RELATIONSHIPS_PREPARING)
+        # The columns of the source and the target of every type are fixed,
+        # so each type is a projection of the rows
         csv_files = {}
-        csv_writers = {}
-        # First we get the index for each type (they are the headers)
-        columns_indexes = {}
-        columns = csv_reader.next()
-        column_index = 0
-        for prop in columns:
-            columns_indexes[prop] = column_index
-            column_index = column_index + 1
-        try:
-            csv_row_data = csv_reader.next()
-            while csv_row_data:
-                for key, val in self._reltypes.iteritems():
-                    try:
-                        csv_writer = csv_writers[key]
-                    except:
-                        csv_name = self._reltypes_rules_slugs[key]
-                        csv_file_path = os.path.join(self._history_path,
-                                                     "{}.csv".format(csv_name))
-                        csv_file = open(csv_file_path, 'w+')
-                        csv_writer = unicodecsv.writer(csv_file,
-                                                       encoding="utf-8")
-                        csv_files[key] = csv_file
-                        csv_writers[key] = csv_writer
-                        columns = ['source_id', 'target_id', 'type']
-                        csv_writer.writerow(columns)
-                    source = ""
-                    target = ""
-                    type = key
-                    for key_t, val_t in val.iteritems():
-                        data_index = columns_indexes[key_t]
-                        if val_t == SOURCE:
-                            source = csv_row_data[data_index]
-                        elif val_t == TARGET:
-                            target = csv_row_data[data_index]
-                    temp_row = [source, target, type]
-                    csv_writers[key].writerow(temp_row)
-                csv_row_data = csv_reader.next()
-        except StopIteration:
-            pass
+        projections = []
+        for key, val in self._reltypes.iteritems():
+            csv_name = self._reltypes_rules_slugs[key]
+            csv_file = open(os.path.join(self._history_path,
+                                         "{}.csv".format(csv_name)), 'w+')
+            csv_writer = csv.writer(csv_file)
+            csv_writer.writerow(['source_id', 'target_id', 'type'])
+            csv_files[key] = csv_file
+            indexes = dict((val_t, columns.index(key_t))
+                           for key_t, val_t in val.iteritems())
+            type = key
+            if isinstance(type, unicode):
+                type = type.encode('utf-8')
+            projections.append((type, indexes[SOURCE], indexes[TARGET],
+                                csv_writer, self._pairs_set(key)))
+        # Node types of the columns used by the relationships
+        columns_types = dict((index, columns[index])
+                             for type, source_index, target_index, csv_writer,
+                             pairs_set in projections
+                             for index in (source_index, target_index))
+        relationships = 0
+        while True:
+            csv_rows = list(islice(csv_reader, RELATIONSHIPS_CHUNK_SIZE))
+            if not csv_rows:
+                break
+            # Every column is translated at once, with the local ids as
+            # positions of the arrays of remote ids
+            ids_columns = {}
+            for index, nodetype in columns_types.iteritems():
+                local_ids = map(itemgetter(index), csv_rows)
+                if translate:
+                    # The nodes rejected by the server have no remote id
+                    ids_columns[index] = self._ids_map(nodetype).get_many(
+                        local_ids, "")
+                else:
+                    ids_columns[index] = local_ids
+            for (type, source_index, target_index, csv_writer,
+                    pairs_set) in projections:
+                pairs = [(source, target) for source, target
+                         in zip(ids_columns[source_index],
+                                ids_columns[target_index])
+                         if source and target]
+                self._skipped_relationships += len(csv_rows) - len(pairs)
+                if pairs_set is not None:
+                    # We drop the pairs of ids already seen, so every
+                    # relationship is sent once
+                    new_pairs = pairs_set.add_many(pairs)
+                    self._duplicated_relationships += (len(pairs) -
+                                                       len(new_pairs))
+                    pairs = new_pairs
+                rows = [(source, target, type) for source, target in pairs]
+                csv_writer.writerows(rows)
+                relationships += len(rows)
+        self._metrics.add_rows(relationships)
         csv_file_root.close()
         for f in csv_files.values():
             f.close()
+        self._close_pairs_sets()
+        self._journal.complete(STATUS.DATA_RELATIONSHIPS_FORMATTING)
+
+    def _relationships_batches(self, reltype, mode, columns, csv_reader):
+        """
+        Read the relationships of a type csv file and yield them by batches
+        """
+        relationships = []
+        relationships_bytes = 0
+        for temp_rel_data in csv_reader:
+            # We need to store the data in a dict to post the data
+            column_index = 0
+            temp_rel = {}
+            for elem in temp_rel_data:
+                temp_rel[columns[column_index]] = elem
+                column_index += 1
+            relationships.append(temp_rel)
+            relationships_bytes += payload_size(columns, temp_rel_data)
+            if self._relationships_batcher.is_full(len(relationships),
+                                                   relationships_bytes):
+                print("Dumping {} relationships...".format(
+                    len(relationships)))
+                self._relationships_batcher.record_payload(
+                    len(relationships), relationships_bytes)
+                self._metrics.observe_batch('relationships',
+                                            len(relationships),
+                                            relationships_bytes)
+                yield (mode, reltype, relationships)
+                # We reset the structures
+                relationships = []
+                relationships_bytes = 0
+        if relationships:
+            print("Dumping {} relationships...".format(len(relationships)))
+            self._relationships_batcher.record_payload(
+                len(relationships), relationships_bytes)
+            self._metrics.observe_batch('relationships', len(relationships),
+                                        relationships_bytes)
+            yield (mode, reltype, relationships)
 
     def populate_relationships(self):
         """
@@ -697,38 +1736,324 @@ class SylvaApp(object):
                      "Writing relationships to the server. This may take a "
                      "while, please, be patient...")
         for key, val in self._rel_ids.iteritems():
+            if self._journal.is_complete(STATUS.DATA_RELATIONSHIPS_DUMPING,
+                                         key):
+                continue
             csv_name = self._reltypes_rules_slugs[key]
             csv_file_path = os.path.join(
                 self._history_path, "{}.csv".format(csv_name))
             csv_file = open(csv_file_path, 'r')
             csv_reader = unicodecsv.reader(csv_file, encoding="utf-8")
             columns = csv_reader.next()
-            try:
-                relationships = []
-                relationships_batch_limit = 0
-                reltype = key
-                temp_rel_data = csv_reader.next()
-                while temp_rel_data:
-                    # We need to store the data in a dict to post the data
-                    column_index = 0
-                    temp_rel = {}
-                    for elem in temp_rel_data:
-                        temp_rel[columns[column_index]] = elem
-                        column_index += 1
-                    relationships.append(temp_rel)
-                    relationships_batch_limit += 1
-                    if relationships_batch_limit == self.batch_size:
-                        print("Dumping {} relationships...".format(
-                            len(relationships)))
-                        self._dump_relationships(val, reltype, relationships)
-                        # We reset the structures
-                        relationships = []
-                        relationships_batch_limit = 0
-                    temp_rel_data = csv_reader.next()
-            except StopIteration:
-                print("Dumping {} relationships...".format(len(relationships)))
-                self._dump_relationships(val, reltype, relationships)
+            # We skip the relationships dumped before the load was
+            # interrupted
+            rows_done = self._journal.rows_done(
+                STATUS.DATA_RELATIONSHIPS_DUMPING, key)
+            if rows_done:
+                print("Skipping {} relationships already dumped...".format(
+                    rows_done))
+                for temp_rel_data in islice(csv_reader, rows_done):
+                    pass
+            if val == GET_OR_CREATE:
+                self._relationships_remote_index[key] = (
+                    self._index_remote_relationships(key))
+            batches = self._relationships_batches(key, val, columns,
+                                                  csv_reader)
+            self._dispatch(
+                self._relationships_batcher.timed(self._dump_relationships,
+                                                  2), batches,
+                lambda batch, result: self._relationships_dumped(batch))
             csv_file.close()
+            self._journal.complete(STATUS.DATA_RELATIONSHIPS_DUMPING, key)
+
+    def _relationships_dumped(self, batch):
+        """
+        Record the checkpoint of a batch of relationships
+        """
+        # With --overlap they are sent during the dumping of the nodes
+        self._metrics.add_rows(len(batch[2]),
+                               STATUS.DATA_RELATIONSHIPS_DUMPING)
+        self._journal.complete_batch(STATUS.DATA_RELATIONSHIPS_DUMPING,
+                                     batch[1], len(batch[2]))
+
+    def _start_overlap(self):
+        """
+        Start the thread that sends the relationships while the nodes are
+        dumped
+        """
+        self._watermarks = Watermarks(self._nodetypes)
+        self._overlap_thread = threading.Thread(
+            target=self._overlap_relationships)
+        self._overlap_thread.daemon = True
+        self._overlap_thread.start()
+
+    def _overlap_relationships(self):
+        try:
+            self._dispatch(
+                self._relationships_batcher.timed(self._dump_relationships,
+                                                  2),
+                self._overlap_batches(),
+                lambda batch, result: self._relationships_dumped(batch))
+        except OverlapStopped:
+            pass
+        except Exception as e:
+            self._overlap_error = e
+
+    def _overlap_cursors(self):
+        """
+        A cursor over the rows of local ids for every type of relationship
+        not dumped yet
+        """
+        csv_file_path = os.path.join(
+            self._history_path, "_{}.csv".format('relationships'))
+        cursors = []
+        for key, val in self._rel_ids.iteritems():
+            if self._journal.is_complete(STATUS.DATA_RELATIONSHIPS_DUMPING,
+                                         key):
+                continue
+            if val == GET_OR_CREATE:
+                self._relationships_remote_index[key] = (
+                    self._index_remote_relationships(key))
+            csv_file = open(csv_file_path, 'r')
+            csv_reader = unicodecsv.reader(csv_file, encoding="utf-8")
+            headers = csv_reader.next()
+            cursor = {'key': key, 'mode': val, 'file': csv_file,
+                      'reader': csv_reader, 'row': None,
+                      # The relationships dumped before the load was
+                      # interrupted are skipped
+                      'skip': self._journal.rows_done(
+                          STATUS.DATA_RELATIONSHIPS_DUMPING, key),
+                      'relationships': [], 'bytes': 0,
+                      'pairs': self._pairs_set(key)}
+            for key_t, val_t in self._reltypes[key].iteritems():
+                cursor[val_t] = (key_t, headers.index(key_t))
+            cursors.append(cursor)
+        return cursors
+
+    def _overlap_batches(self):
+        """
+        Yield the batches of relationships of every type as soon as the
+        nodes of their rows have remote ids
+        """
+        cursors = self._overlap_cursors()
+        try:
+            while cursors:
+                version = self._watermarks.version()
+                for cursor in list(cursors):
+                    for batch in self._advance_cursor(cursor):
+                        yield batch
+                    if cursor['reader'] is None:
+                        cursors.remove(cursor)
+                        self._journal.complete(
+                            STATUS.DATA_RELATIONSHIPS_DUMPING, cursor['key'])
+                if cursors:
+                    self._watermarks.wait(version)
+        finally:
+            for cursor in cursors:
+                cursor['file'].close()
+
+    def _relationships_batch(self, cursor):
+        relationships = cursor['relationships']
+        print("Dumping {} relationships...".format(len(relationships)))
+        self._relationships_batcher.record_payload(len(relationships),
+                                                   cursor['bytes'])
+        self._metrics.observe_batch('relationships', len(relationships),
+                                    cursor['bytes'])
+        cursor['relationships'] = []
+        cursor['bytes'] = 0
+        return (cursor['mode'], cursor['key'], relationships)
+
+    def _advance_cursor(self, cursor):
+        """
+        Translate the rows of the cursor until one of them has nodes without
+        remote id yet, and yield the complete batches
+        """
+        columns = ['source_id', 'target_id', 'type']
+        source_type, source_index = cursor[SOURCE]
+        target_type, target_index = cursor[TARGET]
+        while True:
+            csv_row = cursor['row'] or next(cursor['reader'], None)
+            if csv_row is None:
+                break
+            source_id = csv_row[source_index]
+            target_id = csv_row[target_index]
+            if not (self._watermarks.is_resolved(source_type, source_id) and
+                    self._watermarks.is_resolved(target_type, target_id)):
+                # We wait for the nodes of the row
+                cursor['row'] = csv_row
+                return
+            cursor['row'] = None
+            with self._ids_lock:
+                source = self._ids_map(source_type).get(source_id, "")
+                target = self._ids_map(target_type).get(target_id, "")
+            if not source or not target:
+                # One of the nodes was rejected by the server
+                self._skipped_relationships += 1
+                continue
+            if cursor['pairs'] is not None and (
+                    not cursor['pairs'].add(source, target)):
+                # The relationship was already sent
+                self._duplicated_relationships += 1
+                continue
+            if cursor['skip']:
+                cursor['skip'] -= 1
+                continue
+            temp_row = [source, target, cursor['key']]
+            cursor['relationships'].append(dict(zip(columns, temp_row)))
+            cursor['bytes'] += payload_size(columns, temp_row)
+            if self._relationships_batcher.is_full(
+                    len(cursor['relationships']), cursor['bytes']):
+                yield self._relationships_batch(cursor)
+        if cursor['relationships']:
+            yield self._relationships_batch(cursor)
+        cursor['file'].close()
+        cursor['reader'] = None
+
+    def _finish_overlap(self):
+        """
+        Wait for the relationships sent while the nodes were dumped
+        """
+        self._status(STATUS.DATA_RELATIONSHIPS_DUMPING,
+                     "Writing the last relationships to the server...")
+        self._overlap_thread.join()
+        self._overlap_thread = None
+        if self._overlap_error is not None:
+            raise self._overlap_error
+        # The relationships were translated and formatted on the fly
+        self._journal.complete(STATUS.DATA_RELATIONSHIPS_FORMATTING)
+
+    def _stop_overlap(self):
+        if self._overlap_thread is not None:
+            self._watermarks.stop()
+            self._overlap_thread.join()
+            self._overlap_thread = None
+
+    def stream_data(self):
+        """
+        Read the CSV file once and send the nodes and relationships to
+        SylvaDB as soon as they are casted, without intermediate files
+        """
+        self._status(STATUS.DATA_STREAMING,
+                     "Streaming data to the server. This may take a while, "
+                     "please, be patient...")
+        columns = {}
+        for type, mode in self._nodetypes_mode.iteritems():
+            columns[type] = ['id', 'type']
+            columns[type].extend(self._casting_headers(type))
+            columns[type].append("remote_id")
+            if mode == GET_OR_CREATE:
+                self._nodes_remote_index[type] = (
+                    self._index_remote_nodes(type))
+        for key, val in self._rel_ids.iteritems():
+            if val == GET_OR_CREATE:
+                self._relationships_remote_index[key] = (
+                    self._index_remote_relationships(key))
+        # Nodes and relationships waiting to be sent
+        nodes_lists = dict((type, []) for type in self._nodetypes)
+        rows_node_ids = []
+        relationships = dict((key, []) for key in self._rel_ids)
+        # In delta mode, we keep the nodes sent and the local ids of every
+        # row to add the rows fully loaded to the store
+        delta_nodes_file = None
+        delta_relationships_file = None
+        if self._delta is not None:
+            delta_nodes_file = open(self._delta_nodes_path(), 'w')
+            self._delta_nodes_writer = unicodecsv.writer(delta_nodes_file,
+                                                         encoding="utf-8")
+            delta_relationships_file = open(os.path.join(
+                self._history_path, "_{}.csv".format('relationships')), 'w')
+            delta_relationships_writer = unicodecsv.writer(
+                delta_relationships_file, encoding="utf-8")
+            delta_relationships_writer.writerow(self._nodetypes)
+        nodes_index = self._nodes_index()
+        for row_nodes in self._treat_rows(nodes_index):
+            row_node_ids = {}
+            for type, node_id, temp_node in row_nodes:
+                if temp_node is not None:
+                    node_basics = [unicode(node_id), type]
+                    node_basics.extend(_csv_text(value) for value in temp_node)
+                    nodes_lists[type].append(node_basics)
+                    if len(nodes_lists[type]) == self.batch_size:
+                        self._stream_nodes(type, columns[type],
+                                           nodes_lists[type])
+                        nodes_lists[type] = []
+                row_node_ids[type] = str(node_id)
+            rows_node_ids.append(row_node_ids)
+            if delta_relationships_file is not None:
+                delta_relationships_writer.writerow(
+                    [row_node_ids[type] for type in self._nodetypes])
+            if len(rows_node_ids) == self.batch_size:
+                # The relationships need the remote ids of their nodes
+                for type in self._nodetypes:
+                    self._stream_nodes(type, columns[type], nodes_lists[type])
+                    nodes_lists[type] = []
+                self._stream_relationships(rows_node_ids, relationships)
+                rows_node_ids = []
+        for type in self._nodetypes:
+            self._stream_nodes(type, columns[type], nodes_lists[type])
+        self._stream_relationships(rows_node_ids, relationships, True)
+        nodes_index.close()
+        if delta_nodes_file is not None:
+            delta_nodes_file.close()
+            delta_relationships_file.close()
+            self._delta_nodes_writer = None
+
+    def _stream_nodes(self, type, columns, nodes_list):
+        """
+        Send a batch of nodes of the streaming and store their remote ids
+        """
+        if not nodes_list:
+            return
+        nodes = [dict(zip(columns, node)) for node in nodes_list]
+        print("Dumping {} nodes...".format(len(nodes_list)))
+        self._metrics.observe_batch(
+            'nodes', len(nodes_list),
+            sum(payload_size(columns, node) for node in nodes_list))
+        nodes_remote_id = self._post_nodes(self._nodetypes_mode[type], type,
+                                           columns, nodes, nodes_list)
+        self._map_nodes(type, nodes_remote_id)
+        if self._delta_nodes_writer is not None:
+            # The rows of the nodes are the local id, the type, the values
+            # and the remote id
+            self._delta_nodes_writer.writerows(nodes_remote_id)
+
+    def _stream_relationships(self, rows_node_ids, relationships,
+                              flush=False):
+        """
+        Translate the local ids of the rows into the relationships of each
+        type and send the complete batches
+        """
+        for row_node_ids in rows_node_ids:
+            for key, val in self._reltypes.iteritems():
+                temp_rel = {'source_id': "", 'target_id': "", 'type': key}
+                for key_t, val_t in val.iteritems():
+                    remote_id = self._ids_map(key_t).get(row_node_ids[key_t],
+                                                         "")
+                    if val_t == SOURCE:
+                        temp_rel['source_id'] = remote_id
+                    elif val_t == TARGET:
+                        temp_rel['target_id'] = remote_id
+                if not temp_rel['source_id'] or not temp_rel['target_id']:
+                    # One of the nodes was rejected by the server
+                    self._skipped_relationships += 1
+                    continue
+                pairs_set = self._pairs_set(key)
+                if pairs_set is not None and not pairs_set.add(
+                        temp_rel['source_id'], temp_rel['target_id']):
+                    self._duplicated_relationships += 1
+                    continue
+                relationships[key].append(temp_rel)
+        for key, val in self._rel_ids.iteritems():
+            batch_full = len(relationships[key]) >= self.batch_size
+            if relationships[key] and (batch_full or flush):
+                print("Dumping {} relationships...".format(
+                    len(relationships[key])))
+                self._metrics.observe_batch(
+                    'relationships', len(relationships[key]),
+                    sum(payload_size(rel.keys(), rel.values())
+                        for rel in relationships[key]))
+                self._dump_relationships(val, key, relationships[key])
+                relationships[key] = []
 
     def populate_data(self):
         """
@@ -738,17 +2063,60 @@ class SylvaApp(object):
         try:
             self._check_token()
             self._check_schema()
-            self._setup_nodetypes()
-            self._setup_reltypes()
+            self._setup_types()
+            self._cache_metadata()
             self.format_data_columns()
-            self.format_data_nodes()
+            if self._stream:
+                self.stream_data()
+                if self._delta is not None:
+                    self._record_delta()
+                self._report_rejected()
+                self._status(STATUS.EXECUTION_COMPLETED,
+                             "Execution completed!")
+                return
+            # The phases completed in a previous execution are skipped
+            if not self._journal.is_complete(STATUS.DATA_NODES_FORMATTING):
+                self.format_data_nodes()
+            overlap = self._overlap and not self._journal.is_complete(
+                STATUS.DATA_RELATIONSHIPS_FORMATTING)
+            if overlap:
+                self._start_overlap()
             self.populate_nodes()
-            self.preparing_relationships()
-            self.format_data_relationships()
-            self.populate_relationships()
+            if overlap:
+                self._finish_overlap()
+            else:
+                # We finish the replacement of the file of relationships
+                # of a load started by a previous version
+                self._replace_file(
+                    os.path.join(self._history_path,
+                                 "_{}.csv".format('relationships')),
+                    os.path.join(self._history_path,
+                                 "_{}_new_ids.csv".format('relationships')))
+                if not self._journal.is_complete(
+                        STATUS.DATA_RELATIONSHIPS_FORMATTING):
+                    self.format_data_relationships()
+                # The relationships have the remote ids now
+                self._close_ids_maps()
+                self.populate_relationships()
+            if self._delta is not None:
+                self._record_delta()
+            self._report_rejected()
+            self._journal.complete(STATUS.EXECUTION_COMPLETED)
             self._status(STATUS.EXECUTION_COMPLETED, "Execution completed!")
         except ValueError as e:
             print e.args
+        finally:
+            self._stop_overlap()
+            self._close_ids_maps()
+            self._close_pairs_sets()
+            self._close_remote_indexes()
+            self._close_reject_files()
+            self._journal.close()
+            self._metrics.close()
+            if self._profiler is not None:
+                self._profiler.close()
+            if self._delta is not None:
+                self._delta.close()
 
 
 def main():
@@ -760,11 +2128,137 @@ def main():
         'file', help='CSV file used to dump the data into SylvaDB')
 
     parser.add_argument(
-        '--batch-size', help='Batch size used to dump the data into SylvaDB')
+        '--batch-size',
+        help='Batch size used to dump the data into SylvaDB. With a target '
+             'latency, it is the size of the first batches')
+    parser.add_argument(
+        '--node-batch-limit',
+        help='Maximum size of the batches of nodes when they are adjusted')
+    parser.add_argument(
+        '--relationship-batch-limit',
+        help='Maximum size of the batches of relationships when they are '
+             'adjusted')
+    parser.add_argument(
+        '--target-latency',
+        help='Adjust the size of the batches so each request takes about '
+             'these seconds')
+    parser.add_argument(
+        '--target-bytes',
+        help='Maximum bytes sent to the server in each request')
+    parser.add_argument(
+        '--index-limit',
+        help='Number of nodes kept in memory to detect duplicates and to map '
+             'their remote ids before using the disk')
+    parser.add_argument(
+        '--workers',
+        help='Number of batches of nodes sent to SylvaDB at the same time')
+    parser.add_argument(
+        '--no-checkpoint', action='store_true',
+        help='Do not record checkpoints to resume an interrupted load')
+    parser.add_argument(
+        '--stream', action='store_true',
+        help='Read the CSV file once and send the data without intermediate '
+             'files. The checkpoints are not recorded')
+    parser.add_argument(
+        '--validation-sampling',
+        help='Validate one of each N GeoJSON geometries. 0 skips the '
+             'validation')
+    parser.add_argument(
+        '--jobs',
+        help='Number of processes used to cast the rows of the CSV file. '
+             'From the first value with line breaks, the rows are cast by a '
+             'single process')
+    parser.add_argument(
+        '--fingerprint', choices=FINGERPRINTS, default=FULL,
+        help='Hash the whole CSV file or only its size, modification time '
+             'and some blocks to find the history of the file')
+    parser.add_argument(
+        '--copy', choices=COPY_MODES, default=COPY,
+        help='Copy the CSV file into its history, clone it if the '
+             'filesystem supports it, or read it where it is. In the last '
+             'case, the file can not change until the load is completed')
+    parser.add_argument(
+        '--timeout',
+        help='Seconds to wait for the server to answer each request')
+    parser.add_argument(
+        '--gzip', action='store_true',
+        help='Compress the large requests to the server with gzip')
+    parser.add_argument(
+        '--retries',
+        help='Number of times a failed request is repeated before splitting '
+             'its batch to reject the rows that fail')
+    parser.add_argument(
+        '--backoff',
+        help='Seconds to wait before repeating a failed request. It doubles '
+             'with every retry')
+    parser.add_argument(
+        '--metrics-json',
+        help='File to append the measures of the load as JSON lines')
+    parser.add_argument(
+        '--metrics-prometheus',
+        help='Textfile to write the measures of the load for Prometheus')
+    parser.add_argument(
+        '--delta', action='store_true',
+        help='Only load the rows that were not loaded into the graph by '
+             'previous executions with --delta. The rows with a node or a '
+             'relationship rejected by the server are loaded again in '
+             'full, so their relationships created for every row are '
+             'repeated')
+    parser.add_argument(
+        '--metadata-ttl',
+        help='Seconds the types of the graph are cached between loads. '
+             'Meanwhile, the schema of the server is not downloaded if the '
+             'rules did not change. 0 disables the cache')
+    parser.add_argument(
+        '--refresh-metadata', action='store_true',
+        help='Ask the server for the types of the graph again')
+    parser.add_argument(
+        '--dedup-relationships', action='store_true',
+        help='Drop the repeated relationships of the types that are created '
+             'without checking them. Those of the types got or created are '
+             'always dropped')
+    parser.add_argument(
+        '--overlap', action='store_true',
+        help='Send the relationships while the nodes are dumped, as soon as '
+             'their nodes have remote ids')
+    parser.add_argument(
+        '--profile', nargs='?', const=TOP_FUNCTIONS, type=int,
+        help='Profile every phase into the history of the file and print '
+             'the N functions where most time is spent')
     args = parser.parse_args()
     file_path = args.file
     batch_size = args.batch_size
-    app = SylvaApp(file_path, batch_size)
+    index_limit = args.index_limit
+    workers = args.workers
+    checkpoint = not args.no_checkpoint
+    stream = args.stream
+    validation_sampling = args.validation_sampling
+    jobs = args.jobs
+    delta = args.delta
+    fingerprint = args.fingerprint
+    copy_mode = args.copy
+    timeout = args.timeout
+    gzip = args.gzip
+    node_batch_limit = args.node_batch_limit
+    relationship_batch_limit = args.relationship_batch_limit
+    target_latency = args.target_latency
+    target_bytes = args.target_bytes
+    retries_number = args.retries
+    backoff = args.backoff
+    metrics_json = args.metrics_json
+    metrics_prometheus = args.metrics_prometheus
+    profile = args.profile
+    overlap = args.overlap
+    metadata_ttl = args.metadata_ttl
+    refresh_metadata = args.refresh_metadata
+    dedup_relationships = args.dedup_relationships
+    app = SylvaApp(file_path, batch_size, index_limit, workers, checkpoint,
+                   stream, validation_sampling, jobs, delta, fingerprint,
+                   copy_mode, timeout, gzip, node_batch_limit,
+                   relationship_batch_limit, target_latency, target_bytes,
+                   retries_number, backoff, metrics_json, metrics_prometheus,
+                   profile, overlap, metadata_ttl, refresh_metadata,
+                   dedup_relationships)
     app.populate_data()
 
 
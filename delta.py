@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# The keys of the nodes must be the same in every execution, so we don't use
+# ujson here
+import hashlib
+import json
+import sqlite3
+
+# Bytes of the fingerprint of a row
+FINGERPRINT_SIZE = 16
+# Number of fingerprints looked up in each query
+LOOKUP_SIZE = 500
+
+
+def fingerprint(row):
+    """
+    Fingerprint of the values of a row of the CSV file
+    """
+    return hashlib.md5(u"\x00".join(row).encode('utf-8')).digest()
+
+
+class DeltaStore(object):
+    """
+    Rows and nodes loaded into a graph by previous executions in delta mode.
+    The rows are kept by their fingerprint and the nodes by their type and
+    the text of their values, together with their remote id.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rows (fingerprint BLOB PRIMARY KEY)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS nodes "
+            "(key TEXT PRIMARY KEY, remote_id TEXT)")
+        self._db.commit()
+
+    def _node_key(self, type, values):
+        return json.dumps([type] + list(values))
+
+    def new_rows(self, rows):
+        """
+        Return the rows that were not loaded before and their fingerprints
+        """
+        fingerprints = [fingerprint(row) for row in rows]
+        known = set()
+        for index in xrange(0, len(fingerprints), LOOKUP_SIZE):
+            lookup = fingerprints[index:index + LOOKUP_SIZE]
+            cursor = self._db.execute(
+                "SELECT fingerprint FROM rows "
+                "WHERE fingerprint IN ({})".format(
+                    ",".join("?" * len(lookup))),
+                [sqlite3.Binary(row_fingerprint)
+                 for row_fingerprint in lookup])
+            known.update(str(row[0]) for row in cursor)
+        if not known:
+            return rows, fingerprints
+        new_rows = []
+        new_fingerprints = []
+        for row, row_fingerprint in zip(rows, fingerprints):
+            if row_fingerprint not in known:
+                new_rows.append(row)
+                new_fingerprints.append(row_fingerprint)
+        return new_rows, new_fingerprints
+
+    def remote_id(self, type, values):
+        """
+        Return the remote id of the node or None if it was not loaded before
+        """
+        row = self._db.execute(
+            "SELECT remote_id FROM nodes WHERE key = ?",
+            (self._node_key(type, values),)).fetchone()
+        if row:
+            return row[0]
+        return None
+
+    def add_rows(self, fingerprints):
+        self._db.executemany(
+            "INSERT OR IGNORE INTO rows VALUES (?)",
+            ((sqlite3.Binary(row_fingerprint),)
+             for row_fingerprint in fingerprints))
+
+    def add_nodes(self, nodes):
+        """
+        Add the nodes, given as the type, the values and the remote id
+        """
+        self._db.executemany(
+            "INSERT OR REPLACE INTO nodes VALUES (?, ?)",
+            ((self._node_key(type, values), remote_id)
+             for type, values, remote_id in nodes))
+
+    def commit(self):
+        self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+from array import array
+try:
+    import ujson as json
+except ImportError:
+    import json  # NOQA
+from json import JSONEncoder
+import mmap
+import os
+import sqlite3
+import struct
+
+# Maximum number of nodes kept in memory before moving them to disk
+INDEX_MEMORY_LIMIT = 1000000
+# The keys of the nodes keep the type and every digit of their values, so
+# we don't use ujson for them. Other values are kept by their repr.
+NODE_KEY_ENCODER = JSONEncoder(sort_keys=True, default=repr)
+
+
+class NodesIndex(object):
+    """
+    Index to know if a node has been already treated. It maps the type and
+    the casted properties of the node to its local id.
+    The nodes are kept in a dict until we reach the memory limit. Then, they
+    are moved into a sqlite database and we start to fill the dict again.
+    """
+
+    def __init__(self, path, memory_limit=None):
+        self._path = path
+        self._memory_limit = INDEX_MEMORY_LIMIT
+        if memory_limit:
+            self._memory_limit = int(memory_limit)
+        self._nodes = {}
+        self._db = None
+
+    def _key(self, type, values):
+        # The same key is used in memory and on disk, so 1, 1.0 and True
+        # are different values whatever the memory limit
+        return NODE_KEY_ENCODER.encode([type, list(values)])
+
+    def _spill(self):
+        """
+        Move the nodes in memory into the sqlite database
+        """
+        if self._db is None:
+            if os.path.exists(self._path):
+                os.remove(self._path)
+            self._db = sqlite3.connect(self._path)
+            self._db.execute("PRAGMA synchronous = OFF")
+            self._db.execute("PRAGMA journal_mode = OFF")
+            self._db.execute(
+                "CREATE TABLE nodes (key TEXT PRIMARY KEY, local_id INTEGER)")
+        self._db.executemany("INSERT INTO nodes VALUES (?, ?)",
+                             self._nodes.iteritems())
+        self._db.commit()
+        self._nodes = {}
+
+    def get(self, type, values):
+        """
+        Return the local id for the node or None if it is not in the index
+        """
+        key = self._key(type, values)
+        local_id = self._nodes.get(key)
+        if local_id is None and self._db is not None:
+            row = self._db.execute(
+                "SELECT local_id FROM nodes WHERE key = ?",
+                (key,)).fetchone()
+            if row:
+                local_id = row[0]
+        return local_id
+
+    def add(self, type, values, local_id):
+        self._nodes[self._key(type, values)] = local_id
+        if len(self._nodes) >= self._memory_limit:
+            self._spill()
+
+    def close(self):
+        self._nodes = {}
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+            os.remove(self._path)
+
+
+class RemoteIdsMap(object):
+    """
+    Map of the local ids of the nodes of a type to their remote ids. The
+    local ids are consecutive integers, so the remote ids are stored in an
+    array at the position of their local id, with 0 for the missing ones and
+    the remote id plus 1 for the rest.
+    When the array reaches the memory limit, it is moved into a file mapped
+    in memory that grows as needed.
+    """
+    _item = struct.Struct('l')
+    # A C long has 32 bits on Windows
+    _max_value = 2 ** (8 * _item.size - 1) - 1
+
+    def __init__(self, path, memory_limit=None):
+        self._path = path
+        self._memory_limit = INDEX_MEMORY_LIMIT
+        if memory_limit:
+            self._memory_limit = int(memory_limit)
+        self._ids = array('l')
+        self._file = None
+        self._mmap = None
+        self._size = 0
+        # Remote ids that do not fit in the array, just in case
+        self._other_ids = {}
+
+    def _spill(self, size):
+        """
+        Move the array into the file or grow the file, for at least size ids
+        """
+        size = max(size, self._size * 2)
+        if self._file is None:
+            self._file = open(self._path, 'w+b')
+            self._file.write(self._ids.tostring())
+            self._ids = array('l')
+        else:
+            self._mmap.close()
+        self._file.truncate(size * self._item.size)
+        self._mmap = mmap.mmap(self._file.fileno(), size * self._item.size)
+        self._size = size
+
+    def __setitem__(self, local_id, remote_id):
+        local_id = int(local_id)
+        try:
+            value = int(remote_id) + 1
+        except ValueError:
+            value = 0
+        if not 0 < value <= self._max_value:
+            # The remote ids that are not integers, negative or too big for
+            # the array are kept apart
+            self._other_ids[local_id] = remote_id
+            value = 0
+        if self._mmap is not None:
+            if local_id >= self._size:
+                self._spill(local_id + 1)
+            self._item.pack_into(self._mmap, local_id * self._item.size,
+                                 value)
+            return
+        if local_id >= len(self._ids):
+            if local_id >= self._memory_limit:
+                self._spill(local_id + 1)
+                self.__setitem__(local_id, remote_id)
+                return
+            self._ids.extend(array('l', [0]) * (local_id + 1 -
+                                                len(self._ids)))
+        self._ids[local_id] = value
+
+    def get(self, local_id, default=None):
+        """
+        Return the remote id, as a string, for the local id or default if it
+        is not in the map
+        """
+        local_id = int(local_id)
+        value = 0
+        if self._mmap is not None:
+            if local_id < self._size:
+                value = self._item.unpack_from(
+                    self._mmap, local_id * self._item.size)[0]
+        elif local_id < len(self._ids):
+            value = self._ids[local_id]
+        if value:
+            return str(value - 1)
+        return self._other_ids.get(local_id, default)
+
+    def get_many(self, local_ids, default=None):
+        """
+        Return the remote ids for a list of local ids at once
+        """
+        local_ids = map(int, local_ids)
+        if self._mmap is not None:
+            size = self._size
+            item_size = self._item.size
+            unpack_from = self._item.unpack_from
+            values = [unpack_from(self._mmap, local_id * item_size)[0]
+                      if local_id < size else 0 for local_id in local_ids]
+        else:
+            ids = self._ids
+            size = len(ids)
+            values = [ids[local_id] if local_id < size else 0
+                      for local_id in local_ids]
+        other_ids = self._other_ids
+        return [str(value - 1) if value else
+                other_ids.get(local_id, default)
+                for local_id, value in zip(local_ids, values)]
+
+    def __getitem__(self, local_id):
+        remote_id = self.get(local_id)
+        if remote_id is None:
+            raise KeyError(local_id)
+        return remote_id
+
+    def close(self):
+        self._ids = array('l')
+        self._other_ids = {}
+        if self._file is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
+            self._file = None
+            os.remove(self._path)
+
+
+class PairsSet(object):
+    """
+    Set of the pairs of source and target ids of the relationships of a
+    type, to know if a relationship has been already treated. The integer
+    ids are packed into a single integer, so every pair takes a few bytes.
+    The pairs are kept in a set until we reach the memory limit. Then, they
+    are moved into a sqlite database and we start to fill the set again.
+    """
+    _max_id = 1 << 64
+
+    def __init__(self, path, memory_limit=None):
+        self._path = path
+        self._memory_limit = INDEX_MEMORY_LIMIT
+        if memory_limit:
+            self._memory_limit = int(memory_limit)
+        self._pairs = set()
+        self._db = None
+
+    def _pair(self, source, target):
+        try:
+            source = int(source)
+            target = int(target)
+        except ValueError:
+            # Ids that are not integers, just in case
+            return (source, target)
+        if 0 <= source < self._max_id and 0 <= target < self._max_id:
+            return (source << 64) | target
+        return (source, target)
+
+    def _key(self, pair):
+        # The packed pairs don't fit in a sqlite integer
+        if isinstance(pair, tuple):
+            return json.dumps(list(pair))
+        return str(pair)
+
+    def _spill(self):
+        """
+        Move the pairs in memory into the sqlite database
+        """
+        if self._db is None:
+            if os.path.exists(self._path):
+                os.remove(self._path)
+            # The set is filled by the thread that sends the relationships
+            # while the nodes are dumped, and closed by the main one
+            self._db = sqlite3.connect(self._path, check_same_thread=False)
+            self._db.execute("PRAGMA synchronous = OFF")
+            self._db.execute("PRAGMA journal_mode = OFF")
+            self._db.execute("CREATE TABLE pairs (key TEXT PRIMARY KEY)")
+        self._db.executemany("INSERT INTO pairs VALUES (?)",
+                             ((self._key(pair),) for pair in self._pairs))
+        self._db.commit()
+        self._pairs = set()
+
+    def __contains__(self, pair):
+        pair = self._pair(*pair)
+        if pair in self._pairs:
+            return True
+        return self._db is not None and self._db.execute(
+            "SELECT 1 FROM pairs WHERE key = ?",
+            (self._key(pair),)).fetchone() is not None
+
+    def add(self, source, target):
+        """
+        Add the pair and return True, or False if it was already in the set
+        """
+        pair = self._pair(source, target)
+        if pair in self._pairs:
+            return False
+        if self._db is not None and self._db.execute(
+                "SELECT 1 FROM pairs WHERE key = ?",
+                (self._key(pair),)).fetchone():
+            return False
+        self._pairs.add(pair)
+        if len(self._pairs) >= self._memory_limit:
+            self._spill()
+        return True
+
+    def add_many(self, pairs):
+        """
+        Add a list of pairs at once and return those that were not in the
+        set, in the same order
+        """
+        if not pairs:
+            return []
+        try:
+            sources, targets = zip(*pairs)
+            sources = map(int, sources)
+            targets = map(int, targets)
+            if not (0 <= min(sources) and max(sources) < self._max_id and
+                    0 <= min(targets) and max(targets) < self._max_id):
+                raise ValueError()
+            keys = [(source << 64) | target
+                    for source, target in zip(sources, targets)]
+        except ValueError:
+            keys = [self._pair(source, target) for source, target in pairs]
+        new_pairs = []
+        known = self._pairs
+        for key, pair in zip(keys, pairs):
+            if key in known:
+                continue
+            if self._db is not None and self._db.execute(
+                    "SELECT 1 FROM pairs WHERE key = ?",
+                    (self._key(key),)).fetchone():
+                continue
+            known.add(key)
+            new_pairs.append(pair)
+        if len(known) >= self._memory_limit:
+            self._spill()
+        return new_pairs
+
+    def close(self):
+        self._pairs = set()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+            os.remove(self._path)
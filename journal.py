@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+try:
+    import ujson as json
+except ImportError:
+    import json  # NOQA
+import os
+import struct
+import threading
+
+# The pairs of local and remote ids of the nodes are appended to a file
+# next to the journal, and every batch records the range of its pairs
+IDS_SUFFIX = '.ids'
+IDS_ITEM = struct.Struct('<qq')
+
+
+class Journal(object):
+    """
+    Checkpoint journal of a load. Every completed batch and phase is
+    appended as a JSON line and synced to disk, so an interrupted load can
+    continue from the first unfinished batch.
+    Without path, the journal only lives in memory and nothing is resumed.
+    Batches can be recorded from several threads.
+    The remote ids of the batches are packed into a file of ids, so the
+    journal only keeps the ranges of that file for every type.
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._completed = set()
+        self._rows = {}
+        self._file = None
+        self._ids_file = None
+        self._lock = threading.Lock()
+        # Ranges of the file of ids of every phase and type, and the types
+        # with ids written in the journal
+        self._ranges = {}
+        self._inline_ids = set()
+        if path is None:
+            return
+        resuming = os.path.exists(path)
+        if resuming:
+            with open(path, 'r+') as journal_file:
+                end = 0
+                for line in journal_file:
+                    if not line.endswith("\n"):
+                        # The last line was half written, so it is removed
+                        # to append the next entries after a full line
+                        break
+                    end += len(line)
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    key = (entry['phase'], entry.get('type'))
+                    if entry.get('rows') is None:
+                        self._completed.add(key)
+                    else:
+                        self._rows[key] = (
+                            self._rows.get(key, 0) + entry['rows'])
+                    if entry.get('ids_range'):
+                        self._ranges.setdefault(key, []).append(
+                            tuple(entry['ids_range']))
+                    if entry.get('ids'):
+                        self._inline_ids.add(key)
+                journal_file.truncate(end)
+        self._file = open(path, 'a')
+        # The ids of a torn batch are left at the end of the file, out of
+        # every range
+        self._ids_file = open(path + IDS_SUFFIX, 'ab' if resuming else 'wb')
+        self._ids_file.seek(0, os.SEEK_END)
+
+    def _write(self, entry):
+        if self._file is None:
+            return
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def is_resuming(self):
+        return bool(self._completed or self._rows)
+
+    def is_complete(self, phase, type=None):
+        return (phase, type) in self._completed
+
+    def complete(self, phase, type=None):
+        with self._lock:
+            self._completed.add((phase, type))
+            self._write({'phase': phase, 'type': type})
+
+    def rows_done(self, phase, type=None):
+        """
+        Number of rows of the type already treated in the phase
+        """
+        return self._rows.get((phase, type), 0)
+
+    def complete_batch(self, phase, type, rows, ids=None):
+        """
+        Record a batch of rows and, for the nodes, the pairs of local and
+        remote ids
+        """
+        key = (phase, type)
+        entry = {'phase': phase, 'type': type, 'rows': rows}
+        packed = []
+        if ids and self._file is not None:
+            other_ids = []
+            for local_id, remote_id in ids:
+                try:
+                    packed.append(IDS_ITEM.pack(int(local_id),
+                                                int(remote_id)))
+                except (ValueError, struct.error):
+                    # The remote ids that are not integers are kept in the
+                    # journal, just in case
+                    other_ids.append([local_id, remote_id])
+            if other_ids:
+                entry['ids'] = other_ids
+        with self._lock:
+            self._rows[key] = self._rows.get(key, 0) + rows
+            if packed:
+                # The ids are on disk before the batch that points to them
+                start = self._ids_file.tell()
+                self._ids_file.write("".join(packed))
+                self._ids_file.flush()
+                os.fsync(self._ids_file.fileno())
+                entry['ids_range'] = [start, self._ids_file.tell()]
+                self._ranges.setdefault(key, []).append(
+                    tuple(entry['ids_range']))
+            if entry.get('ids'):
+                self._inline_ids.add(key)
+            self._write(entry)
+
+    def remote_ids(self, phase, type):
+        """
+        Yield the pairs of local and remote ids recorded for the type. They
+        are read by batches from the file of ids, so a type is restored
+        without reading the ids of the rest.
+        """
+        if self._file is None:
+            return
+        key = (phase, type)
+        with self._lock:
+            ranges = list(self._ranges.get(key, ()))
+            inline_ids = key in self._inline_ids
+            self._file.flush()
+        if ranges:
+            with open(self._path + IDS_SUFFIX, 'rb') as ids_file:
+                for start, end in ranges:
+                    ids_file.seek(start)
+                    data = ids_file.read(end - start)
+                    for offset in xrange(0, len(data), IDS_ITEM.size):
+                        yield IDS_ITEM.unpack_from(data, offset)
+        if inline_ids:
+            # The ids that are not integers, and those of a load started by
+            # a previous version
+            with open(self._path, 'r') as journal_file:
+                for line in journal_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if (entry['phase'], entry.get('type')) == key:
+                        for ids in entry.get('ids') or ():
+                            yield ids
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._ids_file.close()
+                self._file = None
+                self._ids_file = None
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import time
+
+# Folder of the history with the metadata of the graphs
+METADATA_DIRNAME = '_metadata'
+# Seconds the metadata of a graph is used before asking the server again
+METADATA_TTL = 3600
+# Differences of the schemas shown at most
+MAX_DIFFERENCES = 50
+
+
+def schema_fingerprint(schema):
+    """
+    Hash of the schema that does not depend on the order of its keys
+    """
+    canonical = json.dumps(schema, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical).hexdigest()
+
+
+def _differences(path, expected, actual):
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        for key in sorted(set(expected) | set(actual)):
+            key_path = u"{}.{}".format(path, key) if path else unicode(key)
+            if key not in actual:
+                yield u"{}: missing in the server".format(key_path)
+            elif key not in expected:
+                yield u"{}: missing in the rules".format(key_path)
+            else:
+                for difference in _differences(key_path, expected[key],
+                                               actual[key]):
+                    yield difference
+    elif (isinstance(expected, list) and isinstance(actual, list) and
+            len(expected) == len(actual)):
+        for index, (expected_item, actual_item) in enumerate(
+                zip(expected, actual)):
+            for difference in _differences(
+                    u"{}[{}]".format(path, index), expected_item,
+                    actual_item):
+                yield difference
+    elif expected != actual:
+        yield u"{}: {} in the rules, {} in the server".format(
+            path or u"schema", json.dumps(expected, sort_keys=True),
+            json.dumps(actual, sort_keys=True))
+
+
+def schema_diff(expected, actual, limit=MAX_DIFFERENCES):
+    """
+    Lines with the paths where the schema of the rules and the schema of
+    the server differ
+    """
+    lines = []
+    for difference in _differences(u"", expected, actual):
+        if len(lines) == limit:
+            lines.append(u"... and more differences")
+            break
+        lines.append(difference)
+    return lines
+
+
+class MetadataCache(object):
+    """
+    Types of the graphs and their ids, as the server returned them, so the
+    next loads into the same graph don't need to ask for them again.
+    The metadata of a graph is kept in a JSON file with the fingerprint of
+    the schema verified against the server. It is only used for the same
+    schema of the server, and until it expires.
+    """
+
+    def __init__(self, directory, ttl=METADATA_TTL):
+        self._directory = directory
+        self._ttl = ttl
+
+    def _path(self, graph):
+        return os.path.join(self._directory, "{}.json".format(graph))
+
+    def get(self, graph, schema_id):
+        """
+        The fingerprint of the schema and the metadata of the graph, or None
+        if they are not cached, they are for another schema or they expired
+        """
+        if not self._ttl:
+            return None
+        try:
+            with open(self._path(graph), 'r') as metadata_file:
+                entry = json.load(metadata_file)
+        except (IOError, ValueError):
+            return None
+        if (entry.get('schema_id') != schema_id or
+                time.time() - entry.get('time', 0) > self._ttl):
+            return None
+        return entry.get('schema_fingerprint'), entry['metadata']
+
+    def set(self, graph, schema_id, fingerprint, metadata):
+        if not self._ttl:
+            return
+        if not os.path.exists(self._directory):
+            os.makedirs(self._directory)
+        entry = {'schema_id': schema_id, 'schema_fingerprint': fingerprint,
+                 'time': time.time(), 'metadata': metadata}
+        # The file is replaced at once, so it's never read half written
+        path = self._path(graph)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as metadata_file:
+            json.dump(entry, metadata_file)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(temp_path, path)
+
+    def invalidate(self, graph):
+        if os.path.exists(self._path(graph)):
+            os.remove(self._path(graph))
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+try:
+    import ujson as json
+except ImportError:
+    import json  # NOQA
+import os
+import threading
+import time
+
+# Upper bounds, in seconds, of the buckets of the latency histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0)
+PROMETHEUS_PREFIX = 'sylva'
+
+
+class Histogram(object):
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            index += 1
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """
+        Pairs of upper bound and number of values under it, as Prometheus
+        expects them
+        """
+        total = 0
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        pairs = []
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class Metrics(object):
+    """
+    Measures of a load: the duration and the rows of every phase, the time
+    spent by every casting function, the latency of every method of the API
+    and the size of the batches sent.
+    The phases and the batches are written as JSON lines while the load
+    runs, and all the measures are written in the Prometheus text format at
+    the end of every phase.
+    """
+
+    def __init__(self, json_path=None, prometheus_path=None):
+        self._json_file = None
+        if json_path:
+            self._json_file = open(json_path, 'a')
+        self._prometheus_path = prometheus_path
+        self._lock = threading.Lock()
+        self._phase = None
+        self._phase_start = None
+        self.phases = []
+        self.phase_rows = {}
+        # Casting function name to seconds and values casted
+        self.cast_timings = {}
+        self.requests = {}
+        self.request_errors = {}
+        # Kind of batch to number of batches, items and bytes
+        self.batches = {}
+
+    def _write_json(self, entry):
+        if self._json_file is None:
+            return
+        entry['time'] = time.time()
+        self._json_file.write(json.dumps(entry) + "\n")
+        self._json_file.flush()
+
+    def start_phase(self, phase):
+        """
+        Finish the current phase, if any, and start a new one
+        """
+        self.end_phase()
+        self._phase = phase
+        self._phase_start = time.time()
+
+    def end_phase(self):
+        if self._phase is None:
+            return
+        duration = time.time() - self._phase_start
+        rows = self.phase_rows.get(self._phase, 0)
+        entry = {'event': 'phase', 'phase': self._phase,
+                 'seconds': duration, 'rows': rows,
+                 'rows_per_second': rows / duration if duration else 0.0}
+        self.phases.append(entry)
+        self._phase = None
+        with self._lock:
+            self._write_json(dict(entry))
+        self.write_prometheus()
+
+    def add_rows(self, rows, phase=None):
+        """
+        Count the rows treated in the phase, the current one by default
+        """
+        with self._lock:
+            phase = phase or self._phase
+            self.phase_rows[phase] = self.phase_rows.get(phase, 0) + rows
+
+    def add_cast_timings(self, cast_timings):
+        """
+        Add the timings of the casting functions measured by other processes
+        """
+        with self._lock:
+            for name, (seconds, values) in cast_timings.iteritems():
+                timing = self.cast_timings.setdefault(name, [0.0, 0])
+                timing[0] += seconds
+                timing[1] += values
+
+    def observe_request(self, method, seconds, failed=False):
+        with self._lock:
+            if method not in self.requests:
+                self.requests[method] = Histogram()
+            self.requests[method].observe(seconds)
+            if failed:
+                self.request_errors[method] = (
+                    self.request_errors.get(method, 0) + 1)
+
+    def observe_batch(self, kind, items, size_bytes):
+        with self._lock:
+            batches = self.batches.setdefault(kind, [0, 0, 0])
+            batches[0] += 1
+            batches[1] += items
+            batches[2] += size_bytes
+            self._write_json({'event': 'batch', 'kind': kind,
+                              'items': items, 'bytes': size_bytes})
+
+    def instrument(self, api):
+        return InstrumentedAPI(api, self)
+
+    def _prometheus_lines(self):
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            name = "{}_{}".format(PROMETHEUS_PREFIX, name)
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} {}".format(name, kind))
+            for suffix, labels, value in samples:
+                labels = ",".join('{}="{}"'.format(label, label_value)
+                                  for label, label_value in labels)
+                lines.append("{}{}{{{}}} {}".format(name, suffix, labels,
+                                                    value))
+
+        metric('phase_seconds', 'gauge', 'Duration of the phases',
+               [('', [('phase', entry['phase'])], entry['seconds'])
+                for entry in self.phases])
+        metric('phase_rows', 'gauge', 'Rows treated in the phases',
+               [('', [('phase', entry['phase'])], entry['rows'])
+                for entry in self.phases])
+        metric('cast_seconds_total', 'counter',
+               'Time spent by the casting functions',
+               [('', [('function', name)], seconds)
+                for name, (seconds, values) in self.cast_timings.items()])
+        metric('cast_values_total', 'counter',
+               'Values casted by the casting functions',
+               [('', [('function', name)], values)
+                for name, (seconds, values) in self.cast_timings.items()])
+        samples = []
+        for method, histogram in sorted(self.requests.items()):
+            for bound, count in histogram.cumulative():
+                samples.append(('_bucket', [('method', method),
+                                            ('le', bound)], count))
+            samples.append(('_sum', [('method', method)], histogram.sum))
+            samples.append(('_count', [('method', method)], histogram.count))
+        metric('request_seconds', 'histogram',
+               'Latency of the requests to the API', samples)
+        metric('request_errors_total', 'counter',
+               'Requests to the API that failed',
+               [('', [('method', method)], errors)
+                for method, errors in self.request_errors.items()])
+        metric('batches_total', 'counter', 'Batches sent',
+               [('', [('kind', kind)], batches[0])
+                for kind, batches in self.batches.items()])
+        metric('batch_items_total', 'counter', 'Items sent in batches',
+               [('', [('kind', kind)], batches[1])
+                for kind, batches in self.batches.items()])
+        metric('batch_bytes_total', 'counter',
+               'Approximate bytes sent in batches',
+               [('', [('kind', kind)], batches[2])
+                for kind, batches in self.batches.items()])
+        return lines
+
+    def write_prometheus(self):
+        """
+        Write the textfile for Prometheus. It's replaced at once, so it's
+        never read half written.
+        """
+        if not self._prometheus_path:
+            return
+        with self._lock:
+            lines = self._prometheus_lines()
+        temp_path = self._prometheus_path + '.tmp'
+        with open(temp_path, 'w') as prometheus_file:
+            prometheus_file.write("\n".join(lines) + "\n")
+        if os.path.exists(self._prometheus_path):
+            os.remove(self._prometheus_path)
+        os.rename(temp_path, self._prometheus_path)
+
+    def close(self):
+        self.end_phase()
+        with self._lock:
+            self._write_json({
+                'event': 'summary',
+                'cast_timings': self.cast_timings,
+                'requests': dict(
+                    (method, {'count': histogram.count,
+                              'seconds': histogram.sum,
+                              'buckets': histogram.cumulative()})
+                    for method, histogram in self.requests.items()),
+                'request_errors': self.request_errors,
+                'batches': dict(
+                    (kind, {'batches': batches[0], 'items': batches[1],
+                            'bytes': batches[2]})
+                    for kind, batches in self.batches.items())})
+            if self._json_file is not None:
+                self._json_file.close()
+                self._json_file = None
+
+
+class InstrumentedAPI(object):
+    """
+    Proxy of the API client that measures the latency of every method
+    """
+
+    def __init__(self, api, metrics):
+        self._api = api
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        attribute = getattr(self._api, name)
+        if not callable(attribute):
+            return attribute
+
+        def timed_method(*args, **kwargs):
+            start = time.time()
+            try:
+                result = attribute(*args, **kwargs)
+            except:
+                self._metrics.observe_request(name, time.time() - start,
+                                              True)
+                raise
+            self._metrics.observe_request(name, time.time() - start)
+            return result
+        return timed_method
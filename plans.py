@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+from cStringIO import StringIO
+from operator import itemgetter
+from delta import DeltaStore
+import castings
+import os
+import time
+import unicodecsv
+
+
+def _default_cast(*values):
+    """
+    Casting used when the function is not defined in castings
+    """
+    return u",".join(map(repr, values))
+
+
+def _no_values(row):
+    return ()
+
+
+# Column casting functions. They cast a whole column of CSV text cells at
+# once and, if any cell fails, they fall back to the casting function of
+# every cell, so the cells that can't be casted keep their value.
+def number_column(values):
+    try:
+        return map(int, values)
+    except ValueError:
+        return map(castings.number, values)
+
+
+def float_column(values):
+    try:
+        return map(float, values)
+    except ValueError:
+        return map(castings.float_func, values)
+
+
+def boolean_column(values):
+    return [value == u'True' for value in values]
+
+
+def text_column(values):
+    # The cells are already unicode, so casting them to string changes nothing
+    return list(values)
+
+
+COLUMN_CASTINGS = {
+    castings.number: number_column,
+    castings.float_func: float_column,
+    castings.boolean: boolean_column,
+    castings.string: text_column,
+    castings.default: text_column,
+}
+
+
+class CastingPlan(object):
+    """
+    Casting functions of a type compiled once into the callables and the
+    column indexes to apply to every row of the CSV file. With a dict of
+    timings, the seconds spent and the values casted by every casting
+    function are added to it.
+    """
+
+    def __init__(self, casting_functions, columns_indexes, timings=None):
+        self.headers = []
+        self._steps = []
+        self._names = []
+        self._timings = timings
+        for csv_header, func, params in casting_functions:
+            # It raises KeyError if a param is not a column of the CSV file
+            indexes = [columns_indexes[param] for param in params]
+            cast_func = getattr(castings, func, _default_cast)
+            if len(indexes) == 1:
+                step = (cast_func, itemgetter(indexes[0]), False)
+            elif indexes:
+                step = (cast_func, itemgetter(*indexes), True)
+            else:
+                step = (cast_func, _no_values, True)
+            self.headers.append(csv_header)
+            self._steps.append(step)
+            self._names.append(func)
+
+    def cast_rows(self, rows):
+        """
+        Return the casted values of the nodes for a batch of rows. The
+        properties with a column casting function are casted column by
+        column.
+        """
+        columns = []
+        for name, (cast_func, getter, many) in zip(self._names, self._steps):
+            start = time.time()
+            if many:
+                columns.append([cast_func(*getter(row)) for row in rows])
+            else:
+                column_func = COLUMN_CASTINGS.get(cast_func)
+                if column_func is not None:
+                    columns.append(column_func(map(getter, rows)))
+                else:
+                    columns.append(map(cast_func, map(getter, rows)))
+            if self._timings is not None:
+                timing = self._timings.setdefault(name, [0.0, 0])
+                timing[0] += time.time() - start
+                timing[1] += len(rows)
+        if not columns:
+            return [() for row in rows]
+        return zip(*columns)
+
+    def __call__(self, row):
+        """
+        Return the casted values of the node for the row
+        """
+        return [cast_func(*getter(row)) if many else cast_func(getter(row))
+                for cast_func, getter, many in self._steps]
+
+
+def file_ranges(file_path, chunk_size):
+    """
+    Split the data of the CSV file, headers excluded, into byte ranges of
+    whole lines of about chunk_size bytes
+    """
+    file_size = os.path.getsize(file_path)
+    ranges = []
+    with open(file_path, 'rb') as csv_file:
+        csv_file.readline()
+        start = csv_file.tell()
+        while start < file_size:
+            csv_file.seek(start + chunk_size)
+            csv_file.readline()
+            end = min(csv_file.tell(), file_size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def cast_chunk(task):
+    """
+    Cast the nodes of the rows in a byte range of the CSV file. It is run by
+    the processes of the pool, so it compiles the plans by itself. It returns
+    the number of correct rows, the casted nodes of every type, if an empty
+    row ended the data inside the range, in delta mode, the fingerprints of
+    the rows and the timings of the casting functions. The rows loaded
+    before in delta mode are left out.
+    The ranges start outside of the quoted values, so a range with an odd
+    number of quotes ends inside a value with line breaks. Then it returns
+    None, because the next ranges are not whole rows.
+    """
+    (file_path, start, end, columns_number, types_casting, columns_indexes,
+     validation_sampling, delta_path) = task
+    castings.VALIDATION_SAMPLING = validation_sampling
+    with open(file_path, 'rb') as csv_file:
+        csv_file.seek(start)
+        data = csv_file.read(end - start)
+    if data.count('"') % 2:
+        return None
+    csv_reader = unicodecsv.reader(StringIO(data), encoding="utf-8")
+    rows = []
+    ended = False
+    for csv_row in csv_reader:
+        if not csv_row:
+            ended = True
+            break
+        if len(csv_row) == columns_number:
+            rows.append(csv_row)
+    fingerprints = None
+    if delta_path is not None:
+        delta_store = DeltaStore(delta_path)
+        rows, fingerprints = delta_store.new_rows(rows)
+        delta_store.close()
+    timings = {}
+    types_nodes = [
+        CastingPlan(casting_functions, columns_indexes,
+                    timings).cast_rows(rows)
+        for casting_functions in types_casting]
+    return len(rows), types_nodes, ended, fingerprints, timings
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import cProfile
+import os
+import pstats
+import sys
+
+# Folder of the history with the profiles of the phases
+PROFILE_DIRNAME = 'profile'
+# Number of functions shown in the summary
+TOP_FUNCTIONS = 25
+SORT_KEY = 'tottime'
+
+
+class PhaseProfiler(object):
+    """
+    Profile of every phase of a load with cProfile. The statistics of each
+    phase are written to its own file, to open them with pstats or any
+    viewer, and the functions where most time is spent are printed at the
+    end. Only the main thread is profiled, not the workers nor the jobs.
+    """
+
+    def __init__(self, directory, top=TOP_FUNCTIONS):
+        self._directory = directory
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self._top = int(top)
+        self._profile = None
+        self._phase = None
+        self.paths = []
+
+    def start_phase(self, phase):
+        """
+        Finish the profile of the current phase, if any, and start a new one
+        """
+        self.end_phase()
+        self._phase = phase
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def end_phase(self):
+        if self._profile is None:
+            return
+        self._profile.disable()
+        path = os.path.join(self._directory, "{}.prof".format(self._phase))
+        self._profile.dump_stats(path)
+        if path not in self.paths:
+            self.paths.append(path)
+        self._profile = None
+        self._phase = None
+
+    def close(self, stream=None):
+        """
+        Finish the profile and print the summary of all the phases
+        """
+        self.end_phase()
+        paths = [path for path in self.paths if os.path.getsize(path)]
+        if not paths or not self._top:
+            return
+        stream = stream or sys.stdout
+        stream.write("Profiles of the phases written to {}\n".format(
+            self._directory))
+        stats = pstats.Stats(*paths, stream=stream)
+        # The files are listed above, not once per phase
+        stats.files = []
+        stats.strip_dirs().sort_stats(SORT_KEY).print_stats(self._top)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import random
+import time
+
+# Number of times a request is repeated after a transient error
+RETRIES = 4
+# Seconds to wait before the first retry. It doubles with every retry.
+BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+
+
+def is_transient(error):
+    """
+    Errors of the client (4xx) are caused by the data, so repeating the
+    request won't help, except for timeouts and too many requests
+    """
+    response = getattr(error, 'response', None)
+    status_code = getattr(response, 'status_code', None)
+    if status_code is None:
+        return True
+    return not 400 <= status_code < 500 or status_code in (408, 429)
+
+
+def call_with_retries(func, args, retries=RETRIES, backoff=BACKOFF):
+    """
+    Call func and, if it fails with a transient error, call it again after
+    waiting an exponential and randomized time
+    """
+    attempt = 0
+    while True:
+        try:
+            return func(*args)
+        except Exception as error:
+            if attempt >= retries or not is_transient(error):
+                raise
+            delay = min(MAX_BACKOFF, backoff * 2 ** attempt)
+            delay *= random.uniform(0.5, 1)
+            print("The request failed ({}), retrying in {:.1f} "
+                  "seconds...".format(error, delay))
+            time.sleep(delay)
+            attempt += 1
+
+
+def post_bisecting(post, params, retries=RETRIES, backoff=BACKOFF):
+    """
+    Send the list of params with post. If the request keeps failing, the
+    list is split in halves until the params that fail are found.
+    It returns the start, the end and the result of every part sent, and
+    the index and the error of every param rejected.
+    Only the errors caused by the data are split. When the server keeps
+    failing with transient errors, the error is raised, so the load stops
+    and it can be resumed later.
+    """
+    try:
+        result = call_with_retries(post, (params,), retries, backoff)
+        return [(0, len(params), result)], []
+    except Exception as error:
+        if is_transient(error):
+            raise
+        if len(params) <= 1:
+            return [], [(0, error)]
+    half = len(params) // 2
+    sent, rejected = post_bisecting(post, params[:half], retries, backoff)
+    sent_end, rejected_end = post_bisecting(post, params[half:], retries,
+                                            backoff)
+    sent.extend((start + half, end + half, result)
+                for start, end, result in sent_end)
+    rejected.extend((index + half, error) for index, error in rejected_end)
+    return sent, rejected
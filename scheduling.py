@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import sys
+import threading
+
+
+class OverlapStopped(Exception):
+    pass
+
+
+class Watermarks(object):
+    """
+    Progress of the upload of the nodes of every type. The local ids of a
+    type are given in the order of the rows and the nodes are dumped in the
+    same order, so once a batch is dumped every node up to its last local
+    id has its remote id, or was rejected. The relationships of a row can be
+    sent as soon as the local ids of their nodes are under the watermarks.
+    """
+
+    def __init__(self, types):
+        self._condition = threading.Condition()
+        self._resolved = dict((type, 0) for type in types)
+        self._version = 0
+        self._stopped = False
+
+    def resolve(self, type, local_id=None):
+        """
+        Record that the nodes of the type up to the local id, or all of them
+        without local id, are resolved
+        """
+        with self._condition:
+            if local_id is None:
+                self._resolved[type] = sys.maxint
+            else:
+                self._resolved[type] = max(self._resolved[type],
+                                           int(local_id))
+            self._version += 1
+            self._condition.notify_all()
+
+    def is_resolved(self, type, local_id):
+        return int(local_id) <= self._resolved[type]
+
+    def version(self):
+        return self._version
+
+    def wait(self, version):
+        """
+        Wait until some watermark moves after the version
+        """
+        with self._condition:
+            while self._version == version and not self._stopped:
+                self._condition.wait()
+            if self._stopped:
+                raise OverlapStopped()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
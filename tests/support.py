@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Loads of the app against the in-process mock of SylvaDB, shared by the
+tests. The rules are generated once, because cli loads them when it is
+imported.
+"""
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from contextlib import contextmanager
+
+from benchmarks import mock_sylvadb
+from benchmarks.bench_pipeline import import_cli
+from benchmarks.generate_csv import generate
+
+# Type0 is created for every row and the other types are got or created.
+# relates0 is created and relates1 is got or created.
+TYPES = 3
+RULES_DIRECTORY = tempfile.mkdtemp(prefix="aggcloud_rules_")
+SCHEMA = generate(os.path.join(RULES_DIRECTORY, "rules.csv"),
+                  os.path.join(RULES_DIRECTORY, "rules.py"), 1, TYPES, 0,
+                  False)
+mock_sylvadb.configure(SCHEMA)
+cli = import_cli(os.path.join(RULES_DIRECTORY, "rules.py"))
+atexit.register(shutil.rmtree, RULES_DIRECTORY, True)
+
+
+@contextmanager
+def quiet():
+    """
+    Hide the messages printed for the user
+    """
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        yield
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+@contextmanager
+def renamed_types(names):
+    """
+    Use the rules and the schema of the server with other names for the
+    types, given by their current names
+    """
+    def rename(value):
+        if isinstance(value, dict):
+            return dict((rename(key), rename(item))
+                        for key, item in value.iteritems())
+        if isinstance(value, (list, tuple)):
+            return type(value)(rename(item) for item in value)
+        return names.get(value, value)
+
+    rules = cli.rules.NODES, cli.rules.RELATIONSHIPS, cli.rules.SCHEMA
+    cli.rules.NODES = rename(cli.rules.NODES)
+    cli.rules.RELATIONSHIPS = rename(cli.rules.RELATIONSHIPS)
+    cli.rules.SCHEMA = json.dumps(rename(json.loads(cli.rules.SCHEMA)))
+    mock_sylvadb.configure(rename(SCHEMA))
+    try:
+        yield
+    finally:
+        cli.rules.NODES, cli.rules.RELATIONSHIPS, cli.rules.SCHEMA = rules
+        mock_sylvadb.configure(SCHEMA)
+
+
+class HTTPError(Exception):
+    """
+    Error with the status code of the response, as the client raises them
+    """
+
+    def __init__(self, status_code):
+        super(HTTPError, self).__init__("HTTP {}".format(status_code))
+        self.response = type('Response', (object,),
+                             {'status_code': status_code})()
+
+
+class Interrupted(Exception):
+    """
+    The load is stopped by the server, like a lost connection
+    """
+
+
+class LoadTestCase(unittest.TestCase):
+    """
+    Every test has a folder for its CSV files and histories, and a single
+    server for all its loads
+    """
+    api_class = mock_sylvadb.API
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="aggcloud_test_")
+        self._history_path = cli.HISTORY_PATH
+        self._api = cli.API
+        cli.HISTORY_PATH = os.path.join(self.directory, "history")
+        self.server = self.api_class()
+        cli.API = lambda token=None, graph_slug=None: self.server
+
+    def tearDown(self):
+        cli.HISTORY_PATH = self._history_path
+        cli.API = self._api
+        shutil.rmtree(self.directory)
+
+    def write_csv(self, name, rows, dedup_ratio=0.5, seed=0):
+        """
+        Generate a CSV file for the rules of the tests and return its path
+        """
+        csv_path = os.path.join(self.directory, name)
+        generate(csv_path, os.path.join(self.directory, "rules.py"), rows,
+                 TYPES, dedup_ratio, False, seed)
+        return csv_path
+
+    def load(self, csv_path, **app_args):
+        """
+        Load the CSV file without retrying nor waiting, and return the app
+        """
+        app_args.setdefault('retries_number', 0)
+        app_args.setdefault('backoff', 0)
+        with quiet():
+            app = cli.SylvaApp(csv_path, **app_args)
+            app.populate_data()
+        return app
+
+    def nodes(self, slug):
+        return [properties['name']
+                for node_id, properties in self.server._nodes.get(slug, [])]
+
+    def relationships(self, slug):
+        return self.server._relationships.get(slug, [])
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+
+from batching import MIN_BATCH_SIZE, Batcher, payload_size
+from tests.support import LoadTestCase, mock_sylvadb
+
+
+class BatcherTestCase(unittest.TestCase):
+
+    def converge(self, batcher, item_latency, requests=20):
+        """
+        Send batches of the current size that take item_latency seconds per
+        item, and return the sizes
+        """
+        sizes = []
+        for request in xrange(requests):
+            size = batcher.size()
+            batcher.observe(size, size * item_latency)
+            sizes.append(batcher.size())
+        return sizes
+
+    def test_fixed(self):
+        batcher = Batcher(100)
+        self.assertTrue(batcher.is_full(100, 10 ** 9))
+        self.assertFalse(batcher.is_full(99, 10 ** 9))
+        self.assertEqual(self.converge(batcher, 0.001), [100] * 20)
+        # Without a target, a limit only caps the size given
+        self.assertEqual(Batcher(10000).size(), 10000)
+        self.assertEqual(Batcher(10000, 5000).size(), 5000)
+        self.assertEqual(Batcher(100, 5000).size(), 100)
+
+    def test_grow(self):
+        batcher = Batcher(10, target_latency=1.0)
+        sizes = self.converge(batcher, 0.01)
+        # The size doubles at most after each request
+        self.assertEqual(sizes[:3], [20, 40, 80])
+        self.assertEqual(sizes[-1], 100)
+
+    def test_target_bytes(self):
+        batcher = Batcher(10, target_latency=1.0, target_bytes=2000)
+        batcher.record_payload(10, 1000)
+        self.assertEqual(self.converge(batcher, 0.001)[-1], 20)
+        self.assertTrue(batcher.is_full(5, 2000))
+        self.assertFalse(batcher.is_full(5, 1999))
+        # Without a target latency, the batches are only cut by their bytes
+        batcher = Batcher(100, target_bytes=2000)
+        self.assertTrue(batcher.is_full(5, 2000))
+        self.assertEqual(self.converge(batcher, 0.001), [100] * 20)
+
+    def test_shrink(self):
+        batcher = Batcher(100, target_latency=1.0)
+        sizes = self.converge(batcher, 0.05)
+        # The size is halved at most after a slow request
+        self.assertEqual(sizes[0], 50)
+        self.assertEqual(sizes[-1], 20)
+        batcher.observe(20, 1000.0)
+        self.assertEqual(batcher.size(), MIN_BATCH_SIZE)
+        batcher.observe(20, 1000.0)
+        self.assertEqual(batcher.size(), MIN_BATCH_SIZE)
+
+    def test_limit(self):
+        batcher = Batcher(10, 30, target_latency=1.0)
+        self.assertEqual(self.converge(batcher, 0.0001)[-1], 30)
+        batcher = Batcher(10, target_latency=1.0)
+        self.assertEqual(self.converge(batcher, 0.0)[-1], 5000)
+
+    def test_timed(self):
+        batcher = Batcher(10, target_latency=1000.0)
+        timed = batcher.timed(lambda mode, items: len(items), 1)
+        self.assertEqual(timed('create', range(10)), 10)
+        self.assertEqual(batcher.size(), 20)
+
+    def test_payload_size(self):
+        columns = [u"name", u"value"]
+        row = [u"Barcelona", u"1.5"]
+        size = payload_size(columns, row)
+        self.assertEqual(size, 2 + (4 + 9 + 6) + (5 + 3 + 6))
+        self.assertTrue(abs(size - len(json.dumps(dict(zip(columns, row)))))
+                        <= 2 * len(columns))
+
+
+class BatchesAPI(mock_sylvadb.API):
+    """
+    Server that records the sizes of the batches
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(BatchesAPI, self).__init__(*args, **kwargs)
+        self.batches = {'nodes': [], 'relationships': []}
+
+    def post_nodes(self, slug, params):
+        self.batches['nodes'].append(len(params))
+        return super(BatchesAPI, self).post_nodes(slug, params)
+
+    def post_relationships(self, slug, params):
+        self.batches['relationships'].append(len(params))
+        return super(BatchesAPI, self).post_relationships(slug, params)
+
+
+class BatchesLoadTestCase(LoadTestCase):
+    api_class = BatchesAPI
+
+    def test_limits(self):
+        # The fast server makes the batches grow up to their limits
+        csv_path = self.write_csv("rows.csv", 600)
+        self.load(csv_path, batch_size=10, target_latency=1.0,
+                  node_batch_limit=25, relationship_batch_limit=40)
+        self.assertEqual(self.server.batches['nodes'][0], 10)
+        self.assertEqual(max(self.server.batches['nodes']), 25)
+        self.assertEqual(max(self.server.batches['relationships']), 40)
+        self.assertEqual(len(self.relationships('relates0')), 600)
+
+    def test_fixed(self):
+        csv_path = self.write_csv("rows.csv", 600)
+        self.load(csv_path, batch_size=30, node_batch_limit=25)
+        self.assertEqual(max(self.server.batches['nodes']), 25)
+        self.assertEqual(max(self.server.batches['relationships']), 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
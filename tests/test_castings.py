@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import ast
+import random
+import unittest
+
+from castings import parse_coordinates
+
+
+class ParseCoordinatesTestCase(unittest.TestCase):
+    """
+    The coordinates are parsed as ast.literal_eval parsed them, keeping the
+    lists, the tuples, the integers and the floats
+    """
+
+    def assert_parsed(self, string_input):
+        try:
+            expected = repr(ast.literal_eval(string_input))
+        except Exception as error:
+            expected = type(error)
+        try:
+            parsed = repr(parse_coordinates(string_input))
+        except Exception as error:
+            parsed = type(error)
+        self.assertEqual(parsed, expected, string_input)
+
+    def test_numbers(self):
+        for string_input in [u"1", u"-1", u"1.5", u"-0.25", u"1e3",
+                             u"1.5E-3", u"12345678901234567890", u"-0",
+                             u"-0.0", u"01", u"1.", u".5", u"1, 2",
+                             u"1.0, -2"]:
+            self.assert_parsed(string_input)
+
+    def test_nested(self):
+        for string_input in [u"[1, 2]", u"[1.5, -2]", u"[[1, 2], [3, 4.5]]",
+                             u"[[[1, 2], [3, 4]], [[5, 6], [7, 8]]]",
+                             u"(1, 2)", u"(1.5, -2.5)", u"[(1, 2), (3, 4)]",
+                             u"((1, 2), (3, 4))", u"[(1, 2), [3, 4]]",
+                             u"(1, 2), (3, 4)", u"[[(1, 2), (3, 4)]]",
+                             u"([1, 2], [3, 4])", u"[1, (2, 3)]", u"[]",
+                             u"[[]]", u"()", u"(1,)", u"[1, [2, [3]]]"]:
+            self.assert_parsed(string_input)
+
+    def test_whitespace(self):
+        for string_input in [u"[ 1 , 2 ]", u"[1,2]", u"[\t1,\n2]",
+                             u"( 1 , 2 )", u"(1,2)", u"[(1,2),( 3 ,4 )]",
+                             u"[1, 2] ", u"(1, 2)\n", u" [1, 2]",
+                             u" (1, 2)", u"\t1"]:
+            self.assert_parsed(string_input)
+
+    def test_trailing_commas(self):
+        for string_input in [u"[1, 2,]", u"[[1, 2], [3, 4],]", u"(1, 2,)",
+                             u"[(1, 2), (3, 4),]", u"1, 2,", u"1,",
+                             u"[1, 2],", u"(1, 2),"]:
+            self.assert_parsed(string_input)
+
+    def test_invalid(self):
+        for string_input in [u"", u" ", u"[", u"]", u"[1, 2", u"(1, 2",
+                             u"1 2", u"[1 2]", u"e", u"1e", u"--1", u"+1",
+                             u"[,]", u"(,)", u",", u"[1,, 2]", u"1.2.3",
+                             u"abc", u"[1, a]", u"(1, 2) (3, 4)",
+                             u"[1, 2]]", u"{1: 2}", u"None", u"True"]:
+            self.assert_parsed(string_input)
+
+    def test_random(self):
+        # Strings made of the characters of the coordinates, valid or not
+        string_random = random.Random(0)
+        characters = u"0123456789.-+eE[](), \t"
+        for index in xrange(20000):
+            length = string_random.randint(1, 12)
+            string_input = u"".join(string_random.choice(characters)
+                                    for position in xrange(length))
+            self.assert_parsed(string_input)
+        for index in xrange(5000):
+            pairs = [u"{}{}{}, {}{}".format(
+                string_random.choice([u"(", u"[", u""]),
+                string_random.choice([u"1", u"-2.5", u"3e2", u"04"]),
+                string_random.choice([u"", u" "]),
+                string_random.choice([u"1", u"-2.5", u"0.1"]),
+                string_random.choice([u")", u"]", u""]))
+                for pair in xrange(string_random.randint(1, 4))]
+            string_input = u", ".join(pairs)
+            if string_random.random() < 0.5:
+                string_input = u"[{}]".format(string_input)
+            self.assert_parsed(string_input)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import csv
+import unittest
+
+from tests.support import LoadTestCase, mock_sylvadb
+
+
+class CountingAPI(mock_sylvadb.API):
+    """
+    Server that counts the nodes and relationships sent to it
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(CountingAPI, self).__init__(*args, **kwargs)
+        self.posted = 0
+
+    def post_nodes(self, slug, params):
+        self.posted += len(params)
+        return super(CountingAPI, self).post_nodes(slug, params)
+
+    def post_relationships(self, slug, params):
+        self.posted += len(params)
+        return super(CountingAPI, self).post_relationships(slug, params)
+
+
+class DeltaTestCase(LoadTestCase):
+    api_class = CountingAPI
+
+    def setUp(self):
+        super(DeltaTestCase, self).setUp()
+        # The new file has the rows of the old one and 250 more, with new
+        # nodes and with nodes of the old rows
+        self.csv_path = self.write_csv("new.csv", 400)
+        with open(self.csv_path) as csv_file:
+            self.rows = list(csv.reader(csv_file))
+        self.old_csv_path = self.write_csv("old.csv", 1)
+        with open(self.old_csv_path, 'w') as csv_file:
+            csv.writer(csv_file).writerows(self.rows[:151])
+        self.headers = self.rows.pop(0)
+
+    def assert_loaded(self):
+        """
+        Every node and relationship of the new file is in the graph once
+        """
+        for index in xrange(3):
+            names = self.nodes('type{}'.format(index))
+            self.assertEqual(len(names), len(set(names)))
+            self.assertEqual(set(names),
+                             set(row[4 * index] for row in self.rows))
+        self.assertEqual(len(self.relationships('relates0')), 400)
+        relationships = self.relationships('relates1')
+        pairs = set((relationship['source_id'], relationship['target_id'])
+                    for relationship in relationships)
+        self.assertEqual(len(relationships), len(pairs))
+        self.assertEqual(len(pairs),
+                         len(set((row[4], row[8]) for row in self.rows)))
+
+    def assert_delta(self, **app_args):
+        self.load(self.old_csv_path, delta=True, batch_size=40, **app_args)
+        self.assertEqual(len(self.relationships('relates0')), 150)
+        posted = self.server.posted
+        self.load(self.csv_path, delta=True, batch_size=40, **app_args)
+        self.assert_loaded()
+        # The new rows are sent, without the nodes of the old rows
+        new_nodes = sum(
+            len(set(row[4 * index] for row in self.rows[150:]) -
+                set(row[4 * index] for row in self.rows[:150]))
+            for index in xrange(3))
+        new_pairs = len(
+            set((row[4], row[8]) for row in self.rows[150:]) -
+            set((row[4], row[8]) for row in self.rows[:150]))
+        self.assertEqual(self.server.posted - posted,
+                         new_nodes + 250 + new_pairs)
+        # Nothing is sent when the rows are loaded again in another order
+        again_csv_path = self.write_csv("again.csv", 1)
+        with open(again_csv_path, 'w') as csv_file:
+            csv_writer = csv.writer(csv_file)
+            csv_writer.writerow(self.headers)
+            csv_writer.writerows(reversed(self.rows))
+        posted = self.server.posted
+        self.load(again_csv_path, delta=True, batch_size=40, **app_args)
+        self.assertEqual(self.server.posted, posted)
+        self.assert_loaded()
+
+    def test_delta(self):
+        self.assert_delta()
+
+    def test_delta_overlap(self):
+        self.assert_delta(overlap=True, workers=3)
+
+    def test_delta_jobs(self):
+        self.assert_delta(jobs=2)
+
+    def test_delta_stream(self):
+        self.assert_delta(stream=True, checkpoint=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
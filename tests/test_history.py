@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from tests.support import Interrupted, LoadTestCase, cli
+from tests.test_journal import InterruptedAPI
+
+
+def sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class FilesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="aggcloud_test_")
+        self._history_path = cli.HISTORY_PATH
+        self._ioctl = cli.ioctl
+        cli.HISTORY_PATH = os.path.join(self.directory, "history")
+        self.path = os.path.join(self.directory, "rows.csv")
+        with open(self.path, "wb") as f:
+            f.write("".join(chr(index % 256) for index in xrange(1000)))
+        # The methods don't need a load
+        self.app = cli.SylvaApp.__new__(cli.SylvaApp)
+
+    def tearDown(self):
+        cli.HISTORY_PATH = self._history_path
+        cli.ioctl = self._ioctl
+        shutil.rmtree(self.directory)
+
+    def test_copy_and_hash(self):
+        os.utime(self.path, (1000000000, 1000000000))
+        file_hash, copy_path = self.app._copy_and_hash(self.path, 7)
+        self.assertEqual(file_hash, sha256(self.path))
+        self.assertEqual(os.path.dirname(copy_path), cli.HISTORY_PATH)
+        self.assertEqual(file_hash, sha256(copy_path))
+        self.assertEqual(os.stat(copy_path).st_mtime, 1000000000)
+
+    def test_history_copies(self):
+        self.assertEqual(self.app._history_copies(self.path), [])
+        for history in ("same", "size", "time"):
+            os.makedirs(os.path.join(cli.HISTORY_PATH, history))
+            copy_path = os.path.join(cli.HISTORY_PATH, history, "rows.csv")
+            shutil.copy2(self.path, copy_path)
+        with open(os.path.join(cli.HISTORY_PATH, "size", "rows.csv"),
+                  "ab") as f:
+            f.write("\n")
+        os.utime(os.path.join(cli.HISTORY_PATH, "time", "rows.csv"),
+                 (1000000000, 1000000000))
+        os.makedirs(os.path.join(cli.HISTORY_PATH, "_metadata"))
+        self.assertEqual(self.app._history_copies(self.path), ["same"])
+
+    def test_sampled_hash(self):
+        os.utime(self.path, (1000000000, 1000000000))
+        sampled_hash = self.app._sampled_hash(self.path, 4)
+        self.assertEqual(self.app._sampled_hash(self.path, 4), sampled_hash)
+        self.assertNotEqual(self.app._sampled_hash(self.path), sampled_hash)
+
+        def changed_hash(offset):
+            with open(self.path, "r+b") as f:
+                f.seek(offset)
+                byte = f.read(1)
+                f.seek(offset)
+                f.write(chr(255 - ord(byte)))
+            os.utime(self.path, (1000000000, 1000000000))
+            return self.app._sampled_hash(self.path, 4)
+
+        # Only the blocks sampled, every 66 bytes, change the hash
+        self.assertEqual(changed_hash(10), sampled_hash)
+        changed = changed_hash(67)
+        self.assertNotEqual(changed, sampled_hash)
+        os.utime(self.path, (1000000001, 1000000001))
+        self.assertNotEqual(self.app._sampled_hash(self.path, 4), changed)
+
+    def link(self):
+        link_path = os.path.join(self.directory, "link.csv")
+        self.app._link(self.path, link_path)
+        with open(link_path, "rb") as f:
+            return f.read()
+
+    def test_link_clone(self):
+        calls = []
+
+        def ioctl(fd, request, source_fd):
+            calls.append(request)
+
+        cli.ioctl = ioctl
+        self.assertEqual(self.link(), "")
+        self.assertEqual(calls, [cli.FICLONE])
+
+    def test_link_copy(self):
+        # The file is copied when the filesystem can't clone it
+        def ioctl(fd, request, source_fd):
+            raise IOError(95, "Operation not supported")
+
+        with open(self.path, "rb") as f:
+            contents = f.read()
+        cli.ioctl = ioctl
+        self.assertEqual(self.link(), contents)
+        cli.ioctl = None
+        self.assertEqual(self.link(), contents)
+
+
+class HistoryTestCase(LoadTestCase):
+    api_class = InterruptedAPI
+
+    def histories(self):
+        return [os.path.basename(path) for path in
+                glob.glob(os.path.join(cli.HISTORY_PATH, "[!_]*"))]
+
+    def is_completed(self, app):
+        return app._journal.is_complete(cli.STATUS.EXECUTION_COMPLETED)
+
+    def assert_history(self, copy_mode, fingerprint):
+        csv_path = self.write_csv("rows.csv", 60)
+        app = self.load(csv_path, batch_size=20, copy_mode=copy_mode,
+                        fingerprint=fingerprint)
+        self.assertTrue(self.is_completed(app))
+        history, = self.histories()
+        if fingerprint == cli.FULL:
+            self.assertEqual(history, sha256(csv_path))
+        copy_path = os.path.join(cli.HISTORY_PATH, history, "rows.csv")
+        if copy_mode == cli.REFERENCE:
+            self.assertEqual(app._file_path, csv_path)
+            self.assertFalse(os.path.exists(copy_path))
+        else:
+            self.assertEqual(app._file_path, copy_path)
+            self.assertEqual(sha256(copy_path), sha256(csv_path))
+        # The same file is found in its history, and nothing is sent again
+        nodes = self.server.count_nodes()
+        app = self.load(csv_path, batch_size=20, copy_mode=copy_mode,
+                        fingerprint=fingerprint)
+        self.assertTrue(self.is_completed(app))
+        self.assertEqual(self.server.count_nodes(), nodes)
+        # A touched file is hashed again by its full fingerprint, while the
+        # sampled one takes it for another file
+        os.utime(csv_path, (1000000000, 1000000000))
+        app = self.load(csv_path, batch_size=20, copy_mode=copy_mode,
+                        fingerprint=fingerprint)
+        self.assertTrue(self.is_completed(app))
+        if fingerprint == cli.FULL:
+            self.assertEqual(self.server.count_nodes(), nodes)
+            self.assertEqual(self.histories(), [history])
+        else:
+            self.assertEqual(len(self.histories()), 2)
+        self.assertEqual(glob.glob(os.path.join(cli.HISTORY_PATH,
+                                                "_copy_*")), [])
+
+    def test_modes(self):
+        for copy_mode in cli.COPY_MODES:
+            for fingerprint in cli.FINGERPRINTS:
+                shutil.rmtree(cli.HISTORY_PATH, True)
+                self.server = self.api_class()
+                self.assert_history(copy_mode, fingerprint)
+
+    def assert_reference_changed(self, fingerprint):
+        csv_path = self.write_csv("rows.csv", 200)
+        self.server.posts_left = 3
+        with self.assertRaises(Interrupted):
+            self.load(csv_path, batch_size=20, copy_mode=cli.REFERENCE,
+                      fingerprint=fingerprint)
+        self.server.posts_left = None
+        interrupted, = self.histories()
+        # The file changed, so its load starts again in a new history
+        self.write_csv("rows.csv", 200, seed=1)
+        app = self.load(csv_path, batch_size=20, copy_mode=cli.REFERENCE,
+                        fingerprint=fingerprint)
+        self.assertTrue(self.is_completed(app))
+        self.assertNotEqual(os.path.basename(app._history_path), interrupted)
+        self.assertEqual(len(self.histories()), 2)
+        # The interrupted load did not send relationships yet
+        self.assertEqual(len(self.relationships('relates0')), 200)
+
+    def test_reference_changed(self):
+        for fingerprint in cli.FINGERPRINTS:
+            shutil.rmtree(cli.HISTORY_PATH, True)
+            self.server = self.api_class()
+            self.assert_reference_changed(fingerprint)
+
+    def test_reference_resumed(self):
+        csv_path = self.write_csv("rows.csv", 200)
+        self.server.posts_left = 3
+        with self.assertRaises(Interrupted):
+            self.load(csv_path, batch_size=20, copy_mode=cli.REFERENCE)
+        self.server.posts_left = None
+        app = self.load(csv_path, batch_size=20, copy_mode=cli.REFERENCE)
+        self.assertTrue(self.is_completed(app))
+        self.assertEqual(len(self.histories()), 1)
+        self.assertEqual(len(self.relationships('relates0')), 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+from indexes import NodesIndex, PairsSet
+from tests.support import LoadTestCase, cli, mock_sylvadb
+
+
+class NodesIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="aggcloud_test_")
+        self.path = os.path.join(self.directory, "nodes.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def local_ids(self, memory_limit):
+        """
+        Add nodes with values of mixed types and return the local id of
+        every node found
+        """
+        nodes_index = NodesIndex(self.path, memory_limit)
+        nodes = [[1, u"a"], [1.0, u"a"], [True, u"a"], [u"1", u"a"],
+                 [1, u"b"], [10000000000000001, u"a"],
+                 [0.30000000000000004, u"a"], [0.3, u"a"]]
+        local_ids = []
+        for local_id, values in enumerate(nodes):
+            for type in ("type0", "type1"):
+                local_ids.append(nodes_index.get(type, values))
+                nodes_index.add(type, values, local_id)
+        for type in ("type0", "type1"):
+            for values in nodes:
+                local_ids.append(nodes_index.get(type, values))
+            local_ids.append(nodes_index.get(type, [False, u"a"]))
+            local_ids.append(nodes_index.get(type, (1, u"b")))
+        spilled = os.path.exists(self.path)
+        nodes_index.close()
+        self.assertFalse(os.path.exists(self.path))
+        return spilled, local_ids
+
+    def test_values(self):
+        # The same nodes are found in memory and on disk
+        spilled, local_ids = self.local_ids(None)
+        self.assertFalse(spilled)
+        self.assertEqual(local_ids, [None] * 16 + range(8) + [None, 4] +
+                         range(8) + [None, 4])
+        for memory_limit in (1, 3, 5):
+            self.assertEqual(self.local_ids(memory_limit),
+                             (True, local_ids))
+
+
+class PairsSetTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="aggcloud_test_")
+        self.path = os.path.join(self.directory, "pairs.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_add(self):
+        pairs_set = PairsSet(self.path, 3)
+        self.assertTrue(pairs_set.add("1", "2"))
+        self.assertFalse(pairs_set.add(1, 2))
+        self.assertTrue(pairs_set.add("2", "1"))
+        self.assertTrue(pairs_set.add("a", "1"))
+        # The pairs moved to disk are still known
+        self.assertTrue(os.path.exists(self.path))
+        self.assertFalse(pairs_set.add("1", "2"))
+        self.assertFalse(pairs_set.add("a", "1"))
+        self.assertIn((u"1", u"2"), pairs_set)
+        self.assertIn(("a", "1"), pairs_set)
+        self.assertNotIn(("2", "2"), pairs_set)
+        self.assertTrue(pairs_set.add("-1", str(1 << 64)))
+        self.assertFalse(pairs_set.add("-1", str(1 << 64)))
+        pairs_set.close()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_add_many(self):
+        pairs_set = PairsSet(self.path, 4)
+        self.assertEqual(
+            pairs_set.add_many([("1", "2"), ("1", "3"), ("1", "2")]),
+            [("1", "2"), ("1", "3")])
+        self.assertEqual(
+            pairs_set.add_many([("2", "2"), ("1", "3"), ("3", "3")]),
+            [("2", "2"), ("3", "3")])
+        self.assertTrue(os.path.exists(self.path))
+        # Pairs in memory and on disk, and ids that are not integers
+        self.assertEqual(
+            pairs_set.add_many([("x", "1"), ("3", "3"), ("4", "4"),
+                                ("1", "2"), ("x", "1")]),
+            [("x", "1"), ("4", "4")])
+        self.assertEqual(pairs_set.add_many([]), [])
+        pairs_set.close()
+        self.assertFalse(os.path.exists(self.path))
+
+
+class DedupTestCase(LoadTestCase):
+    api_class = mock_sylvadb.API
+
+    def setUp(self):
+        super(DedupTestCase, self).setUp()
+        # Every row is repeated once
+        self.csv_path = self.write_csv("rows.csv", 150)
+        with open(self.csv_path) as csv_file:
+            rows = list(csv.reader(csv_file))
+        with open(self.csv_path, 'w') as csv_file:
+            csv.writer(csv_file).writerows(rows + rows[1:])
+        self.rows = rows[1:] * 2
+
+    def pairs(self, source, target):
+        return len(set((row[4 * source], row[4 * target])
+                       for row in self.rows))
+
+    def assert_dedup(self, **app_args):
+        # The pairs are moved to disk every 10 pairs
+        app = self.load(self.csv_path, batch_size=40, index_limit=10,
+                        dedup_relationships=True, **app_args)
+        self.assertEqual(len(self.relationships('relates0')),
+                         self.pairs(0, 1))
+        self.assertEqual(len(self.relationships('relates1')),
+                         self.pairs(1, 2))
+        self.assertEqual(app._duplicated_relationships,
+                         2 * len(self.rows) - self.pairs(0, 1) -
+                         self.pairs(1, 2))
+
+    def test_dedup(self):
+        # The pairs of a chunk of rows are added at once
+        chunk_size = cli.RELATIONSHIPS_CHUNK_SIZE
+        cli.RELATIONSHIPS_CHUNK_SIZE = 25
+        try:
+            self.assert_dedup()
+        finally:
+            cli.RELATIONSHIPS_CHUNK_SIZE = chunk_size
+
+    def test_dedup_overlap(self):
+        self.assert_dedup(overlap=True, workers=3)
+
+    def test_dedup_stream(self):
+        self.assert_dedup(stream=True, checkpoint=False)
+
+    def test_no_dedup(self):
+        # Only the relationships got or created are dropped
+        self.load(self.csv_path, batch_size=40, index_limit=10)
+        self.assertEqual(len(self.relationships('relates0')),
+                         len(self.rows))
+        self.assertEqual(len(self.relationships('relates1')),
+                         self.pairs(1, 2))
+
+    def test_resume_other_dedup(self):
+        # The rows done of a load depend on the relationships dropped
+        self.load(self.csv_path, batch_size=40, dedup_relationships=True)
+        with self.assertRaises(ValueError):
+            self.load(self.csv_path, batch_size=40)
+        self.load(self.csv_path, batch_size=40, dedup_relationships=True)
+        self.assertEqual(len(self.relationships('relates0')),
+                         self.pairs(0, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
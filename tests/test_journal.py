@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+import csv
+import glob
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from journal import Journal
+from tests.support import Interrupted, LoadTestCase, cli, mock_sylvadb
+
+
+class JournalTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="aggcloud_test_")
+        self.path = os.path.join(self.directory, "checkpoint.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_resume(self):
+        journal = Journal(self.path)
+        self.assertFalse(journal.is_resuming())
+        journal.complete('FORMATTING')
+        journal.complete_batch('NODES', 'type0', 2, [[0, 10], [1, 11]])
+        journal.complete_batch('NODES', 'type0', 1, [[2, 12]])
+        journal.close()
+        journal = Journal(self.path)
+        self.assertTrue(journal.is_resuming())
+        self.assertTrue(journal.is_complete('FORMATTING'))
+        self.assertFalse(journal.is_complete('NODES', 'type0'))
+        self.assertEqual(journal.rows_done('NODES', 'type0'), 3)
+        self.assertEqual(journal.rows_done('NODES', 'type1'), 0)
+        journal.close()
+
+    def test_torn_last_line(self):
+        journal = Journal(self.path)
+        journal.complete_batch('NODES', 'type0', 2, [[0, 10], [1, 11]])
+        journal.close()
+        with open(self.path, 'a') as journal_file:
+            journal_file.write('{"phase": "NODES", "type": "ty')
+        # The half written line is dropped and the next entry is kept
+        journal = Journal(self.path)
+        self.assertEqual(journal.rows_done('NODES', 'type0'), 2)
+        journal.complete_batch('NODES', 'type0', 1, [[2, 12]])
+        journal.close()
+        journal = Journal(self.path)
+        self.assertEqual(journal.rows_done('NODES', 'type0'), 3)
+        self.assertEqual(list(journal.remote_ids('NODES', 'type0')),
+                         [(0, 10), (1, 11), (2, 12)])
+        journal.close()
+        with open(self.path) as journal_file:
+            for line in journal_file:
+                json.loads(line)
+
+    def test_remote_ids(self):
+        journal = Journal(self.path)
+        journal.complete_batch('NODES', 'type0', 1, [[0, 10]])
+        journal.complete_batch('NODES', 'type1', 1, [["0", "20"]])
+        journal.complete_batch('RELATIONSHIPS', 'relates0', 1)
+        journal.close()
+        journal = Journal(self.path)
+        self.assertEqual(list(journal.remote_ids('NODES', 'type0')),
+                         [(0, 10)])
+        # The batches recorded after reading the journal are included
+        journal.complete_batch('NODES', 'type1', 1, [[1, 21]])
+        self.assertEqual(list(journal.remote_ids('NODES', 'type1')),
+                         [(0, 20), (1, 21)])
+        self.assertEqual(list(journal.remote_ids('NODES', 'type2')), [])
+        journal.close()
+        # The ids are not in the journal
+        with open(self.path) as journal_file:
+            self.assertNotIn('20', journal_file.read())
+
+    def test_other_ids(self):
+        # The ids that are not integers are kept in the journal, as the
+        # previous versions did for every id
+        journal = Journal(self.path)
+        journal.complete_batch('NODES', 'type0', 3,
+                               [[0, 10], [1, "a-1"], [2, str(1 << 64)]])
+        journal.close()
+        with open(self.path, 'a') as journal_file:
+            journal_file.write(json.dumps({'phase': 'NODES', 'type': 'type0',
+                                           'rows': 1, 'ids': [[3, 13]]}))
+            journal_file.write("\n")
+        journal = Journal(self.path)
+        self.assertEqual(journal.rows_done('NODES', 'type0'), 4)
+        self.assertEqual(list(journal.remote_ids('NODES', 'type0')),
+                         [(0, 10), [1, "a-1"], [2, str(1 << 64)], [3, 13]])
+        journal.close()
+
+    def test_torn_ids(self):
+        # The ids written for a batch that was not recorded are ignored
+        journal = Journal(self.path)
+        journal.complete_batch('NODES', 'type0', 1, [[0, 10]])
+        journal.close()
+        with open(self.path + ".ids", 'ab') as ids_file:
+            ids_file.write("torn")
+        journal = Journal(self.path)
+        journal.complete_batch('NODES', 'type0', 1, [[1, 11]])
+        self.assertEqual(list(journal.remote_ids('NODES', 'type0')),
+                         [(0, 10), (1, 11)])
+        journal.close()
+        # A new journal starts a new file of ids
+        os.remove(self.path)
+        journal = Journal(self.path)
+        self.assertEqual(os.path.getsize(self.path + ".ids"), 0)
+        journal.close()
+
+    def test_in_memory(self):
+        journal = Journal()
+        journal.complete_batch('NODES', 'type0', 2, [[0, 10], [1, 11]])
+        self.assertEqual(journal.rows_done('NODES', 'type0'), 2)
+        self.assertEqual(list(journal.remote_ids('NODES', 'type0')), [])
+        journal.close()
+
+
+class InterruptedAPI(mock_sylvadb.API):
+    """
+    Server that stops the load after a number of requests sending nodes
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(InterruptedAPI, self).__init__(*args, **kwargs)
+        self.posts_left = None
+
+    def post_nodes(self, slug, params):
+        if self.posts_left is not None:
+            if self.posts_left == 0:
+                raise Interrupted()
+            self.posts_left -= 1
+        return super(InterruptedAPI, self).post_nodes(slug, params)
+
+
+class ResumeTestCase(LoadTestCase):
+    api_class = InterruptedAPI
+
+    def expected(self, csv_path):
+        """
+        Number of nodes and relationships of every type that a single load
+        creates. The repeated nodes are only created once.
+        """
+        with open(csv_path) as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        return {
+            'type0': len(set(row['t0_name'] for row in rows)),
+            'type1': len(set(row['t1_name'] for row in rows)),
+            'type2': len(set(row['t2_name'] for row in rows)),
+            'relates0': len(rows),
+            'relates1': len(set((row['t1_name'], row['t2_name'])
+                                for row in rows))}
+
+    def counts(self):
+        counts = dict((slug, len(self.nodes(slug)))
+                      for slug in ('type0', 'type1', 'type2'))
+        counts.update((slug, len(self.relationships(slug)))
+                      for slug in ('relates0', 'relates1'))
+        return counts
+
+    def interrupted_load(self, csv_path, posts, **app_args):
+        self.server.posts_left = posts
+        with self.assertRaises(Interrupted):
+            self.load(csv_path, **app_args)
+        self.server.posts_left = None
+
+    def test_resume(self):
+        csv_path = self.write_csv("resume.csv", 300)
+        self.interrupted_load(csv_path, 5, batch_size=20)
+        self.assertTrue(0 < self.server.count_nodes() < 450)
+        app = self.load(csv_path, batch_size=20)
+        self.assertTrue(app._journal.is_complete(
+            cli.STATUS.EXECUTION_COMPLETED))
+        self.assertEqual(self.counts(), self.expected(csv_path))
+
+    def test_resume_spilled(self):
+        # The ids are read back into maps moved to disk every 10 nodes
+        csv_path = self.write_csv("spilled.csv", 300)
+        self.interrupted_load(csv_path, 5, batch_size=20, index_limit=10)
+        app = self.load(csv_path, batch_size=20, index_limit=10)
+        self.assertTrue(app._journal.is_complete(
+            cli.STATUS.EXECUTION_COMPLETED))
+        self.assertEqual(self.counts(), self.expected(csv_path))
+
+    def test_resume_torn_journal(self):
+        csv_path = self.write_csv("torn.csv", 300)
+        # The journal is torn by every interruption
+        for posts in (5, 3):
+            self.interrupted_load(csv_path, posts, batch_size=20)
+            journal_path, = glob.glob(os.path.join(
+                cli.HISTORY_PATH, "*", cli.CHECKPOINT_FILENAME))
+            with open(journal_path, 'a') as journal_file:
+                journal_file.write('{"phase": ')
+        app = self.load(csv_path, batch_size=20)
+        self.assertTrue(app._journal.is_complete(
+            cli.STATUS.EXECUTION_COMPLETED))
+        self.assertEqual(self.counts(), self.expected(csv_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
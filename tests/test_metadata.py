@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from metadata import MetadataCache, schema_diff, schema_fingerprint
+from tests.support import LoadTestCase, cli, mock_sylvadb
+
+
+class SchemaTestCase(unittest.TestCase):
+
+    def test_fingerprint(self):
+        schema = {'nodeTypes': {'A': {'name': 'string', 'size': 'number'}},
+                  'allowedEdges': [{'label': 'r', 'source': 'A',
+                                    'target': 'A'}]}
+        reordered = json.loads(json.dumps(schema))
+        reordered['nodeTypes']['A'] = dict(
+            reversed(list(schema['nodeTypes']['A'].items())))
+        self.assertEqual(schema_fingerprint(schema),
+                         schema_fingerprint(reordered))
+        reordered['nodeTypes']['A']['size'] = 'float'
+        self.assertNotEqual(schema_fingerprint(schema),
+                            schema_fingerprint(reordered))
+
+    def test_diff(self):
+        expected = {'nodeTypes': {'A': {'name': 'string'},
+                                  'B': {'size': 'number'}},
+                    'allowedEdges': [{'label': 'r'}]}
+        actual = {'nodeTypes': {'A': {'name': 'float'},
+                                'C': {'size': 'number'}},
+                  'allowedEdges': [{'label': 's'}]}
+        self.assertEqual(schema_diff(expected, actual), [
+            u'allowedEdges[0].label: "r" in the rules, "s" in the server',
+            u'nodeTypes.A.name: "string" in the rules, "float" in the '
+            u'server',
+            u'nodeTypes.B: missing in the server',
+            u'nodeTypes.C: missing in the rules'])
+        self.assertEqual(schema_diff(expected, expected), [])
+        self.assertEqual(schema_diff(expected, actual, 2)[2:],
+                         [u"... and more differences"])
+
+
+class MetadataCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="aggcloud_test_")
+        self.cache_path = os.path.join(self.directory, "_metadata")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get(self):
+        cache = MetadataCache(self.cache_path, 60)
+        self.assertIsNone(cache.get('graph', 1))
+        cache.set('graph', 1, 'fingerprint', {'nodetypes': []})
+        self.assertEqual(cache.get('graph', 1),
+                         ('fingerprint', {'nodetypes': []}))
+        # Only for the same schema and graph
+        self.assertIsNone(cache.get('graph', 2))
+        self.assertIsNone(cache.get('other', 1))
+        with open(os.path.join(self.cache_path, "graph.json")) as cache_file:
+            entry = json.load(cache_file)
+        self.assertEqual(sorted(entry), ['metadata', 'schema_fingerprint',
+                                         'schema_id', 'time'])
+        self.assertEqual(os.listdir(self.cache_path), ["graph.json"])
+
+    def test_expire(self):
+        cache = MetadataCache(self.cache_path, 60)
+        cache.set('graph', 1, 'fingerprint', {})
+        path = os.path.join(self.cache_path, "graph.json")
+        with open(path) as cache_file:
+            entry = json.load(cache_file)
+        entry['time'] -= 61
+        with open(path, 'w') as cache_file:
+            json.dump(entry, cache_file)
+        self.assertIsNone(cache.get('graph', 1))
+        self.assertEqual(MetadataCache(self.cache_path, 120).get('graph', 1),
+                         ('fingerprint', {}))
+
+    def test_invalidate(self):
+        cache = MetadataCache(self.cache_path, 60)
+        cache.set('graph', 1, 'fingerprint', {})
+        cache.invalidate('graph')
+        self.assertIsNone(cache.get('graph', 1))
+        cache.invalidate('graph')
+
+    def test_disabled(self):
+        cache = MetadataCache(self.cache_path, 0)
+        cache.set('graph', 1, 'fingerprint', {})
+        self.assertIsNone(cache.get('graph', 1))
+        self.assertFalse(os.path.exists(self.cache_path))
+
+    def test_broken(self):
+        cache = MetadataCache(self.cache_path, 60)
+        cache.set('graph', 1, 'fingerprint', {})
+        with open(os.path.join(self.cache_path, "graph.json"), 'w') as f:
+            f.write('{"schema_id": 1, ')
+        self.assertIsNone(cache.get('graph', 1))
+
+
+class CountingAPI(mock_sylvadb.API):
+    """
+    Server that counts the requests for the schema and the types
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(CountingAPI, self).__init__(*args, **kwargs)
+        self.exports = 0
+        self.nodetypes = 0
+
+    def export_schema(self):
+        self.exports += 1
+        return super(CountingAPI, self).export_schema()
+
+    def get_nodetypes(self):
+        self.nodetypes += 1
+        return super(CountingAPI, self).get_nodetypes()
+
+
+class MetadataLoadTestCase(LoadTestCase):
+    api_class = CountingAPI
+
+    def setUp(self):
+        super(MetadataLoadTestCase, self).setUp()
+        self.csv_paths = [self.write_csv("rows{}.csv".format(index), 20,
+                                         seed=index)
+                          for index in xrange(3)]
+        self.cache_path = os.path.join(cli.HISTORY_PATH, "_metadata",
+                                       "benchmark.json")
+
+    def requests(self):
+        requests = (self.server.exports, self.server.nodetypes)
+        self.server.exports = self.server.nodetypes = 0
+        return requests
+
+    def is_completed(self, app):
+        return app._journal.is_complete(cli.STATUS.EXECUTION_COMPLETED)
+
+    def test_cache(self):
+        self.assertTrue(self.is_completed(self.load(self.csv_paths[0])))
+        self.assertEqual(self.requests(), (1, 1))
+        self.assertTrue(os.path.exists(self.cache_path))
+        # The schema and the types are not asked again
+        self.assertTrue(self.is_completed(self.load(self.csv_paths[1])))
+        self.assertEqual(self.requests(), (0, 0))
+        self.assertTrue(self.is_completed(
+            self.load(self.csv_paths[2], refresh_metadata=True)))
+        self.assertEqual(self.requests(), (1, 1))
+
+    def test_expired(self):
+        self.load(self.csv_paths[0], metadata_ttl=60)
+        self.requests()
+        with open(self.cache_path) as cache_file:
+            entry = json.load(cache_file)
+        entry['time'] -= 61
+        with open(self.cache_path, 'w') as cache_file:
+            json.dump(entry, cache_file)
+        self.assertTrue(self.is_completed(
+            self.load(self.csv_paths[1], metadata_ttl=60)))
+        self.assertEqual(self.requests(), (1, 1))
+
+    def test_disabled(self):
+        self.load(self.csv_paths[0], metadata_ttl=0)
+        self.load(self.csv_paths[1], metadata_ttl=0)
+        self.assertEqual(self.requests(), (2, 2))
+        self.assertFalse(os.path.exists(self.cache_path))
+
+    def test_out_of_date(self):
+        # A type of the rules is missing from the cached types, so they are
+        # verified and asked again
+        self.load(self.csv_paths[0])
+        self.requests()
+        with open(self.cache_path) as cache_file:
+            entry = json.load(cache_file)
+        entry['metadata']['nodetypes'] = [
+            nodetype for nodetype in entry['metadata']['nodetypes']
+            if nodetype['name'] != "Type2"]
+        with open(self.cache_path, 'w') as cache_file:
+            json.dump(entry, cache_file)
+        self.assertTrue(self.is_completed(self.load(self.csv_paths[1])))
+        self.assertEqual(self.requests(), (1, 1))
+        self.assertTrue(self.is_completed(self.load(self.csv_paths[2])))
+        self.assertEqual(self.requests(), (0, 0))
+
+    def test_other_schema(self):
+        self.load(self.csv_paths[0])
+        self.requests()
+        # The rules changed, so the schema is downloaded and compared
+        schema = mock_sylvadb.SETTINGS['schema']
+        mock_sylvadb.SETTINGS['schema'] = json.loads(json.dumps(schema))
+        mock_sylvadb.SETTINGS['schema']['nodeTypes']['Type0']['flag'] = (
+            'string')
+        try:
+            with open(self.cache_path) as cache_file:
+                entry = json.load(cache_file)
+            entry['schema_fingerprint'] = "rules of another load"
+            with open(self.cache_path, 'w') as cache_file:
+                json.dump(entry, cache_file)
+            app = self.load(self.csv_paths[1])
+        finally:
+            mock_sylvadb.SETTINGS['schema'] = schema
+        self.assertFalse(self.is_completed(app))
+        self.assertEqual(self.requests(), (1, 0))
+        self.assertFalse(os.path.exists(self.cache_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from metrics import Histogram, InstrumentedAPI, Metrics
+from tests.support import HTTPError, LoadTestCase, cli
+
+PROMETHEUS_SAMPLE = re.compile(
+    r'^(sylva_[a-z_]+)\{((?:[a-z]+="[^"]*",?)*)\} (\S+)$')
+
+
+def prometheus_samples(path):
+    """
+    Parse the textfile, checking that every sample follows its HELP and
+    TYPE lines. It returns the list of names, labels and values.
+    """
+    samples = []
+    declared = {}
+    with open(path) as prometheus_file:
+        lines = prometheus_file.read().splitlines()
+    for line in lines:
+        if line.startswith("# HELP "):
+            name = line.split()[2]
+        elif line.startswith("# TYPE "):
+            name, kind = line.split()[2:]
+            declared[name] = kind
+        else:
+            match = PROMETHEUS_SAMPLE.match(line)
+            if match is None:
+                raise AssertionError("Wrong sample: {}".format(line))
+            name, labels, value = match.groups()
+            base_name = re.sub(r'_(bucket|sum|count)$', '', name)
+            if name not in declared and base_name not in declared:
+                raise AssertionError("Undeclared sample: {}".format(line))
+            samples.append((name, dict(re.findall(r'([a-z]+)="([^"]*)"',
+                                                  labels)), float(value)))
+    return samples
+
+
+class HistogramTestCase(unittest.TestCase):
+
+    def test_buckets(self):
+        histogram = Histogram((1.0, 5.0))
+        for value in (0.5, 1.0, 3, 10):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.cumulative(),
+                         [('1.0', 2), ('5.0', 3), ('+Inf', 4)])
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.sum, 14.5)
+
+    def test_empty(self):
+        self.assertEqual(Histogram((1.0,)).cumulative(),
+                         [('1.0', 0), ('+Inf', 0)])
+
+
+class Client(object):
+    graph = "graph"
+
+    def get_graph(self):
+        return {'schema': 1}
+
+    def post_nodes(self, slug, params):
+        raise HTTPError(400)
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="aggcloud_test_")
+        self.json_path = os.path.join(self.directory, "metrics.jsonl")
+        self.prometheus_path = os.path.join(self.directory, "metrics.prom")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def measure(self):
+        metrics = Metrics(self.json_path, self.prometheus_path)
+        api = metrics.instrument(Client())
+        metrics.start_phase('CASTING')
+        metrics.add_rows(10)
+        metrics.add_cast_timings({'number': (0.5, 10)})
+        metrics.add_cast_timings({'number': (0.25, 5)})
+        metrics.start_phase('DUMPING')
+        metrics.add_rows(3)
+        metrics.add_rows(2, 'CASTING')
+        self.assertEqual(api.get_graph(), {'schema': 1})
+        self.assertEqual(api.graph, "graph")
+        with self.assertRaises(HTTPError):
+            api.post_nodes('type0', [{}])
+        metrics.observe_batch('nodes', 3, 300)
+        metrics.observe_batch('nodes', 2, 200)
+        metrics.close()
+        return metrics
+
+    def test_instrumented_api(self):
+        metrics = Metrics()
+        api = InstrumentedAPI(Client(), metrics)
+        api.get_graph()
+        api.get_graph()
+        with self.assertRaises(HTTPError):
+            api.post_nodes('type0', [])
+        self.assertEqual(metrics.requests['get_graph'].count, 2)
+        self.assertEqual(metrics.requests['post_nodes'].count, 1)
+        self.assertEqual(metrics.request_errors, {'post_nodes': 1})
+        with self.assertRaises(AttributeError):
+            api.missing_method
+        metrics.close()
+
+    def test_json(self):
+        self.measure()
+        with open(self.json_path) as json_file:
+            entries = [json.loads(line) for line in json_file]
+        self.assertEqual([entry['event'] for entry in entries],
+                         ['phase', 'batch', 'batch', 'phase', 'summary'])
+        casting, dumping = entries[0], entries[3]
+        self.assertEqual((casting['phase'], casting['rows']),
+                         ('CASTING', 10))
+        self.assertEqual((dumping['phase'], dumping['rows']), ('DUMPING', 3))
+        self.assertEqual(entries[1]['items'], 3)
+        self.assertEqual(entries[2]['bytes'], 200)
+        summary = entries[-1]
+        self.assertEqual(summary['cast_timings'], {'number': [0.75, 15]})
+        self.assertEqual(summary['requests']['post_nodes']['count'], 1)
+        self.assertEqual(summary['request_errors'], {'post_nodes': 1})
+        self.assertEqual(summary['batches'],
+                         {'nodes': {'batches': 2, 'items': 5,
+                                    'bytes': 500}})
+        # A load appends its lines
+        self.measure()
+        with open(self.json_path) as json_file:
+            self.assertEqual(len(json_file.readlines()), 10)
+
+    def test_prometheus(self):
+        self.measure()
+        self.assertEqual(os.listdir(self.directory),
+                         ["metrics.jsonl", "metrics.prom"])
+        samples = prometheus_samples(self.prometheus_path)
+        values = dict(((name, tuple(sorted(labels.items()))), value)
+                      for name, labels, value in samples)
+        self.assertEqual(values[('sylva_phase_rows',
+                                 (('phase', 'CASTING'),))], 10)
+        self.assertEqual(values[('sylva_cast_values_total',
+                                 (('function', 'number'),))], 15)
+        self.assertEqual(values[('sylva_request_errors_total',
+                                 (('method', 'post_nodes'),))], 1)
+        self.assertEqual(values[('sylva_batch_bytes_total',
+                                 (('kind', 'nodes'),))], 500)
+        # The buckets are cumulative up to the count
+        buckets = [value for name, labels, value in samples
+                   if name == 'sylva_request_seconds_bucket' and
+                   labels['method'] == 'get_graph']
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(buckets[-1], 1)
+        self.assertEqual(values[('sylva_request_seconds_count',
+                                 (('method', 'get_graph'),))], 1)
+
+
+class MetricsLoadTestCase(LoadTestCase):
+
+    def test_load(self):
+        csv_path = self.write_csv("rows.csv", 100)
+        json_path = os.path.join(self.directory, "metrics.jsonl")
+        prometheus_path = os.path.join(self.directory, "metrics.prom")
+        self.load(csv_path, batch_size=40, metrics_json=json_path,
+                  metrics_prometheus=prometheus_path)
+        with open(json_path) as json_file:
+            entries = [json.loads(line) for line in json_file]
+        phases = [entry['phase'] for entry in entries
+                  if entry['event'] == 'phase']
+        self.assertIn(cli.STATUS.DATA_NODES_DUMPING, phases)
+        self.assertIn(cli.STATUS.EXECUTION_COMPLETED, phases)
+        summary = entries[-1]
+        self.assertEqual(summary['event'], 'summary')
+        self.assertEqual(summary['batches']['relationships']['items'],
+                         self.server.count_relationships())
+        self.assertEqual(summary['batches']['nodes']['items'],
+                         sum(len(nodes)
+                             for nodes in self.server._nodes.itervalues()))
+        self.assertIn('post_nodes', summary['requests'])
+        samples = prometheus_samples(prometheus_path)
+        self.assertIn('sylva_request_seconds_bucket',
+                      set(name for name, labels, value in samples))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from tests.support import LoadTestCase, renamed_types
+
+
+class RelationshipsTestCase(LoadTestCase):
+
+    def assert_unicode_types(self, **app_args):
+        # The slugs of the node types in the graph are not ASCII
+        names = {"Type1": u"Tipo-ñ1", "Type2": u"Tipo-ü2"}
+        csv_path = self.write_csv("rows.csv", 100)
+        with renamed_types(names):
+            self.load(csv_path, batch_size=40, **app_args)
+        self.assertEqual(len(self.relationships('relates0')), 100)
+        relationships = self.relationships('relates1')
+        self.assertTrue(relationships)
+        self.assertTrue(all(relationship['source_id'] and
+                            relationship['target_id']
+                            for relationship in relationships))
+        self.assertEqual(len(self.nodes(u"tipo-ñ1")), 50)
+
+    def test_unicode_types(self):
+        self.assert_unicode_types()
+
+    def test_unicode_types_overlap(self):
+        self.assert_unicode_types(overlap=True, workers=3)
+
+    def test_unicode_types_stream(self):
+        self.assert_unicode_types(stream=True, checkpoint=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
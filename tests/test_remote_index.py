@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+import csv
+import glob
+import os
+import unittest
+
+from tests.support import LoadTestCase, cli, mock_sylvadb
+
+
+class IndexAPI(mock_sylvadb.API):
+    """
+    Server that counts the pages and the lookups of the nodes and the
+    relationships. It can ignore the pages asked, or fail after some of
+    them.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(IndexAPI, self).__init__(*args, **kwargs)
+        self.paged = True
+        self.pages_left = None
+        self.pages = 0
+        self.node_filters = 0
+        self.relationship_filters = 0
+
+    def _page(self, items, params):
+        if self.pages_left is not None:
+            if self.pages_left == 0:
+                raise ValueError("The server is not available")
+            self.pages_left -= 1
+        self.pages += 1
+        if not self.paged:
+            return items
+        return super(IndexAPI, self)._page(items, params)
+
+    def filter_nodes(self, slug, params):
+        self.node_filters += 1
+        return super(IndexAPI, self).filter_nodes(slug, params)
+
+    def filter_relationships(self, slug, params):
+        self.relationship_filters += 1
+        return super(IndexAPI, self).filter_relationships(slug, params)
+
+
+class RemoteIndexTestCase(LoadTestCase):
+    """
+    The graph has the nodes and relationships of another file, with some of
+    the same names, and the pages have 7 nodes or relationships
+    """
+    api_class = IndexAPI
+
+    def setUp(self):
+        super(RemoteIndexTestCase, self).setUp()
+        self._page_size = cli.INDEX_PAGE_SIZE
+        cli.INDEX_PAGE_SIZE = 7
+        old_csv_path = self.write_csv("old.csv", 100, 0.8, 1)
+        self.load(old_csv_path, batch_size=40)
+        self.old_counts = dict((slug, len(self.nodes(slug)))
+                               for slug in ('type1', 'type2'))
+        self.old_counts['relates1'] = len(self.relationships('relates1'))
+        self.server.pages = 0
+        self.server.node_filters = self.server.relationship_filters = 0
+        self.csv_path = self.write_csv("rows.csv", 100)
+        self.rows = []
+        for csv_path in (old_csv_path, self.csv_path):
+            with open(csv_path) as csv_file:
+                self.rows.extend(list(csv.reader(csv_file))[1:])
+
+    def tearDown(self):
+        cli.INDEX_PAGE_SIZE = self._page_size
+        super(RemoteIndexTestCase, self).tearDown()
+
+    def pages(self, *slugs):
+        # The last page of every type is not full
+        return sum(self.old_counts[slug] // cli.INDEX_PAGE_SIZE + 1
+                   for slug in slugs)
+
+    def assert_loaded(self):
+        for index in (1, 2):
+            names = self.nodes('type{}'.format(index))
+            self.assertEqual(len(names), len(set(names)))
+            self.assertEqual(set(names),
+                             set(row[4 * index] for row in self.rows))
+        pairs = [(relationship['source_id'], relationship['target_id'])
+                 for relationship in self.relationships('relates1')]
+        self.assertEqual(len(pairs), len(set(pairs)))
+        self.assertEqual(len(pairs),
+                         len(set((row[4], row[8]) for row in self.rows)))
+        self.assertTrue(len(pairs) > self.old_counts['relates1'])
+
+
+class RemoteNodesTestCase(RemoteIndexTestCase):
+
+    def test_paged(self):
+        # Every node is found in the index or created
+        self.load(self.csv_path, batch_size=40)
+        self.assert_loaded()
+        self.assertEqual(self.server.node_filters, 0)
+        self.assertEqual(self.server.pages,
+                         self.pages('type1', 'type2', 'relates1'))
+
+    def test_paged_stream(self):
+        self.load(self.csv_path, batch_size=40, stream=True)
+        self.assert_loaded()
+        self.assertEqual(self.server.node_filters, 0)
+
+    def test_unpaged(self):
+        # The first page has every node, and the second one repeats it
+        self.server.paged = False
+        self.load(self.csv_path, batch_size=40)
+        self.assert_loaded()
+        self.assertEqual(self.server.node_filters, 0)
+
+    def test_incomplete(self):
+        # The nodes not found in the index of the last type indexed are
+        # filtered, without creating them again
+        self.server.pages_left = self.pages('type1', 'type2') - 1
+        self.load(self.csv_path, batch_size=40)
+        self.assert_loaded()
+        self.assertTrue(self.server.node_filters > 0)
+
+
+class RemoteRelationshipsTestCase(RemoteIndexTestCase):
+    """
+    The pairs of the index are moved to disk every 10 pairs
+    """
+
+    def load(self, csv_path, **app_args):
+        app_args.setdefault('index_limit', 10)
+        return super(RemoteRelationshipsTestCase, self).load(csv_path,
+                                                             **app_args)
+
+    def assert_loaded(self):
+        super(RemoteRelationshipsTestCase, self).assert_loaded()
+        self.assertEqual(glob.glob(os.path.join(
+            cli.HISTORY_PATH, "*", "_relates1_remote_pairs.db")), [])
+
+    def test_paged(self):
+        self.load(self.csv_path, batch_size=40)
+        self.assert_loaded()
+        self.assertEqual(self.server.relationship_filters, 0)
+
+    def test_paged_overlap(self):
+        self.load(self.csv_path, batch_size=40, overlap=True, workers=3)
+        self.assert_loaded()
+        self.assertEqual(self.server.relationship_filters, 0)
+
+    def test_paged_stream(self):
+        self.load(self.csv_path, batch_size=40, stream=True)
+        self.assert_loaded()
+        self.assertEqual(self.server.relationship_filters, 0)
+
+    def test_unpaged(self):
+        # Two pages of nodes of every type and of relationships
+        self.server.paged = False
+        self.load(self.csv_path, batch_size=40)
+        self.assert_loaded()
+        self.assertEqual(self.server.relationship_filters, 0)
+        self.assertEqual(self.server.pages, 6)
+
+    def test_incomplete(self):
+        # The pairs not found in the index are filtered
+        self.server.pages_left = self.pages('type1', 'type2', 'relates1') - 1
+        self.load(self.csv_path, batch_size=40)
+        self.assert_loaded()
+        self.assertEqual(self.server.node_filters, 0)
+        self.assertTrue(self.server.relationship_filters > 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import csv
+import glob
+import os
+import unittest
+
+import retries
+from tests.support import (HTTPError, LoadTestCase, cli, mock_sylvadb,
+                           quiet)
+
+
+class RetriesTestCase(unittest.TestCase):
+
+    def post(self, params):
+        self.calls += 1
+        if self.transient_errors:
+            self.transient_errors -= 1
+            raise HTTPError(503)
+        if "bad" in params:
+            raise HTTPError(400)
+        return [param.upper() for param in params]
+
+    def setUp(self):
+        self.calls = 0
+        self.transient_errors = 0
+
+    def test_retries(self):
+        self.transient_errors = 2
+        with quiet():
+            result = retries.call_with_retries(self.post, (["a"],), 2, 0)
+        self.assertEqual(result, ["A"])
+        self.assertEqual(self.calls, 3)
+
+    def test_bisecting(self):
+        params = ["a", "bad", "b", "c", "bad"]
+        sent, rejected = retries.post_bisecting(self.post, params, 2, 0)
+        self.assertEqual([index for index, error in rejected], [1, 4])
+        results = [None] * len(params)
+        for start, end, result in sent:
+            results[start:end] = result
+        self.assertEqual(results, ["A", None, "B", "C", None])
+
+    def test_transient(self):
+        # The batch is not split when the server keeps failing
+        self.transient_errors = 10
+        with self.assertRaises(HTTPError), quiet():
+            retries.post_bisecting(self.post, ["a", "bad", "b"], 2, 0)
+        self.assertEqual(self.calls, 3)
+
+
+class RejectingAPI(mock_sylvadb.API):
+    """
+    Server that refuses the nodes with some names, and the relationships
+    with their nodes. It can also fail for every request.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(RejectingAPI, self).__init__(*args, **kwargs)
+        self.bad_names = set()
+        self.down = False
+        self.missing_ids = False
+
+    def _check(self):
+        if self.down:
+            raise HTTPError(503)
+
+    def post_nodes(self, slug, params):
+        self._check()
+        if any(param['name'] in self.bad_names for param in params):
+            raise HTTPError(400)
+        ids = super(RejectingAPI, self).post_nodes(slug, params)
+        if self.missing_ids:
+            return ids[:-1]
+        return ids
+
+    def post_relationships(self, slug, params):
+        self._check()
+        bad_ids = set(
+            unicode(node_id) for nodes in self._nodes.itervalues()
+            for node_id, properties in nodes
+            if "bad " + properties['name'] in self.bad_names)
+        if any(unicode(param['target_id']) in bad_ids for param in params):
+            raise HTTPError(400)
+        return super(RejectingAPI, self).post_relationships(slug, params)
+
+
+class RejectTestCase(LoadTestCase):
+    api_class = RejectingAPI
+
+    def setUp(self):
+        super(RejectTestCase, self).setUp()
+        self.csv_path = self.write_csv("rows.csv", 200)
+        with open(self.csv_path) as csv_file:
+            self.rows = list(csv.reader(csv_file))
+        self.headers = self.rows.pop(0)
+
+    def rejected(self, app, slug):
+        rejected_path = os.path.join(app._history_path,
+                                     "{}_rejected.csv".format(slug))
+        if not os.path.exists(rejected_path):
+            return []
+        with open(rejected_path) as rejected_file:
+            return list(csv.reader(rejected_file))[1:]
+
+    def test_reject(self):
+        # A node of Type1 and the relationships of relates1 to a node of
+        # Type2 are rejected
+        self.server.bad_names = set(["T1-7", "bad T2-9"])
+        app = self.load(self.csv_path, delta=True, batch_size=40)
+        rows_t1 = [row for row in self.rows if row[4] == "T1-7"]
+        rows_t2 = [row for row in self.rows if row[8] == "T2-9"]
+        rejected = self.rejected(app, 'type1')
+        self.assertEqual(len(rejected), 1)
+        self.assertIn("T1-7", rejected[0])
+        self.assertNotIn("T1-7", self.nodes('type1'))
+        # The relationships of the rejected node are skipped
+        self.assertEqual(len(self.relationships('relates0')),
+                         len(self.rows) - len(rows_t1))
+        pairs = set((row[4], row[8]) for row in rows_t2
+                    if row[4] != "T1-7")
+        self.assertEqual(len(self.rejected(app, 'relates1')), len(pairs))
+        self.assertEqual(
+            len(self.relationships('relates1')),
+            len(set((row[4], row[8]) for row in self.rows
+                    if row[4] != "T1-7")) - len(pairs))
+        # The rows that failed are loaded by the next execution
+        self.server.bad_names = set()
+        again_csv_path = self.write_csv("again.csv", 1)
+        with open(again_csv_path, 'w') as csv_file:
+            csv_writer = csv.writer(csv_file)
+            csv_writer.writerow(self.headers)
+            # In another order, to be a new file
+            csv_writer.writerows(reversed(self.rows))
+        app = self.load(again_csv_path, delta=True, batch_size=40)
+        self.assertEqual(self.rejected(app, 'type1'), [])
+        self.assertEqual(sorted(self.nodes('type1')),
+                         sorted(set(row[4] for row in self.rows)))
+        self.assertEqual(len(self.relationships('relates1')),
+                         len(set((row[4], row[8]) for row in self.rows)))
+        # The rows partially loaded are sent again in full, so their
+        # relationships created for every row are repeated
+        self.assertEqual(
+            len(self.relationships('relates0')),
+            len(self.rows) + len([row for row in rows_t2
+                                  if row[4] != "T1-7"]))
+
+    def test_transient(self):
+        # When the server is down, the load stops without rejecting rows
+        self.server.down = True
+        with self.assertRaises(HTTPError):
+            self.load(self.csv_path, batch_size=40)
+        self.assertEqual(
+            glob.glob(os.path.join(self.directory, "history", "*",
+                                   "*_rejected.csv")), [])
+        self.server.down = False
+        app = self.load(self.csv_path, batch_size=40)
+        self.assertEqual(self.rejected(app, 'type0'), [])
+        self.assertEqual(len(self.relationships('relates0')),
+                         len(self.rows))
+
+    def test_missing_ids(self):
+        # The load stops instead of matching the ids to the wrong nodes
+        self.server.missing_ids = True
+        app = self.load(self.csv_path, batch_size=40)
+        self.assertFalse(app._journal.is_complete(
+            cli.STATUS.EXECUTION_COMPLETED))
+        self.assertEqual(self.server.count_relationships(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import glob
+import os
+import sys
+import unittest
+
+from tests.support import LoadTestCase, cli, quiet
+
+
+class StreamTestCase(LoadTestCase):
+
+    def main(self, *args):
+        argv = sys.argv
+        sys.argv = ["cli.py"] + list(args)
+        try:
+            with quiet():
+                cli.main()
+        finally:
+            sys.argv = argv
+
+    def history_files(self):
+        csv_path, = glob.glob(os.path.join(cli.HISTORY_PATH, "*", "rows.csv"))
+        return os.listdir(os.path.dirname(csv_path))
+
+    def test_stream(self):
+        # The checkpoints are left out, without asking for it
+        csv_path = self.write_csv("rows.csv", 100)
+        self.main(csv_path, "--stream", "--batch-size", "40")
+        self.assertEqual(len(self.nodes('type1')), 50)
+        self.assertEqual(len(self.relationships('relates0')), 100)
+        files = self.history_files()
+        self.assertNotIn(cli.CHECKPOINT_FILENAME, files)
+        self.assertNotIn("_relationships.csv", files)
+        self.assertNotIn("type1.csv", files)
+
+    def test_no_stream(self):
+        csv_path = self.write_csv("rows.csv", 100)
+        self.main(csv_path, "--batch-size", "40")
+        self.assertEqual(len(self.relationships('relates0')), 100)
+        files = self.history_files()
+        self.assertIn(cli.CHECKPOINT_FILENAME, files)
+        self.assertIn("type1.csv", files)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import sys
+import unittest
+from StringIO import StringIO
+
+import transport
+from tests.support import LoadTestCase, cli
+
+
+class Client(object):
+    """
+    API client with its session and another one inside its attributes
+    """
+
+    def __init__(self):
+        self.session = transport.Session()
+        self._api = {'store': {'session': transport.Session()}}
+
+
+def transports(session):
+    return [adapter for adapter in session.adapters.itervalues()
+            if isinstance(adapter, transport.Transport)]
+
+
+@unittest.skipIf(transport.Session is None, "requests is not installed")
+class InstallTestCase(unittest.TestCase):
+
+    def test_session(self):
+        session = transport.Session()
+        self.assertEqual(transport.install(session, 5, True), 1)
+        self.assertEqual(len(transports(session)), 2)
+        self.assertEqual(transports(session)[0]._timeout, 5.0)
+
+    def test_attribute(self):
+        # Only the session of the client is used
+        client = Client()
+        self.assertEqual(transport.install(client), 1)
+        self.assertEqual(len(transports(client.session)), 2)
+        self.assertEqual(transports(client._api['store']['session']), [])
+
+    def test_search(self):
+        client = Client()
+        client.session = None
+        self.assertEqual(transport.install(client), 1)
+        self.assertEqual(len(transports(client._api['store']['session'])), 2)
+
+    def test_not_found(self):
+        client = Client()
+        client.session = None
+        client._api = {'store': {'other': {'session': transport.Session()}}}
+        self.assertEqual(transport.install(client), 0)
+
+
+class WarningTestCase(LoadTestCase):
+
+    def connect(self):
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            self.app = cli.SylvaApp(self.write_csv("rows.csv", 10))
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    @unittest.skipIf(transport.Session is None, "requests is not installed")
+    def test_mock(self):
+        self.assertNotIn("session of the API client", self.connect())
+        self.assertEqual(len(transports(self.server.session)), 2)
+
+    def test_without_session(self):
+        # The warning is shown even without the timeout and gzip options
+        self.server.session = None
+        self.assertIn("session of the API client was not found",
+                      self.connect())
+
+
+if __name__ == '__main__':
+    unittest.main()
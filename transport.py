@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+try:
+    from requests import Session
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    Session = None
+    HTTPAdapter = object
+import zlib
+
+# Seconds to wait for the server to connect and to answer. There is no
+# timeout by default, because getting all the nodes or relationships of a
+# type can take long.
+TIMEOUT = None
+# Request bodies smaller than this are not compressed
+GZIP_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+# Attribute of the API client with the session of requests that it uses
+SESSION_ATTRIBUTE = 'session'
+# Depth of the attributes of the API client searched for sessions, when it
+# does not have the attribute
+SEARCH_DEPTH = 3
+
+
+def gzip_compress(data, level=GZIP_LEVEL):
+    # zlib writes the gzip header and trailer with 16 + window bits
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class Transport(HTTPAdapter):
+    """
+    Adapter for the sessions of the API client. It keeps a pool of
+    keep-alive connections per host, sets the timeout given for the requests
+    that don't have one and, optionally, compresses the large bodies with
+    gzip.
+    """
+
+    def __init__(self, timeout=None, gzip=False, pool_size=10):
+        self._timeout = TIMEOUT
+        if timeout:
+            self._timeout = float(timeout)
+        self._gzip = gzip
+        super(Transport, self).__init__(pool_connections=pool_size,
+                                        pool_maxsize=pool_size)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self._timeout
+        body = request.body
+        if (self._gzip and body and not hasattr(body, 'read') and
+                len(body) >= GZIP_MIN_SIZE and
+                'Content-Encoding' not in request.headers):
+            if isinstance(body, unicode):
+                body = body.encode('utf-8')
+            request.body = gzip_compress(body)
+            request.headers['Content-Encoding'] = 'gzip'
+            request.headers['Content-Length'] = str(len(request.body))
+        return super(Transport, self).send(request, **kwargs)
+
+
+def _sessions(obj, depth, seen):
+    """
+    Yield the sessions of requests found in the attributes of the object
+    """
+    if id(obj) in seen:
+        return
+    seen.add(id(obj))
+    if isinstance(obj, Session):
+        yield obj
+        return
+    if depth == 0:
+        return
+    if isinstance(obj, dict):
+        values = obj.values()
+    elif hasattr(obj, '__dict__'):
+        values = vars(obj).values()
+    else:
+        return
+    for value in values:
+        for session in _sessions(value, depth - 1, seen):
+            yield session
+
+
+def install(api, timeout=None, gzip=False, pool_size=10):
+    """
+    Mount the transport in the sessions used by the API client. It returns
+    the number of sessions found.
+    """
+    if Session is None:
+        return 0
+    # We use the session of the client, or a session given directly, and
+    # only search the attributes for clients without it
+    session = getattr(api, SESSION_ATTRIBUTE, api)
+    if isinstance(session, Session):
+        sessions = [session]
+    else:
+        sessions = list(_sessions(api, SEARCH_DEPTH, set()))
+    for session in sessions:
+        transport = Transport(timeout, gzip, pool_size)
+        session.mount('http://', transport)
+        session.mount('https://', transport)
+    return len(sessions)